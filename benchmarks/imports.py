@@ -0,0 +1,98 @@
+"""
+Import-time budget for the CLI
+
+Run from the repository root:
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --budget-ms 100 --runs 9
+
+Imports ``ssrleakguard.cli`` in fresh interpreters and exits with status 1
+if it pulls in a dependency that should only load with the phase that
+needs it, or if the median import time is over budget.
+"""
+
+import statistics
+import subprocess
+import sys
+from typing import List, Set
+
+import click
+
+ENTRY_MODULE = "ssrleakguard.cli"
+
+# Loaded on demand: requests/urllib3 with the first HTTP client, bs4/lxml
+# with the first soup, multiprocessing with a process pool, http.server
+# in service mode, sqlite3 with a snapshot or checkpoint store,
+# concurrent.futures with the first thread pool, colorama with the
+# reporter and the crawler with --crawl
+DEFERRED_MODULES = (
+    "bs4",
+    "colorama",
+    "concurrent.futures",
+    "deepdiff",
+    "http.server",
+    "lxml",
+    "multiprocessing",
+    "requests",
+    "sqlite3",
+    "ssrleakguard.core.crawler",
+    "urllib3",
+)
+
+
+def _import_time_us(module: str) -> int:
+    """Cumulative import time of module in a fresh interpreter, in µs"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time:  self [us] | cumulative | name"
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def _loaded_modules(module: str) -> Set[str]:
+    """Modules present in sys.modules after importing module"""
+    code = f"import sys, {module}\nprint('\\n'.join(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(proc.stdout.split())
+
+
+@click.command()
+@click.option("--budget-ms", default=150.0, show_default=True, help="Maximum median import time")
+@click.option("--runs", default=5, show_default=True, help="Fresh interpreters to time")
+def main(budget_ms, runs):
+    failures: List[str] = []
+
+    eager = sorted(set(DEFERRED_MODULES) & _loaded_modules(ENTRY_MODULE))
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+
+    timings = [_import_time_us(ENTRY_MODULE) / 1000 for _ in range(runs)]
+    median = statistics.median(timings)
+    print(
+        f"import {ENTRY_MODULE}: median {median:.1f} ms, "
+        f"min {min(timings):.1f} ms over {runs} runs (budget {budget_ms:.0f} ms)"
+    )
+    if median > budget_ms:
+        failures.append(f"median {median:.1f} ms is over the {budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
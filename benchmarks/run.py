@@ -0,0 +1,236 @@
+"""
+Per-stage benchmark harness
+
+Run from the repository root:
+
+    python -m benchmarks.run --size 256 --size 2048 --contexts 4 -o bench.json
+    python -m benchmarks.run --compare bench.json
+
+Pages are generated locally, so no network access is needed.
+"""
+
+import contextlib
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import click
+
+from benchmarks.generator import PageGenerator, context_variants
+from ssrleakguard import __version__
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.differ import diff_ssr_states
+from ssrleakguard.core.document import HTMLDocument
+from ssrleakguard.detectors.nextjs_parser import NextJSParser
+from ssrleakguard.detectors.secret_scanner import SecretScanner
+from ssrleakguard.detectors.ssr_detector import SSRDetector
+from ssrleakguard.utils.normalizer import normalize_ssr_data
+from ssrleakguard.utils.reporter import Reporter
+
+
+def _measure(fn: Callable, repeat: int) -> Dict:
+    """Time fn over repeat runs, then measure its peak allocation once"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc slows allocation down, so it is kept out of the timed runs
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "peak_bytes": peak,
+    }
+
+
+def run_case(generator: PageGenerator, contexts: int, repeat: int) -> Dict:
+    """
+    Benchmark every pipeline stage on one generated page
+
+    Each stage is timed on its own, given the output of the previous stage,
+    so a regression shows up in the stage that caused it.
+    """
+    next_data = generator.next_data()
+    html = generator.html(next_data)
+    html_bytes = len(html.encode("utf-8"))
+
+    detector = SSRDetector()
+    parser = NextJSParser()
+    scanner = SecretScanner()
+    analyzer = SSRAnalyzer(client=None)
+    reporter = Reporter()
+
+    document = HTMLDocument(html)
+    next_data_span = document.next_data_span
+    page_props = parser.extract_page_props(parser.extract_next_data(document))
+    leaves = sum(1 for _ in parser.iter_data_paths(page_props))
+    results = analyzer.analyze_html("http://bench.local/", html)
+
+    variants = context_variants(next_data, contexts, seed=generator.seed)
+    raw_states = {name: state for name, state in variants}
+    states_bytes = sum(len(json.dumps(s)) for s in raw_states.values())
+    states = {name: normalize_ssr_data(s) for name, s in raw_states.items()}
+    diff_results = {
+        "url": "http://bench.local/",
+        "contexts": list(states),
+        "authorization_findings": diff_ssr_states(states),
+    }
+
+    def report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            reporter.print_console_report(results)
+            reporter.print_authorization_report(diff_results)
+
+    stages = {
+        "detect": (lambda: detector.detect_ssr(HTMLDocument(html)), html_bytes),
+        "extract": (
+            lambda: parser.extract_page_props(
+                parser.extract_next_data(HTMLDocument(html))
+            ),
+            html_bytes,
+        ),
+        "flatten": (
+            lambda: deque(parser.iter_data_paths(page_props), maxlen=0),
+            None,
+        ),
+        "scan": (
+            lambda: (
+                scanner.scan_data_structure(parser.iter_data_paths(page_props)),
+                scanner.scan_content(
+                    html, context="HTML body", exclude=[next_data_span]
+                ),
+            ),
+            html_bytes,
+        ),
+        "normalize": (
+            lambda: [normalize_ssr_data(s) for s in raw_states.values()],
+            states_bytes,
+        ),
+        "diff": (lambda: diff_ssr_states(states), states_bytes),
+        "diff_ordered": (
+            lambda: diff_ssr_states(states, ignore_order=False),
+            states_bytes,
+        ),
+        "report": (report, None),
+        "analyze": (
+            lambda: analyzer.analyze_html("http://bench.local/", html),
+            html_bytes,
+        ),
+    }
+
+    measured = {}
+    for name, (fn, input_bytes) in stages.items():
+        stats = _measure(fn, repeat)
+        if input_bytes:
+            stats["mb_per_s"] = input_bytes / stats["min_s"] / 1e6
+        measured[name] = stats
+
+    return {
+        "params": {
+            "size": generator.size,
+            "depth": generator.depth,
+            "breadth": generator.breadth,
+            "secret_density": generator.secret_density,
+            "secret_types": generator.secret_types,
+            "list_length": generator.list_length,
+            "seed": generator.seed,
+            "contexts": contexts,
+        },
+        "html_bytes": html_bytes,
+        "leaves": leaves,
+        "secrets_planted": generator.secrets_planted,
+        "findings": len(results["findings"]),
+        "stages": measured,
+    }
+
+
+def _print_case(case: Dict, baseline: Optional[Dict] = None):
+    params = case["params"]
+    print(
+        f"\nsize={case['html_bytes']:,}B depth={params['depth']} "
+        f"breadth={params['breadth']} leaves={case['leaves']:,} "
+        f"findings={case['findings']} contexts={params['contexts']}"
+    )
+    for name, stats in case["stages"].items():
+        line = (
+            f"  {name:<13} {stats['min_s'] * 1000:10.2f} ms"
+            f"  peak {stats['peak_bytes'] / 1e6:8.2f} MB"
+        )
+        if "mb_per_s" in stats:
+            line += f"  {stats['mb_per_s']:8.1f} MB/s"
+        if baseline and name in baseline["stages"]:
+            ratio = stats["min_s"] / baseline["stages"][name]["min_s"]
+            line += f"  x{ratio:.2f} vs baseline"
+        print(line)
+
+
+@click.command()
+@click.option("--size", "sizes", multiple=True, type=int, help="Page size in KB (repeatable)")
+@click.option("--depth", default=4, show_default=True)
+@click.option("--breadth", default=4, show_default=True)
+@click.option("--secret-density", default=0.01, show_default=True)
+@click.option("--secret-type", "secret_types", multiple=True, help="Restrict planted secrets to these types")
+@click.option("--contexts", default=3, show_default=True, help="Contexts for the Phase 2 stages")
+@click.option("--repeat", default=5, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Write results as JSON")
+@click.option("--compare", type=click.Path(exists=True, dir_okay=False), help="Show ratios against an earlier JSON run")
+def main(sizes, depth, breadth, secret_density, secret_types, contexts,
+         repeat, seed, output, compare):
+    baseline_cases: List[Dict] = []
+    if compare:
+        with open(compare, "r", encoding="utf-8") as f:
+            earlier = json.load(f)
+        baseline_cases = earlier["cases"]
+        if not sizes:
+            # Rerun the earlier matrix so the ratios compare like with like
+            sizes = [c["params"]["size"] // 1024 for c in baseline_cases]
+
+    cases = []
+    for idx, size in enumerate(sizes or (256, 2048)):
+        generator = PageGenerator(
+            size=size * 1024,
+            depth=depth,
+            breadth=breadth,
+            secret_density=secret_density,
+            secret_types=secret_types or None,
+            seed=seed,
+        )
+        case = run_case(generator, contexts, repeat)
+        cases.append(case)
+        baseline = baseline_cases[idx] if idx < len(baseline_cases) else None
+        _print_case(case, baseline)
+
+    if output:
+        report = {
+            "meta": {
+                "ssrleakguard": __version__,
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "repeat": repeat,
+            },
+            "cases": cases,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
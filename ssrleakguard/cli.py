@@ -1,61 +1,171 @@
 import click
 import sys
+from click.core import ParameterSource
+import time
 from datetime import datetime
 from pathlib import Path
 from ssrleakguard.core.http_client import HTTPClient
 from ssrleakguard.core.analyzer import SSRAnalyzer
-from ssrleakguard.core.context import AuthContext
-from ssrleakguard.utils.reporter import Reporter
+from ssrleakguard.core.batch import BatchScanner, BatchSummary, read_url_list
+from ssrleakguard.core.cache import ResultCache
+from ssrleakguard.core.checkpoints import (
+    DONE,
+    CheckpointStore,
+    job_settings,
+    merge_checkpoints,
+    parse_shard,
+    shard_urls,
+)
+from ssrleakguard.core.context import AuthContext, load_contexts, parse_context
+from ssrleakguard.core.snapshots import SnapshotStore
+from ssrleakguard.utils.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+)
 
 
-class TeeOutput:
-    """Write output to both terminal and file"""
-    def __init__(self, *files):
-        self.files = files
-    
-    def write(self, data):
-        for f in self.files:
-            f.write(data)
-            f.flush()
-    
-    def flush(self):
-        for f in self.files:
-            f.flush()
+def _given(name: str) -> bool:
+    """Whether an option was set on the command line, not left at its default"""
+    source = click.get_current_context().get_parameter_source(name)
+    return source is not ParameterSource.DEFAULT
 
 
 @click.command()
-@click.argument("url")
+@click.argument("url", required=False)
+@click.option("--urls-file", type=click.File("r"), help="Scan every URL in this file ('-' for stdin)")
+@click.option("--concurrency", default=8, show_default=True, help="Parallel scans in batch mode")
+@click.option("--per-host", default=4, show_default=True, help="Parallel scans per host in batch mode")
+@click.option("--processes", default=0, help="Parse and scan in this many worker processes (batch mode)")
 @click.option("--cookie", "-c", multiple=True)
-@click.option("--context", multiple=True, help="name or name:key=value")
+@click.option("--context", multiple=True, help="name or name:key=value[; key=value ...]")
+@click.option("--contexts-file", type=click.Path(exists=True, dir_okay=False), help="JSON file of contexts with cookies and headers, or a matrix of them")
+@click.option("--ordered-lists", is_flag=True, help="Treat list order as significant when diffing contexts")
 @click.option("--verbose", "-v", is_flag=True)
 @click.option("--no-report", is_flag=True, help="Disable automatic report saving")
-def main(url, cookie, context, verbose, no_report):
-    # Setup report logging
-    report_file = None
-    original_stdout = sys.stdout
-    
-    if not no_report:
+@click.option("--jsonl", type=click.Path(dir_okay=False), help="Write results as JSON Lines to this file")
+@click.option("--sarif", type=click.Path(dir_okay=False), help="Write results as SARIF 2.1.0 to this file")
+@click.option("--cache-dir", type=click.Path(file_okay=False), help="Reuse results for unchanged pages from this directory")
+@click.option("--cache-max-mb", default=512, show_default=True, help="Size limit of the result cache")
+@click.option("--timings", is_flag=True, help="Print per-stage and per-pattern timings")
+@click.option("--timings-json", type=click.Path(dir_okay=False), help="Write timings and counters to a JSON file")
+@click.option("--incremental-json", is_flag=True, help="Scan __NEXT_DATA__ while parsing it instead of loading it whole")
+@click.option("--max-json-nodes", type=int, help="Stop scanning __NEXT_DATA__ after this many JSON values (implies --incremental-json)")
+@click.option("--max-json-depth", type=int, help="Stop scanning __NEXT_DATA__ nested deeper than this (implies --incremental-json)")
+@click.option("--data-endpoint", is_flag=True, help="Fetch page props from /_next/data/<buildId>/ once a site's build ID is known")
+@click.option("--crawl", is_flag=True, help="Follow links, sitemaps and the build manifest from the given URL(s)")
+@click.option("--max-pages", default=500, show_default=True, help="Pages fetched at most in crawl mode")
+@click.option("--max-depth", default=3, show_default=True, help="Link hops followed from the seeds in crawl mode")
+@click.option("--snapshots", "snapshots_path", type=click.Path(dir_okay=False), help="Compare SSR states with the previous run stored in this SQLite file")
+@click.option("--watch", type=float, metavar="SECONDS", help="Rescan every SECONDS and report state changes (needs --snapshots)")
+@click.option("--serve", "serve_address", metavar="HOST:PORT", help="Run as a service accepting scan jobs over HTTP")
+@click.option("--serve-socket", type=click.Path(dir_okay=False), help="Run as a service accepting scan jobs on this Unix socket")
+@click.option("--queue-dir", type=click.Path(file_okay=False), help="Run as a service taking scan jobs from this directory")
+@click.option("--max-jobs", default=4, show_default=True, help="Jobs run at the same time in service mode")
+@click.option("--har", "har_files", multiple=True, type=click.Path(exists=True, dir_okay=False), help="Scan the responses recorded in this HAR file (no network)")
+@click.option("--html-dir", "html_dirs", multiple=True, type=click.Path(exists=True, file_okay=False), help="Scan the HTML files saved under this directory (no network)")
+@click.option("--shard", "shard_spec", metavar="I/N", help="Scan only the I-th of N shards of the URL list")
+@click.option("--checkpoint", "checkpoint_path", type=click.Path(dir_okay=False), help="Record progress in this SQLite file and skip URLs it has done")
+@click.option("--merge", "merge_paths", multiple=True, type=click.Path(exists=True, dir_okay=False), help="Report the results stored in these checkpoint files as one scan")
+@click.option("--stream", is_flag=True, help="Scan the response body while it downloads")
+@click.option("--max-bytes", type=int, help="Stop streaming after this many body bytes")
+@click.option("--stop-on-critical", is_flag=True, help="Stop streaming at the first critical finding")
+def main(url, urls_file, concurrency, per_host, processes, cookie, context,
+         contexts_file,
+         ordered_lists, verbose, no_report, jsonl, sarif, cache_dir,
+         cache_max_mb, timings, timings_json, incremental_json,
+         max_json_nodes, max_json_depth, data_endpoint, crawl, max_pages,
+         max_depth, snapshots_path, watch, serve_address, serve_socket, queue_dir, max_jobs, har_files,
+         html_dirs, shard_spec, checkpoint_path, merge_paths, stream,
+         max_bytes, stop_on_critical):
+    serving = bool(serve_address or serve_socket or queue_dir)
+    offline = bool(har_files or html_dirs)
+    if not url and not urls_file and not serving and not offline and not merge_paths:
+        raise click.UsageError("Provide a URL, --urls-file, --har or --html-dir")
+    if (offline or merge_paths) and (url or urls_file):
+        raise click.UsageError("--har, --html-dir and --merge do not take URLs")
+    if (shard_spec or checkpoint_path) and (serving or offline or merge_paths or crawl or watch):
+        raise click.UsageError("--shard and --checkpoint only apply to URL lists")
+    shard = (1, 1)
+    if shard_spec:
+        try:
+            shard = parse_shard(shard_spec)
+        except ValueError as exc:
+            raise click.UsageError(str(exc))
+    if watch and not snapshots_path:
+        raise click.UsageError("--watch needs --snapshots")
+    if crawl and watch:
+        raise click.UsageError("--crawl and --watch cannot be combined")
+    if crawl and (cache_dir or processes):
+        # Crawled pages are fetched whole in this process for their links
+        raise click.UsageError("--cache-dir and --processes do not apply to --crawl")
+    if offline and (cache_dir or data_endpoint or cookie):
+        # Saved responses are scanned as recorded; nothing is fetched
+        raise click.UsageError(
+            "--cache-dir, --data-endpoint and --cookie do not apply to --har or --html-dir"
+        )
+    batch_mode = bool(
+        serving or offline or watch or urls_file or shard_spec or checkpoint_path
+    )
+    if processes and (merge_paths or not batch_mode):
+        raise click.UsageError("--processes only applies to batch, service and offline scans")
+    if _given("concurrency") and (merge_paths or not (batch_mode or crawl)):
+        raise click.UsageError("--concurrency only applies to batch, crawl, service and offline scans")
+    if _given("per_host") and (merge_paths or offline or crawl or not batch_mode):
+        # Only scans fetching through BatchScanner hold a per-host limit
+        raise click.UsageError("--per-host only applies to URL lists, --watch and the service")
+    streaming = bool(stream or max_bytes or stop_on_critical)
+    if streaming and (
+        urls_file or context or contexts_file or crawl or watch or serving
+        or offline or merge_paths
+    ):
+        raise click.UsageError(
+            "--stream, --max-bytes and --stop-on-critical only apply to a "
+            "single URL without contexts"
+        )
+    if streaming and (data_endpoint or cache_dir):
+        # The body is scanned as it downloads, never fetched as JSON or cached
+        raise click.UsageError("--data-endpoint and --cache-dir do not apply to --stream")
+    address = None
+    if serve_address:
+        host, _, port = serve_address.rpartition(":")
+        if not port.isdigit():
+            raise click.UsageError("--serve takes HOST:PORT")
+        address = (host or "127.0.0.1", int(port))
+
+    # The reporter brings in colorama, so it is loaded only once the
+    # arguments are known to be valid
+    from ssrleakguard.utils.reporter import Reporter
+    from ssrleakguard.utils.sinks import (
+        ConsoleSink,
+        JSONLSink,
+        SARIFSink,
+        SinkGroup,
+        TextSink,
+    )
+
+    # Every output is a sink fed one result at a time
+    reporter = Reporter()
+    sinks = [ConsoleSink(reporter)]
+    report_path = None
+
+    if not no_report and not serving:
         # Create reports directory
         reports_dir = Path("reports")
         reports_dir.mkdir(exist_ok=True)
-        
+
         # Generate timestamped filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         report_path = reports_dir / f"ssrleakguard_report_{timestamp}.txt"
-        
-        # Open report file and redirect stdout
-        report_file = open(report_path, 'w', encoding='utf-8')
-        sys.stdout = TeeOutput(original_stdout, report_file)
-        
-        # Print report header
-        command = ' '.join(sys.argv)
-        print("=" * 70)
-        print("SSRLeakGuard Security Scan Report")
-        print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"Command: {command}")
-        print("=" * 70)
-        print()
-    
+        sinks.append(TextSink(str(report_path), command=" ".join(sys.argv)))
+    if jsonl:
+        sinks.append(JSONLSink(jsonl))
+    if sarif:
+        sinks.append(SARIFSink(sarif))
+    output = SinkGroup(sinks)
+    snapshots = None
+    analyzer = None
+    checkpoint = None
+
     try:
         # Parse cookies
         cookies = {}
@@ -65,37 +175,264 @@ def main(url, cookie, context, verbose, no_report):
                 cookies[k] = v
 
         # Parse contexts
-        contexts = []
-        for ctx in context:
-            if ":" not in ctx:
-                contexts.append(AuthContext(name=ctx, cookies={}))
-            else:
-                name, cookie_part = ctx.split(":", 1)
-                k, v = cookie_part.split("=", 1)
-                contexts.append(AuthContext(name=name, cookies={k: v}))
-
-        client = HTTPClient(cookies=cookies)
-        analyzer = SSRAnalyzer(client, verbose=verbose)
-        reporter = Reporter()
-
-        # Phase 2 if contexts are provided
-        if contexts:
-            results = analyzer.analyze_with_contexts(url, contexts)
-            reporter.print_authorization_report(results)
+        try:
+            contexts = [parse_context(ctx) for ctx in context]
+            if contexts_file:
+                contexts.extend(load_contexts(contexts_file))
+        except ValueError as exc:
+            raise click.UsageError(str(exc))
+        if len({ctx.name for ctx in contexts}) < len(contexts):
+            raise click.UsageError("Context names must be unique")
+
+        if snapshots_path:
+            snapshots = SnapshotStore(snapshots_path)
+            if not contexts:
+                # States are tracked per context; without any, the page as
+                # seen with --cookie is the one context
+                contexts.append(AuthContext(name="default", cookies=cookies))
+
+        cache = None
+        if cache_dir:
+            cache = ResultCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024)
+
+        instrumentation = NULL_INSTRUMENTATION
+        if timings or timings_json:
+            instrumentation = Instrumentation()
+
+        client = HTTPClient(cookies=cookies, pool_size=max(concurrency, 10))
+        # Batch scanners build their own analyzer; this one is only built
+        # for a crawl or a single URL
+        analyzer_options = dict(
+            verbose=verbose,
+            cache=cache,
+            ignore_order=not ordered_lists,
+            instrumentation=instrumentation,
+            incremental_json=incremental_json,
+            max_json_nodes=max_json_nodes,
+            max_json_depth=max_json_depth,
+            data_endpoint=data_endpoint,
+            snapshots=snapshots,
+        )
+        batch_options = dict(
+            analyzer_options,
+            concurrency=concurrency,
+            per_host=per_host,
+            processes=processes,
+        )
+
+        if serving:
+            # http.server is only worth loading when serving
+            from ssrleakguard.core.service import ScanService
+
+            # Analyzer, patterns, connection pools and worker processes
+            # stay warm across jobs
+            batch = BatchScanner(client, **batch_options)
+            service = ScanService(batch, max_jobs=max_jobs, verbose=verbose)
+            service.serve(
+                address=address, socket_path=serve_socket, queue_dir=queue_dir
+            )
+
+        elif offline:
+            # Only loaded for offline scans, like the service
+            from ssrleakguard.core.offline import OfflineScanner
+
+            scanner = OfflineScanner(
+                concurrency=concurrency,
+                processes=processes,
+                verbose=verbose,
+                ignore_order=not ordered_lists,
+                instrumentation=instrumentation,
+                incremental_json=incremental_json,
+                max_json_nodes=max_json_nodes,
+                max_json_depth=max_json_depth,
+                snapshots=snapshots,
+            )
+            output.start(phase=2 if contexts else 1, batch=True)
+            try:
+                results = scanner.scan(
+                    har_files=har_files,
+                    html_dirs=html_dirs,
+                    contexts=contexts or None,
+                    on_result=output.write_result,
+                    on_error=output.write_error,
+                )
+            finally:
+                scanner.close()
+            output.finish(results["summary"])
+
+        elif crawl:
+            # Only loaded when crawling
+            from ssrleakguard.core.crawler import Crawler
+
+            analyzer = SSRAnalyzer(client, **analyzer_options)
+            seeds = read_url_list(urls_file) if urls_file else []
+            if url and url not in seeds:
+                seeds.insert(0, url)
+            crawler = Crawler(
+                client,
+                analyzer,
+                max_pages=max_pages,
+                max_depth=max_depth,
+                concurrency=concurrency,
+            )
+            output.start(phase=2 if contexts else 1, batch=True)
+            results = crawler.crawl(
+                seeds,
+                contexts=contexts or None,
+                on_result=output.write_result,
+                on_error=output.write_error,
+            )
+            output.finish(results["summary"])
+
+        elif watch:
+            urls = read_url_list(urls_file) if urls_file else []
+            if url and url not in urls:
+                urls.insert(0, url)
+            batch = BatchScanner(client, **batch_options)
+            summary = BatchSummary()
+            first_round = True
+
+            def on_result(result):
+                summary.add_result(result)
+                # After the baseline round only changed routes are shown
+                if first_round or result.get("drift_findings"):
+                    output.write_result(result)
+
+            def on_error(failed_url, error):
+                summary.add_error()
+                output.write_error(failed_url, error)
+
+            output.start(phase=2, batch=True)
+            try:
+                while True:
+                    batch.scan(
+                        urls, contexts=contexts, on_result=on_result, on_error=on_error
+                    )
+                    first_round = False
+                    time.sleep(watch)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                batch.close()
+            output.finish(summary.as_dict())
+
+        elif merge_paths:
+            try:
+                info, outcomes = merge_checkpoints(list(merge_paths))
+            except ValueError as exc:
+                raise click.UsageError(str(exc))
+            summary = BatchSummary()
+            output.start(phase=info.pop("phase"), batch=True)
+            for merged_url, status, outcome in outcomes:
+                if status == DONE:
+                    summary.add_result(outcome)
+                    output.write_result(outcome)
+                else:
+                    summary.add_error()
+                    output.write_error(merged_url, outcome)
+            totals = summary.as_dict()
+            totals["checkpoint"] = info
+            output.finish(totals)
+
+        elif urls_file or shard_spec or checkpoint_path:
+            urls = read_url_list(urls_file) if urls_file else []
+            if url and url not in urls:
+                urls.insert(0, url)
+            routes = shard_urls(urls, *shard)
+            urls = [route_url for _, route_url in routes]
+            phase = 2 if contexts else 1
+            summary = BatchSummary()
+            resumed = 0
+            output.start(phase=phase, batch=True)
+
+            if checkpoint_path:
+                checkpoint = CheckpointStore(checkpoint_path)
+                # Everything the stored results depend on, except the URLs
+                # and credential values
+                job = job_settings(
+                    contexts,
+                    cookies,
+                    ordered_lists=ordered_lists,
+                    incremental_json=incremental_json,
+                    max_json_nodes=max_json_nodes,
+                    max_json_depth=max_json_depth,
+                    data_endpoint=data_endpoint,
+                )
+                try:
+                    selected = set(urls)
+                    urls = checkpoint.begin(routes, job, phase, shard)
+                except ValueError as exc:
+                    raise click.UsageError(str(exc))
+                # URLs done by an earlier run are reported from the store
+                for _, done_url, _, result in checkpoint.records(DONE):
+                    if done_url in selected:
+                        resumed += 1
+                        summary.add_result(result)
+                        output.write_result(result)
+
+            def on_result(result):
+                if checkpoint is not None:
+                    checkpoint.record_result(result["url"], result)
+                summary.add_result(result)
+                output.write_result(result)
+
+            def on_error(failed_url, error):
+                if checkpoint is not None:
+                    checkpoint.record_error(failed_url, error)
+                summary.add_error()
+                output.write_error(failed_url, error)
+
+            batch = BatchScanner(client, **batch_options)
+            try:
+                # Results go to the sinks as they complete instead of
+                # being collected
+                batch.scan(
+                    urls,
+                    contexts=contexts or None,
+                    on_result=on_result,
+                    on_error=on_error,
+                )
+            finally:
+                batch.close()
+            totals = summary.as_dict()
+            if shard_spec or checkpoint_path:
+                totals["checkpoint"] = {"shard": f"{shard[0]}/{shard[1]}", "resumed": resumed}
+            output.finish(totals)
+
         else:
+            analyzer = SSRAnalyzer(client, **analyzer_options)
+            # Phase 2 if contexts are provided
+            if contexts:
+                results = analyzer.analyze_with_contexts(url, contexts)
             # Phase 1
-            results = analyzer.analyze(url)
-            reporter.print_console_report(results)
-    
+            elif streaming:
+                results = analyzer.analyze_stream(
+                    url,
+                    max_bytes=max_bytes,
+                    stop_on_critical=stop_on_critical,
+                )
+            else:
+                results = analyzer.analyze(url)
+            output.start(phase=2 if contexts else 1, batch=False)
+            with instrumentation.timer("report"):
+                output.write_result(results)
+            output.finish()
+
+        if timings:
+            reporter.print_timings(instrumentation.snapshot())
+        if timings_json:
+            instrumentation.export_json(timings_json)
+
     finally:
-        # Restore stdout and close report file
-        if not no_report and report_file:
-            print()
-            print("=" * 70)
-            sys.stdout = original_stdout
-            report_file.close()
+        output.close()
+        if analyzer is not None:
+            analyzer.close()
+        if snapshots is not None:
+            snapshots.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if report_path is not None:
             print(f"✓ Report saved to: {report_path}")
-            print("=" * 70)
 
 
 if __name__ == "__main__":
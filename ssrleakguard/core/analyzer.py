@@ -1,29 +1,554 @@
+import hashlib
+import itertools
+import json
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+from pathlib import PurePath
+from urllib.parse import urlsplit
 from ssrleakguard.detectors.ssr_detector import SSRDetector
+from ssrleakguard.detectors.json_events import (
+    JSONEventParser,
+    JSONLimitExceeded,
+)
 from ssrleakguard.detectors.nextjs_parser import NextJSParser
-from ssrleakguard.detectors.secret_scanner import SecretScanner
+from ssrleakguard.detectors.secret_scanner import (
+    SecretScanner,
+    StreamScanner,
+    deduplicate_findings,
+    fingerprint,
+)
 from ssrleakguard.utils.normalizer import normalize_ssr_data
-from ssrleakguard.core.differ import diff_ssr_states
+from ssrleakguard.core.differ import StateClasses, diff_ssr_states
+from ssrleakguard.core.cache import ResultCache, content_hash
 from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.document import (
+    HTMLDocument,
+    StreamedDocument,
+    read_html_file,
+)
+from ssrleakguard.core.http_client import response_body
+from ssrleakguard.utils.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, ThreadPoolExecutor
+
+    from ssrleakguard.core.snapshots import SnapshotStore
+
+
+# Analyzer owned by each worker process of a pool from create_process_pool
+_worker_analyzer = None
+
+# In-memory __NEXT_DATA__ is handed to the incremental parser in pieces of
+# this many characters, so it is never copied out of the HTML as a whole
+_JSON_PIECE = 1 << 20
+
+
+def _init_worker(options: Dict):
+    global _worker_analyzer
+    # Compiles the secret patterns once per worker process
+    _worker_analyzer = SSRAnalyzer(client=None, **options)
+
+
+def _run_in_worker(method: str, args: tuple, instrumented: bool):
+    analyzer = _worker_analyzer
+    if not instrumented:
+        return getattr(analyzer, method)(*args), None
+
+    # Measurements are taken per call and merged by the parent analyzer
+    analyzer.instrumentation = Instrumentation()
+    try:
+        value = getattr(analyzer, method)(*args)
+        return value, analyzer.instrumentation.snapshot()
+    finally:
+        analyzer.instrumentation = NULL_INSTRUMENTATION
+
+
+def create_process_pool(processes: int, **options) -> "Executor":
+    """
+    Create a process pool for the CPU-bound parse and scan stages
+
+    Each worker builds its own analyzer when it starts, so patterns are
+    compiled once per process rather than once per page.
+
+    Args:
+        processes: Number of worker processes
+        **options: SSRAnalyzer options for the workers' analyzers, such
+            as incremental_json
+
+    Returns:
+        ProcessPoolExecutor to pass to SSRAnalyzer
+    """
+    # multiprocessing is only imported when worker processes are requested
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(options,)
+    )
+
+
+class _IncrementalNextData:
+    """
+    Scans __NEXT_DATA__ leaf by leaf while its JSON is being parsed
+
+    Feed the JSON text in pieces and call close at the end. Invalid JSON
+    discards the findings; a node or depth limit stops the scan but keeps
+    the findings made up to that point.
+    """
+
+    def __init__(
+        self,
+        scanner: SecretScanner,
+        max_nodes: Optional[int],
+        max_depth: Optional[int],
+    ):
+        self.scanner = scanner
+        self.parser = JSONEventParser(
+            max_nodes=max_nodes, max_depth=max_depth, keys=True
+        )
+        self.findings: List[Dict] = []
+        self.valid = True
+        # First character of the payload, to tell an object from the rest
+        self._root = ""
+        # Message of the limit that stopped the scan, if any
+        self.limit: Optional[str] = None
+        self.build_id: Optional[str] = None
+        self.page: Optional[str] = None
+        self._stopped = False
+
+    @property
+    def covered(self) -> bool:
+        """Whether the payload is an object whose every leaf was scanned"""
+        return self.valid and self.limit is None and self._root == "{"
+
+    def feed(self, text: str):
+        if not self._root:
+            self._root = text.lstrip(" \t\n\r")[:1]
+        self._scan(self.parser.feed, text)
+
+    def close(self):
+        self._scan(self.parser.close)
+        self._stopped = True
+        # Page props first, like the scan of a parsed payload
+        self.findings.sort(
+            key=lambda f: f["data_path"].startswith("__NEXT_DATA__")
+        )
+
+    def _scan(self, step: Callable, *args):
+        if self._stopped:
+            return
+        try:
+            found = self.scanner.scan_data_structure(
+                self._leaves(step(*args))
+            )
+        except ValueError:
+            self.valid = False
+            self.findings = []
+            self._stopped = True
+            return
+        self.findings.extend(found)
+
+    def _leaves(self, events):
+        try:
+            for path, value in NextJSParser.next_data_paths(events):
+                if isinstance(value, str):
+                    if path == "__NEXT_DATA__.buildId":
+                        self.build_id = value
+                    elif path == "__NEXT_DATA__.page":
+                        self.page = value
+                yield path, value
+        except JSONLimitExceeded as exc:
+            self.limit = str(exc)
+            self._stopped = True
+
+
+def _data_missing(exc: Exception) -> bool:
+    """Whether a data endpoint fetch failed because there is no endpoint"""
+    # Invalid JSON or a payload without pageProps is a ValueError
+    if isinstance(exc, ValueError):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code == 404
+
+
+def _credentials_key(cookies: Dict[str, str], headers: Dict[str, str]) -> str:
+    """Short hash of the cookies and headers a page was fetched with"""
+    credentials = json.dumps([cookies, headers], sort_keys=True).encode()
+    return hashlib.sha256(credentials).hexdigest()[:16]
 
 
 class SSRAnalyzer:
-    def __init__(self, client, verbose=False):
+    def __init__(
+        self,
+        client,
+        verbose=False,
+        process_pool: Optional["Executor"] = None,
+        cache: Optional[ResultCache] = None,
+        ignore_order: bool = True,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+        incremental_json: bool = False,
+        max_json_nodes: Optional[int] = None,
+        max_json_depth: Optional[int] = None,
+        data_endpoint: bool = False,
+        snapshots: Optional["SnapshotStore"] = None,
+    ):
         self.client = client
+        # Phase 1 results are cached per session like Phase 2 states are
+        # per context: a page fetched with --cookie may show more
+        self._session_key = ""
+        if client is not None:
+            self._session_key = _credentials_key(
+                client.session.cookies.get_dict(), dict(client.session.headers)
+            )
         self.verbose = verbose
         self.ssr_detector = SSRDetector()
         self.nextjs_parser = NextJSParser()
         self.secret_scanner = SecretScanner()
+        self.instrumentation = instrumentation
+        # Fetching stays in the calling thread; parsing and scanning move
+        # to the pool and only the results come back
+        self.process_pool = process_pool
+        self.cache = cache
+        # Compare lists in Phase 2 states as unordered collections
+        self.ignore_order = ignore_order
+        # Phase 1 scans __NEXT_DATA__ while parsing it, without building
+        # the dict tree; the caps only apply in this mode and enable it
+        self.max_json_nodes = max_json_nodes
+        self.max_json_depth = max_json_depth
+        self.incremental_json = (
+            incremental_json
+            or max_json_nodes is not None
+            or max_json_depth is not None
+        )
+        # Results computed under a cap may be partial, so they are cached
+        # apart from complete ones
+        self._results_kind = "results"
+        if max_json_nodes is not None or max_json_depth is not None:
+            self._results_kind = f"results-n{max_json_nodes}-d{max_json_depth}"
+        # Fetch page props from /_next/data/<buildId>/ once a site's build
+        # ID is known, instead of downloading and parsing the HTML
+        self.data_endpoint = data_endpoint
+        # Site -> build ID, or None for sites found not to have one
+        self._build_ids: Dict[str, Optional[str]] = {}
+        self._build_ids_lock = threading.Lock()
+        # Held while a site's build ID is fetched, so it is fetched once
+        self._discovery_locks: Dict[str, threading.Lock] = {}
+        # Phase 2 states are compared with the previous run's snapshots
+        self.snapshots = snapshots
+        # Fetches the contexts of every route; built on first use
+        self._context_pool: Optional["ThreadPoolExecutor"] = None
+        self._context_pool_lock = threading.Lock()
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        return self._instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, instrumentation: Instrumentation):
+        self._instrumentation = instrumentation
+        self.secret_scanner.instrumentation = instrumentation
 
-    def _log(self, msg):
+    def log(self, msg):
+        """Print a debug message in verbose mode"""
         if self.verbose:
             print(f"[DEBUG] {msg}")
 
+    def _offload(self, method: str, *args) -> Any:
+        """Run an analyzer method in the process pool, if there is one"""
+        if self.process_pool is None:
+            return getattr(self, method)(*args)
+
+        value, snapshot = self.process_pool.submit(
+            _run_in_worker, method, args, self.instrumentation.enabled
+        ).result()
+        if snapshot is not None:
+            self.instrumentation.merge(snapshot)
+        return value
+
+    def fetch(self, client, url: str, headers: Optional[Dict] = None):
+        """GET url with client, counting the request and its bytes"""
+        with self.instrumentation.timer("fetch"):
+            response = client.get(url, headers=headers)
+        self.instrumentation.count("pages_fetched")
+        self.instrumentation.count("bytes_fetched", len(response.content))
+        return response
+
+    def _body(self, response) -> Union[str, bytes]:
+        """Body to parse and scan: raw bytes when ASCII, else decoded"""
+        return response_body(
+            response, allow_bytes=self.secret_scanner.accepts_bytes
+        )
+
+    def _load_page(self, page: Union[str, bytes, PurePath]) -> Union[str, bytes]:
+        if not isinstance(page, PurePath):
+            return page
+        with self.instrumentation.timer("read"):
+            html = read_html_file(
+                page, allow_bytes=self.secret_scanner.accepts_bytes
+            )
+        self.instrumentation.count("bytes_read", len(html))
+        return html
+
+    def analyze_saved(
+        self, url: str, page: Union[str, bytes, PurePath], kind: str = "html"
+    ) -> Dict:
+        """
+        Phase 1 on a response that is not fetched, e.g. from a HAR file
+
+        Runs in the process pool when there is one. A saved file is passed
+        as its path and read by the worker, so its content never crosses
+        processes.
+
+        Args:
+            url: URL the response was served at
+            page: HTML (see analyze_html), or the JSON text of a data
+                endpoint response with kind "data"
+            kind: "html" or "data"
+        """
+        start = time.perf_counter()
+        method = "analyze_data" if kind == "data" else "analyze_html"
+        results = self._offload(method, url, page)
+        self.instrumentation.record_route(url, time.perf_counter() - start)
+        return results
+
+    def saved_state(
+        self, page: Union[str, bytes, PurePath], kind: str = "html"
+    ) -> Optional[Dict]:
+        """
+        State of a saved response for compare_states, see analyze_saved
+
+        Returns:
+            Normalized state, or None for a page without __NEXT_DATA__
+        """
+        method = "data_state" if kind == "data" else "context_state"
+        return self._offload(method, page)
+
+    def _fetch_cached(
+        self,
+        client,
+        url: str,
+        context: str,
+        kind: str,
+        compute: Callable[[str], Any],
+    ) -> Any:
+        """
+        Fetch a page and compute a value from its HTML, via the result cache
+
+        A conditional request is sent when a value for the URL is cached.
+        On 304, or when the body hash matches a cached object, the cached
+        value is returned and compute is not called.
+        """
+        if self.cache is None:
+            return compute(self._body(self.fetch(client, url)))
+
+        cached = self.cache.lookup(url, context, kind)
+        headers = None
+        if cached is not None:
+            headers = ResultCache.conditional_headers(cached[0])
+
+        response = self.fetch(client, url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self.log(f"Not modified, using cached {kind}: {url}")
+            self.instrumentation.count("cache_hits")
+            return cached[1]
+
+        body_hash = content_hash(response.content)
+        stored = self.cache.load(body_hash, kind)
+        if stored is not None:
+            self.log(f"Content unchanged, using cached {kind}: {url}")
+            self.instrumentation.count("cache_hits")
+            value = stored["value"]
+        else:
+            value = compute(self._body(response))
+
+        self.cache.store(
+            url,
+            context,
+            kind,
+            body_hash,
+            value,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return value
+
+    @staticmethod
+    def _site(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _remember_build_id(self, url: str, build_id: Optional[str]):
+        with self._build_ids_lock:
+            self._build_ids[self._site(url)] = build_id
+
+    def _forget_build_id(self, url: str, build_id: str):
+        """Drop a build ID found stale, unless it was replaced meanwhile"""
+        site = self._site(url)
+        with self._build_ids_lock:
+            if self._build_ids.get(site) == build_id:
+                del self._build_ids[site]
+
+    def _known_build_id(self, url: str) -> Optional[str]:
+        with self._build_ids_lock:
+            return self._build_ids.get(self._site(url))
+
+    def _discover_build_id(self, url: str) -> Optional[str]:
+        """Build ID of the site serving url, fetching the page if unknown"""
+        site = self._site(url)
+        with self._build_ids_lock:
+            if site in self._build_ids:
+                return self._build_ids[site]
+            lock = self._discovery_locks.setdefault(site, threading.Lock())
+
+        with lock:
+            with self._build_ids_lock:
+                if site in self._build_ids:
+                    return self._build_ids[site]
+
+            response = self.fetch(self.client, url)
+            with self.instrumentation.timer("extract_next_data"):
+                next_data = self.nextjs_parser.extract_next_data(
+                    HTMLDocument(self._body(response))
+                )
+            build_id = self.nextjs_parser.extract_build_id(next_data)
+            self.log(f"Build ID for {site}: {build_id}")
+            self._remember_build_id(url, build_id)
+            return build_id
+
     def analyze(self, url: str):
         """Phase 1: SSR Data Exposure Detection"""
-        response = self.client.get(url)
-        html = response.text
+        start = time.perf_counter()
+        results = None
+        if self.data_endpoint:
+            results = self._analyze_data_endpoint(url)
+
+        if results is None:
+
+            def compute(html: str) -> Dict:
+                return self._offload("analyze_html", url, html)
+
+            results = self._fetch_cached(
+                self.client, url, self._session_key, self._results_kind, compute
+            )
+            if self.data_endpoint:
+                self._remember_build_id(url, results.get("build_id"))
+
+        self.instrumentation.record_route(url, time.perf_counter() - start)
+        # Cached objects are shared by every URL serving the same body
+        return dict(results, url=url)
+
+    def _analyze_data_endpoint(self, url: str) -> Optional[Dict]:
+        """Phase 1 from the route's data endpoint; None to use the HTML"""
+        build_id = self._known_build_id(url)
+        if build_id is None:
+            return None
+        data_url = self.nextjs_parser.data_url(url, build_id)
+
+        def compute(text: str) -> Dict:
+            return self._offload("analyze_data", url, text)
+
+        try:
+            results = self._fetch_cached(
+                self.client,
+                data_url,
+                self._session_key,
+                f"data-{self._results_kind}",
+                compute,
+            )
+        except Exception as exc:
+            if not _data_missing(exc):
+                raise
+            self.log(f"No data endpoint, scanning the HTML: {data_url}")
+            self.instrumentation.count("data_endpoint_misses")
+            return None
+
+        self.instrumentation.count("data_endpoint_hits")
+        return dict(results, data_url=data_url)
+
+    def _parse_data(self, text: str) -> Dict:
+        with self.instrumentation.timer("extract_next_data"):
+            data = json.loads(text)
+        if not isinstance(data, dict) or "pageProps" not in data:
+            raise ValueError("Not a Next.js data payload")
+        return data
+
+    def analyze_data(self, url: str, text: str) -> Dict:
+        """
+        Phase 1 on the JSON served by a route's data endpoint
+
+        Only the page props are available there, so the HTML body and
+        the rest of __NEXT_DATA__ are not scanned.
+
+        Raises:
+            ValueError: If text is not a Next.js data payload
+        """
+        results = {
+            "url": url,
+            "ssr_detected": True,
+            "framework": "Next.js",
+            "metadata": {
+                "is_ssr": True,
+                "framework": "Next.js",
+                "confidence": "high",
+                "indicators": ["Next.js data endpoint"],
+            },
+            "findings": [],
+            "source": "data_endpoint",
+        }
+
+        if self.incremental_json:
+            if '"pageProps"' not in text:
+                raise ValueError("Not a Next.js data payload")
+            with self.instrumentation.timer("scan_props"):
+                # Wrapped so paths match those of __NEXT_DATA__
+                incremental = self._incremental_next_data()
+                incremental.feed('{"props":')
+                for start in range(0, len(text), _JSON_PIECE):
+                    incremental.feed(text[start:start + _JSON_PIECE])
+                incremental.feed("}")
+                incremental.close()
+            if not incremental.valid:
+                raise ValueError("Not a Next.js data payload")
+            prop_findings = incremental.findings
+            if incremental.limit:
+                results["next_data_limit"] = incremental.limit
+        else:
+            data = self._parse_data(text)
+            prop_findings = self._scan_next_data({"props": data})
+
+        results["findings"] = deduplicate_findings(prop_findings)
+        self.instrumentation.count("findings", len(results["findings"]))
+        return results
 
-        ssr_info = self.ssr_detector.detect_ssr(html)
+    def analyze_html(
+        self,
+        url: str,
+        html: Union[str, bytes, PurePath],
+        document: Optional[HTMLDocument] = None,
+    ):
+        """
+        Phase 1 on an already fetched page
+
+        Args:
+            url: Page URL
+            html: Page HTML, or its raw bytes when they are ASCII (see
+                response_body); bytes are tokenized and scanned as is.
+                A path is read with read_html_file.
+            document: The page already parsed, e.g. by a crawler that
+                also reads its links; parsed here if not given
+        """
+        instrumentation = self.instrumentation
+        html = self._load_page(html)
+        # Parsed once and shared by the detector and the parser
+        if document is None:
+            with instrumentation.timer("parse"):
+                document = HTMLDocument(html).parse()
+
+        with instrumentation.timer("detect_ssr"):
+            ssr_info = self.ssr_detector.detect_ssr(document)
 
         results = {
             "url": url,
@@ -36,43 +561,467 @@ class SSRAnalyzer:
         if not ssr_info["is_ssr"]:
             return results
 
-        next_data = self.nextjs_parser.extract_next_data(html)
-        if next_data:
-            page_props = self.nextjs_parser.extract_page_props(next_data)
-            if page_props:
-                paths = self.nextjs_parser.extract_all_data_paths(page_props)
-                results["findings"].extend(
-                    self.secret_scanner.scan_data_structure(paths)
+        if self.incremental_json:
+            span = document.next_data_span
+            with instrumentation.timer("scan_props"):
+                incremental = self._incremental_next_data()
+                if span is not None:
+                    for start in range(span[0], span[1], _JSON_PIECE):
+                        piece = html[start:min(start + _JSON_PIECE, span[1])]
+                        if isinstance(piece, bytes):
+                            piece = piece.decode("ascii")
+                        incremental.feed(piece)
+                incremental.close()
+            prop_findings = incremental.findings
+            covered = incremental.covered
+            build_id = incremental.build_id
+            page = incremental.page
+            if incremental.limit:
+                results["next_data_limit"] = incremental.limit
+        else:
+            with instrumentation.timer("extract_next_data"):
+                next_data = self.nextjs_parser.extract_next_data(document)
+            prop_findings = self._scan_next_data(next_data)
+            covered = isinstance(next_data, dict)
+            build_id = self.nextjs_parser.extract_build_id(next_data)
+            page = next_data.get("page") if isinstance(next_data, dict) else None
+        if build_id:
+            results["build_id"] = build_id
+        if isinstance(page, str):
+            # Route pattern, e.g. /blog/[slug]
+            results["page"] = page
+
+        # The __NEXT_DATA__ JSON was just scanned leaf by leaf, keys
+        # included; scanning its raw text again would only report the same
+        # secrets twice. Payloads that are not an object, or not walked to
+        # the end, are scanned as text too
+        exclude = []
+        if covered:
+            exclude.append(document.next_data_span)
+        with instrumentation.timer("scan_html"):
+            body_findings = self.secret_scanner.scan_content(
+                html, context="HTML body", exclude=exclude
+            )
+        instrumentation.count(
+            "html_bytes_scanned",
+            len(html) - sum(end - start for start, end in exclude),
+        )
+
+        results["findings"] = deduplicate_findings(
+            prop_findings + body_findings
+        )
+        instrumentation.count("findings", len(results["findings"]))
+
+        return results
+
+    def _incremental_next_data(self) -> _IncrementalNextData:
+        return _IncrementalNextData(
+            self.secret_scanner, self.max_json_nodes, self.max_json_depth
+        )
+
+    def _scan_next_data(self, next_data: Optional[Dict]) -> List[Dict]:
+        """
+        Scan all of __NEXT_DATA__ as structured data
+
+        Page props keep their paths relative to pageProps; anything else
+        in the payload (query, runtimeConfig, other props) is reported
+        under "__NEXT_DATA__.".
+        """
+        if not isinstance(next_data, dict) or not next_data:
+            return []
+        parser = self.nextjs_parser
+        # Leaves are flattened lazily while they are scanned, so the time
+        # spent flattening is part of scan_props. Keys are scanned too
+        paths = iter(())
+        page_props = parser.extract_page_props(next_data)
+        if isinstance(page_props, (dict, list)):
+            paths = parser.iter_data_paths(page_props, keys=True)
+        elif page_props is not None:
+            paths = iter((("__NEXT_DATA__.props.pageProps", page_props),))
+        rest = parser.extract_outside_page_props(next_data)
+        if rest:
+            paths = itertools.chain(
+                paths, parser.iter_data_paths(rest, "__NEXT_DATA__", keys=True)
+            )
+        with self.instrumentation.timer("scan_props"):
+            return self.secret_scanner.scan_data_structure(paths)
+
+    def analyze_stream(
+        self,
+        url: str,
+        chunk_size: int = 65536,
+        max_bytes: Optional[int] = None,
+        stop_on_critical: bool = False,
+        on_finding: Optional[Callable[[Dict], None]] = None,
+    ):
+        """
+        Phase 1 over a streamed response body
+
+        The body is tokenized and scanned chunk by chunk, so memory stays
+        bounded by the chunk size, the scan overlap and the __NEXT_DATA__
+        payload. Findings are passed to on_finding as soon as the page is
+        known to be SSR, before the download completes.
+
+        Args:
+            url: Target URL
+            chunk_size: Bytes read per chunk
+            max_bytes: Stop downloading after this many body bytes
+            stop_on_critical: Stop at the first critical finding
+            on_finding: Called with each finding as it is produced
+
+        Returns:
+            Phase 1 results, plus bytes_read, truncated and stopped_early
+        """
+        incremental = None
+        if self.incremental_json:
+            incremental = self._incremental_next_data()
+            document = StreamedDocument(on_next_data=incremental.feed)
+        else:
+            document = StreamedDocument()
+        body_scanner = StreamScanner(self.secret_scanner, context="HTML body")
+        body_findings: List[Dict] = []
+        # Body findings inside __NEXT_DATA__; dropped at the end if the
+        # JSON parses, since the structured scan covers them
+        held: List[Dict] = []
+        emitted = set()
+        reported = 0
+        ssr_confirmed = False
+        stopped_early = False
+        instrumentation = self.instrumentation
+        start = time.perf_counter()
+
+        with self.client.stream(
+            url, chunk_size=chunk_size, max_bytes=max_bytes
+        ) as body:
+            for chunk in body:
+                document.feed(chunk)
+                found = body_scanner.feed(chunk)
+                self._hold_next_data(document, found, body_findings, held)
+
+                if on_finding is not None:
+                    if not ssr_confirmed:
+                        ssr_confirmed = self.ssr_detector.detect_ssr(
+                            document
+                        )["is_ssr"]
+                    if ssr_confirmed:
+                        self._emit(
+                            body_findings[reported:], emitted, on_finding
+                        )
+                        reported = len(body_findings)
+
+                if stop_on_critical and any(
+                    f["severity"] == "critical" for f in found
+                ):
+                    self.log(
+                        f"Critical finding, stopping after "
+                        f"{body.bytes_read} bytes"
+                    )
+                    stopped_early = True
+                    break
+
+            if not stopped_early:
+                self._hold_next_data(
+                    document, body_scanner.close(), body_findings, held
                 )
+            document.close()
+
+        # Download, tokenizing and body scanning overlap in a stream, so
+        # they are timed together
+        instrumentation.add_time("stream", time.perf_counter() - start)
+        instrumentation.count("pages_fetched")
+        instrumentation.count("bytes_fetched", body.bytes_read)
+
+        with instrumentation.timer("detect_ssr"):
+            ssr_info = self.ssr_detector.detect_ssr(document)
+
+        results = {
+            "url": url,
+            "ssr_detected": ssr_info["is_ssr"],
+            "framework": ssr_info["framework"],
+            "metadata": ssr_info,
+            "findings": [],
+            "bytes_read": body.bytes_read,
+            "truncated": body.truncated,
+            "stopped_early": stopped_early,
+        }
+
+        if not ssr_info["is_ssr"]:
+            instrumentation.record_route(url, time.perf_counter() - start)
+            return results
 
-        results["findings"].extend(
-            self.secret_scanner.scan_content(html, context="HTML body")
+        if incremental is not None:
+            # Leaves were scanned while the payload downloaded
+            incremental.close()
+            prop_findings = incremental.findings
+            covered = incremental.covered
+            if incremental.limit:
+                results["next_data_limit"] = incremental.limit
+        else:
+            with instrumentation.timer("extract_next_data"):
+                next_data = self.nextjs_parser.extract_next_data(document)
+            prop_findings = self._scan_next_data(next_data)
+            covered = isinstance(next_data, dict)
+        if not covered:
+            body_findings.extend(held)
+        if on_finding is not None:
+            self._emit(
+                prop_findings + body_findings[reported:], emitted, on_finding
+            )
+
+        results["findings"] = deduplicate_findings(
+            prop_findings + body_findings
         )
+        instrumentation.count("findings", len(results["findings"]))
+        instrumentation.record_route(url, time.perf_counter() - start)
 
         return results
 
-    def analyze_with_contexts(self, url: str, contexts: list[AuthContext]):
-        """Phase 2: Authorization Inconsistency Detection"""
-        ssr_states = {}
+    @staticmethod
+    def _hold_next_data(
+        document: StreamedDocument,
+        found: List[Dict],
+        body_findings: List[Dict],
+        held: List[Dict],
+    ):
+        span = document.next_data_span
+        for finding in found:
+            # The span end is -1 while the script is still open
+            if span is not None and finding["position"] >= span[0] and (
+                span[1] < 0 or finding["position"] < span[1]
+            ):
+                held.append(finding)
+            else:
+                body_findings.append(finding)
 
-        for ctx in contexts:
-            self._log(f"Fetching context: {ctx.name}")
-            client = self.client.clone_with_cookies(ctx.cookies)
+    @staticmethod
+    def _emit(
+        findings: List[Dict],
+        emitted: set,
+        on_finding: Callable[[Dict], None],
+    ):
+        # Each distinct secret is passed on once
+        for finding in findings:
+            key = (finding["type"], fingerprint(finding["secret"]))
+            if key not in emitted:
+                emitted.add(key)
+                on_finding(finding)
 
-            response = client.get(url)
-            html = response.text
+    @staticmethod
+    def _context_key(ctx: AuthContext) -> str:
+        # The cookie and header values are part of the key: the same
+        # context name with another session must not reuse a cached state
+        return f"{ctx.name}:{_credentials_key(ctx.cookies, ctx.headers)}"
 
-            next_data = self.nextjs_parser.extract_next_data(html)
-            if not next_data:
-                continue
+    def _fetch_context_state(self, url: str, ctx: AuthContext) -> Optional[Dict]:
+        self.log(f"Fetching context: {ctx.name}")
+        client = self.client.clone_with_cookies(ctx.cookies, ctx.headers)
+
+        def compute(html: str) -> Optional[Dict]:
+            return self._offload("context_state", html)
+
+        return self._fetch_cached(
+            client, url, self._context_key(ctx), "state", compute
+        )
+
+    def _fetch_context_data_state(self, data_url: str, ctx: AuthContext) -> Dict:
+        self.log(f"Fetching context data: {ctx.name}")
+        client = self.client.clone_with_cookies(ctx.cookies, ctx.headers)
+
+        def compute(text: str) -> Dict:
+            return self._offload("data_state", text)
+
+        return self._fetch_cached(
+            client, data_url, self._context_key(ctx), "data-state", compute
+        )
+
+    def context_state(self, html: Union[str, bytes, PurePath]) -> Optional[Dict]:
+        """Normalized __NEXT_DATA__ of a page, or None if it has none"""
+        html = self._load_page(html)
+        with self.instrumentation.timer("extract_next_data"):
+            next_data = self.nextjs_parser.extract_next_data(
+                HTMLDocument(html)
+            )
+        if not next_data:
+            return None
+
+        with self.instrumentation.timer("normalize"):
+            return normalize_ssr_data(next_data)
+
+    def data_state(self, text: str) -> Dict:
+        """
+        Normalized state from a data endpoint payload
+
+        The payload is placed under "props" like in __NEXT_DATA__, so
+        the diff reports the same paths in both modes.
+
+        Raises:
+            ValueError: If text is not a Next.js data payload
+        """
+        data = self._parse_data(text)
+        with self.instrumentation.timer("normalize"):
+            return normalize_ssr_data({"props": data})
+
+    def _map_contexts(
+        self, fetch: Callable[[AuthContext], Any], contexts: List[AuthContext]
+    ) -> List[Any]:
+        # Contexts are fetched concurrently over the shared connection pool;
+        # results are collected in input order so the baseline stays first.
+        # One executor serves every route, sized like the connection pool
+        with self._context_pool_lock:
+            if self._context_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._context_pool = ThreadPoolExecutor(
+                    max_workers=max(1, self.client.pool_size)
+                )
+            pool = self._context_pool
+        return list(pool.map(fetch, contexts))
+
+    def close(self):
+        """Shut down the threads that fetch contexts, if started"""
+        with self._context_pool_lock:
+            if self._context_pool is not None:
+                self._context_pool.shutdown()
+                self._context_pool = None
 
-            normalized = normalize_ssr_data(next_data)
-            ssr_states[ctx.name] = normalized
+    def _data_context_states(
+        self, url: str, contexts: List[AuthContext]
+    ) -> Optional[List[Dict]]:
+        """States of every context from the data endpoint; None to use HTML"""
+        build_id = self._discover_build_id(url)
+        if build_id is None:
+            return None
+        data_url = self.nextjs_parser.data_url(url, build_id)
 
-        authorization_findings = diff_ssr_states(ssr_states)
+        # A context whose state comes from the HTML would differ in every
+        # field outside pageProps, so all contexts use the same source
+        try:
+            states = self._map_contexts(
+                lambda ctx: self._fetch_context_data_state(data_url, ctx),
+                contexts,
+            )
+        except Exception as exc:
+            if not _data_missing(exc):
+                raise
+            self.log(f"No data endpoint, using the HTML: {data_url}")
+            self.instrumentation.count("data_endpoint_misses")
+            # A redeploy retires the build ID; the next route looks it up
+            # again rather than missing on every route from now on
+            self._forget_build_id(url, build_id)
+            return None
 
-        return {
+        self.instrumentation.count("data_endpoint_hits")
+        return states
+
+    def analyze_with_contexts(
+        self,
+        url: str,
+        contexts: list[AuthContext],
+        baseline_html: Optional[Union[str, bytes]] = None,
+    ):
+        """
+        Phase 2: Authorization Inconsistency Detection
+
+        Args:
+            url: Route URL
+            contexts: Contexts to compare, the baseline first
+            baseline_html: The page as the baseline context already fetched
+                it, e.g. by a crawler reading its links; only the other
+                contexts are fetched then
+        """
+        start = time.perf_counter()
+        states = None
+        if self.data_endpoint:
+            states = self._data_context_states(url, contexts)
+        if states is None and baseline_html is not None:
+            states = [self._offload("context_state", baseline_html)]
+            states.extend(
+                self._map_contexts(
+                    lambda ctx: self._fetch_context_state(url, ctx), contexts[1:]
+                )
+            )
+        elif states is None:
+            states = self._map_contexts(
+                lambda ctx: self._fetch_context_state(url, ctx), contexts
+            )
+
+        results = self.compare_states(
+            url, [ctx.name for ctx in contexts], states
+        )
+        self.instrumentation.record_route(url, time.perf_counter() - start)
+        return results
+
+    def compare_states(
+        self, url: str, names: List[str], states: List[Optional[Dict]]
+    ) -> Dict:
+        """
+        Phase 2 over states already taken, e.g. from saved responses
+
+        Args:
+            url: Route URL
+            names: Context names, the baseline first
+            states: State of each context (context_state or data_state),
+                None for a page without one
+
+        Returns:
+            Phase 2 results
+        """
+        # Contexts with identical states form one class; only the first
+        # state of each class is kept, diffed and snapshotted
+        present = []
+        ssr_states = {}
+        grouping = StateClasses(self.ignore_order)
+        for name, normalized in zip(names, states):
+            if normalized is None:
+                continue
+            present.append(name)
+            with self.instrumentation.timer("fingerprint"):
+                if grouping.add(name, normalized):
+                    ssr_states[name] = normalized
+        del states
+        classes = grouping.classes
+        self.instrumentation.count("context_classes", len(classes))
+
+        with self.instrumentation.timer("diff"):
+            authorization_findings = diff_ssr_states(
+                ssr_states, ignore_order=self.ignore_order, classes=classes
+            )
+
+        results = {
             "url": url,
-            "contexts": list(ssr_states.keys()),
+            "contexts": present,
+            "context_classes": [
+                {"fingerprint": state_id[:16], "contexts": members}
+                for state_id, members in grouping.members.items()
+            ],
             "authorization_findings": authorization_findings,
-        }
\ No newline at end of file
+        }
+        if self.snapshots is not None:
+            results["drift_findings"] = self._record_snapshots(
+                url, ssr_states, classes
+            )
+        return results
+
+    def _record_snapshots(
+        self, url: str, states: Dict[str, Dict], classes: List[List[str]]
+    ) -> List[Dict]:
+        """Store each context's state and report changes since the last run"""
+        findings = []
+        with self.instrumentation.timer("snapshot"):
+            for members in classes:
+                prepared = self.snapshots.prepare(
+                    states[members[0]], ignore_order=self.ignore_order
+                )
+                for name in members:
+                    snapshot = self.snapshots.record(url, name, prepared=prepared)
+                    self.instrumentation.count(f"snapshots_{snapshot['status']}")
+                    if snapshot.get("diff"):
+                        findings.append(
+                            {
+                                "type": "state_drift",
+                                "context": name,
+                                "previous": snapshot["previous"],
+                                "diff": snapshot["diff"],
+                            }
+                        )
+        return findings
@@ -0,0 +1,218 @@
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+)
+from ssrleakguard.core.analyzer import SSRAnalyzer, create_process_pool
+from ssrleakguard.core.cache import ResultCache
+from ssrleakguard.utils.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+)
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.http_client import HTTPClient
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from ssrleakguard.core.snapshots import SnapshotStore
+
+
+def read_url_list(stream: TextIO) -> List[str]:
+    """
+    Read URLs from a file or stdin, one per line
+
+    Blank lines and lines starting with "#" are skipped, and repeated URLs
+    are kept only once, in first-seen order.
+
+    Args:
+        stream: Open text stream
+
+    Returns:
+        List of URLs
+    """
+    urls = []
+    seen = set()
+    for line in stream:
+        url = line.strip()
+        if not url or url.startswith("#") or url in seen:
+            continue
+        seen.add(url)
+        urls.append(url)
+    return urls
+
+
+class BatchScanner:
+    """Scan many URLs concurrently through one SSRAnalyzer"""
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        concurrency: int = 8,
+        per_host: int = 4,
+        verbose: bool = False,
+        processes: int = 0,
+        cache: Optional[ResultCache] = None,
+        ignore_order: bool = True,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+        incremental_json: bool = False,
+        max_json_nodes: Optional[int] = None,
+        max_json_depth: Optional[int] = None,
+        data_endpoint: bool = False,
+        snapshots: Optional["SnapshotStore"] = None,
+    ):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        # Held around each request rather than each route, so a route's
+        # contexts and its data endpoint lookups all count against it
+        client.limit_per_host(self.per_host)
+        # With processes, threads only fetch; parsing and scanning run in
+        # worker processes so they are not serialized by the GIL
+        json_options = {
+            "incremental_json": incremental_json,
+            "max_json_nodes": max_json_nodes,
+            "max_json_depth": max_json_depth,
+        }
+        self.process_pool = None
+        if processes:
+            self.process_pool = create_process_pool(processes, **json_options)
+        self.analyzer = SSRAnalyzer(
+            client,
+            verbose=verbose,
+            process_pool=self.process_pool,
+            cache=cache,
+            ignore_order=ignore_order,
+            instrumentation=instrumentation,
+            data_endpoint=data_endpoint,
+            snapshots=snapshots,
+            **json_options,
+        )
+
+    def _scan_one(
+        self, url: str, contexts: Optional[List[AuthContext]]
+    ) -> Dict:
+        if contexts:
+            return self.analyzer.analyze_with_contexts(url, contexts)
+        return self.analyzer.analyze(url)
+
+    def scan(
+        self,
+        urls: Iterable[str],
+        contexts: Optional[List[AuthContext]] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        on_error: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict:
+        """
+        Scan URLs with bounded concurrency
+
+        Args:
+            urls: URLs to scan
+            contexts: Run Phase 2 with these contexts instead of Phase 1
+            on_result: Called with each result in input order as soon as
+                it is available. Results passed to it are not kept.
+            on_error: Called with (url, message) for each failed URL.
+                Errors passed to it are not kept.
+
+        Returns:
+            Aggregated results with per-URL results in input order,
+            errors and a summary
+        """
+        urls = list(urls)
+        results: List[Dict] = []
+        errors: List[Dict] = []
+        summary = BatchSummary()
+
+        # Only a window of URLs is in flight, so completed results do not
+        # pile up behind a slow one at the head of the queue
+        window = self.concurrency * 2
+        pending: Deque[Tuple[str, "Future"]] = deque()
+        queue = iter(urls)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                while len(pending) < window:
+                    url = next(queue, None)
+                    if url is None:
+                        break
+                    pending.append(
+                        (url, pool.submit(self._scan_one, url, contexts))
+                    )
+                if not pending:
+                    break
+
+                url, future = pending.popleft()
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    # One failing route must not abort the whole batch
+                    summary.add_error()
+                    if on_error is not None:
+                        on_error(url, str(exc))
+                    else:
+                        errors.append({"url": url, "error": str(exc)})
+                    continue
+
+                summary.add_result(result)
+                if on_result is not None:
+                    on_result(result)
+                else:
+                    results.append(result)
+
+        return {
+            "phase": 2 if contexts else 1,
+            "urls": urls,
+            "results": results,
+            "errors": errors,
+            "summary": summary.as_dict(),
+        }
+
+    def close(self):
+        """Shut down the worker processes and threads, if any"""
+        self.analyzer.close()
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+
+
+class BatchSummary:
+    """Running totals over batch results, without keeping the results"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.failed = 0
+        self.ssr_detected = 0
+        self.findings = 0
+        self.by_severity: Dict[str, int] = {}
+
+    def add_result(self, result: Dict):
+        self.scanned += 1
+        if result.get("ssr_detected"):
+            self.ssr_detected += 1
+        for finding in result.get("findings", []):
+            sev = finding.get("severity", "medium")
+            self.by_severity[sev] = self.by_severity.get(sev, 0) + 1
+            self.findings += 1
+        self.findings += len(result.get("authorization_findings", []))
+        self.findings += len(result.get("drift_findings", []))
+
+    def add_error(self):
+        self.failed += 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "scanned": self.scanned,
+            "failed": self.failed,
+            "ssr_detected": self.ssr_detected,
+            "findings": self.findings,
+            "by_severity": dict(self.by_severity),
+        }
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from ssrleakguard.detectors.finding import json_default
+from ssrleakguard.utils.patterns import pattern_set_version
+
+
+# Bumped whenever the shape of cached values changes
+FORMAT_VERSION = 2
+
+
+def content_hash(body: bytes) -> str:
+    """SHA-256 of a response body"""
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent, content-addressed cache of scan results
+
+    Layout under the cache directory:
+
+        index/<key>.json                    validators and body hash
+                                            for a URL + context
+        objects/<kind>-<version>-<hash>.json value computed from a body
+
+    Objects are keyed by the body hash together with the pattern-set
+    version, so identical pages share one entry and changing a pattern
+    invalidates everything computed with the old set. When the total size
+    exceeds max_bytes, least recently used files are removed first.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        version: Optional[str] = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.version = version or (
+            f"v{FORMAT_VERSION}.{pattern_set_version()}"
+        )
+        self._index_dir = self.directory / "index"
+        self._objects_dir = self.directory / "objects"
+        self._index_dir.mkdir(parents=True, exist_ok=True)
+        self._objects_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._files())
+
+    def _files(self):
+        for folder in (self._index_dir, self._objects_dir):
+            for entry in os.scandir(folder):
+                if entry.is_file():
+                    yield Path(entry.path)
+
+    @staticmethod
+    def _index_key(url: str, context: str, kind: str) -> str:
+        raw = "\0".join((kind, context, url)).encode()
+        return hashlib.sha256(raw).hexdigest()
+
+    def _object_path(self, body_hash: str, kind: str) -> Path:
+        return self._objects_dir / f"{kind}-{self.version}-{body_hash}.json"
+
+    def _read(self, path: Path) -> Optional[Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Reads count as use for the LRU eviction order
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path: Path, data: Any):
+        payload = json.dumps(
+            data, separators=(",", ":"), default=json_default
+        ).encode("utf-8")
+        tmp_path = path.with_name(
+            f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+
+        with self._lock:
+            try:
+                self._size -= path.stat().st_size
+            except OSError:
+                pass
+            os.replace(tmp_path, path)
+            self._size += len(payload)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        files = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort(key=lambda item: item[0])
+        self._size = sum(size for _, size, _ in files)
+        # Evict down to 90% so a full cache does not evict on every write
+        target = self.max_bytes * 0.9
+        for _, size, path in files:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+                self._size -= size
+            except OSError:
+                pass
+
+    def lookup(
+        self, url: str, context: str, kind: str
+    ) -> Optional[Tuple[Dict[str, str], Any]]:
+        """
+        Find the cached value for a URL + context
+
+        Args:
+            url: Target URL
+            context: Fingerprint of the session (Phase 1) or context
+            kind: What is cached, e.g. "results" or "state"
+
+        Returns:
+            (validators, value) when a value computed with the current
+            pattern set exists, otherwise None. validators holds the
+            ETag / Last-Modified to send as a conditional request.
+        """
+        key = self._index_key(url, context, kind)
+        index = self._read(self._index_dir / f"{key}.json")
+        if not index:
+            return None
+
+        stored = self.load(index["content_hash"], kind)
+        if stored is None:
+            return None
+        return index, stored["value"]
+
+    def load(self, body_hash: str, kind: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a value by response body hash
+
+        Args:
+            body_hash: content_hash() of the response body
+            kind: What is cached
+
+        Returns:
+            {"value": value} if cached (value itself may be None),
+            otherwise None
+        """
+        return self._read(self._object_path(body_hash, kind))
+
+    def store(
+        self,
+        url: str,
+        context: str,
+        kind: str,
+        body_hash: str,
+        value: Any,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """
+        Store a value and the validators of the response it came from
+
+        Args:
+            url: Target URL
+            context: Session or context fingerprint, see lookup
+            kind: What is cached
+            body_hash: content_hash() of the response body
+            value: JSON-serializable value
+            etag: ETag response header
+            last_modified: Last-Modified response header
+        """
+        object_path = self._object_path(body_hash, kind)
+        if not object_path.exists():
+            self._write(object_path, {"value": value})
+
+        key = self._index_key(url, context, kind)
+        self._write(
+            self._index_dir / f"{key}.json",
+            {
+                "url": url,
+                "context": context,
+                "content_hash": body_hash,
+                "etag": etag,
+                "last_modified": last_modified,
+            },
+        )
+
+    @staticmethod
+    def conditional_headers(validators: Dict[str, str]) -> Dict[str, str]:
+        """Build If-None-Match / If-Modified-Since from stored validators"""
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
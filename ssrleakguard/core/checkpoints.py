@@ -0,0 +1,368 @@
+import hashlib
+import heapq
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.detectors.finding import json_default
+from ssrleakguard.utils.patterns import pattern_set_version
+
+# Bumped whenever the layout of stored results changes
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS routes (
+    url TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT,
+    payload TEXT,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS routes_position ON routes (position);
+"""
+
+# Status of a route whose result is stored; failed routes are retried
+DONE = "done"
+FAILED = "failed"
+
+# Which of several stored outcomes of a route wins when merging
+_RANK = {None: 0, FAILED: 1, DONE: 2}
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    Shard from a --shard value
+
+    Args:
+        spec: "I/N", the I-th of N shards counting from 1
+
+    Returns:
+        (index, count)
+
+    Raises:
+        ValueError: If spec is malformed or out of range
+    """
+    index, _, count = spec.partition("/")
+    if not (index.isdigit() and count.isdigit()):
+        raise ValueError(f"Shard must be I/N, got {spec!r}")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_of(url: str, count: int) -> int:
+    """Shard (from 1) a URL belongs to among count shards"""
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % count + 1
+
+
+def shard_urls(
+    urls: List[str], index: int = 1, count: int = 1
+) -> List[Tuple[int, str]]:
+    """
+    URLs of one shard with their positions in the full list
+
+    URLs are assigned by a hash of the URL rather than by position, so a
+    route stays in its shard when the list is edited between runs.
+
+    Args:
+        urls: Full route list
+        index: Shard to keep, from 1
+        count: Number of shards
+
+    Returns:
+        (position, url) pairs in list order
+    """
+    if count == 1:
+        return list(enumerate(urls))
+    return [
+        (position, url)
+        for position, url in enumerate(urls)
+        if shard_of(url, count) == index
+    ]
+
+
+def job_settings(
+    contexts: List[AuthContext], cookies: Dict[str, str], **options: Any
+) -> Dict[str, Any]:
+    """
+    Settings a checkpoint's results depend on, for begin()
+
+    Contexts and cookies are described by name only: a session token
+    refreshed between two runs resumes the same job, and credentials never
+    reach the hash. The pattern set version is included, since results
+    written with other patterns would not match a fresh scan.
+
+    Args:
+        contexts: Phase 2 contexts, empty for Phase 1
+        cookies: Cookies sent in Phase 1
+        **options: Scan options the results depend on, e.g. JSON limits
+
+    Returns:
+        JSON-serializable settings
+    """
+    return dict(
+        options,
+        contexts=[
+            {
+                "name": ctx.name,
+                "cookies": sorted(ctx.cookies),
+                "headers": sorted(name.lower() for name in ctx.headers),
+            }
+            for ctx in contexts
+        ],
+        cookies=sorted(cookies),
+        patterns=pattern_set_version(),
+    )
+
+
+def job_key(job: Dict[str, Any]) -> str:
+    """Hash of a job's settings, see job_settings"""
+    text = json.dumps(job, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CheckpointStore:
+    """
+    SQLite record of a scan job's routes and of the result of each
+
+    begin() registers the routes of a shard and returns those still to
+    scan, so rerunning an interrupted job with the same store skips every
+    route already done. Results are committed as they are recorded and
+    survive the process being killed; routes that failed are scanned again
+    on the next run. Stores of several shards are combined by
+    merge_checkpoints.
+
+    Args:
+        path: SQLite database file
+    """
+
+    def __init__(self, path: str):
+        # sqlite3 is only imported once a store is opened
+        import sqlite3
+
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+        with self._db:
+            if self._meta("format") is None:
+                self._set_meta("format", str(FORMAT_VERSION))
+            elif self._meta("format") != str(FORMAT_VERSION):
+                raise ValueError(
+                    f"{path} was written by another version of the checkpoint format"
+                )
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _set_meta(self, key: str, value: str):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value)
+        )
+
+    @property
+    def meta(self) -> Dict[str, str]:
+        """Job key, phase and shard the store was written for"""
+        with self._lock:
+            return dict(self._db.execute("SELECT key, value FROM meta"))
+
+    def begin(
+        self,
+        routes: Iterable[Tuple[int, str]],
+        job: Dict[str, Any],
+        phase: int,
+        shard: Tuple[int, int] = (1, 1),
+    ) -> List[str]:
+        """
+        Register the routes of a job, or resume it
+
+        Args:
+            routes: (position, url) pairs, see shard_urls
+            job: Settings the results depend on, from job_settings; a
+                store written with other settings is not resumed
+            phase: 1 or 2
+            shard: (index, count) of this shard
+
+        Returns:
+            URLs not done yet, in position order
+
+        Raises:
+            ValueError: If the store holds results of another job or shard
+        """
+        routes = list(routes)
+        key = job_key(job)
+        shard_spec = f"{shard[0]}/{shard[1]}"
+        with self._lock, self._db:
+            for name, value in (("job", key), ("shard", shard_spec)):
+                stored = self._meta(name)
+                if stored is not None and stored != value:
+                    raise ValueError(
+                        f"{self.path} holds another scan job ({name} differs); "
+                        f"use a new checkpoint file"
+                    )
+            self._set_meta("job", key)
+            self._set_meta("shard", shard_spec)
+            self._set_meta("phase", str(phase))
+            # Positions follow the current list; routes dropped from it
+            # keep their results
+            self._db.executemany(
+                "INSERT INTO routes (url, position) VALUES (?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET position = excluded.position",
+                [(url, position) for position, url in routes],
+            )
+            done = {
+                url
+                for (url,) in self._db.execute(
+                    "SELECT url FROM routes WHERE status = ?", (DONE,)
+                )
+            }
+        return [url for _, url in sorted(routes) if url not in done]
+
+    def _finish(self, url: str, status: str, payload: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE routes SET status = ?, payload = ?, finished = ? "
+                "WHERE url = ?",
+                (status, payload, time.time(), url),
+            )
+
+    def record_result(self, url: str, result: Dict):
+        """Store the result of a route, marking it done"""
+        self._finish(url, DONE, json.dumps(result, default=json_default))
+
+    def record_error(self, url: str, error: str):
+        """Store why a route failed; it is retried on the next run"""
+        self._finish(url, FAILED, error)
+
+    def records(
+        self, status: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, Optional[str], Any]]:
+        """
+        Stored outcomes in position order, then URL order
+
+        Rows are read as they are consumed, so results are never all held
+        at once; nothing should be recorded before the iteration ends.
+
+        Args:
+            status: Only routes with this status; routes with no result
+                yet are included when not given, with a status of None
+
+        Yields:
+            (position, url, status, result dict or error message or None)
+        """
+        query = "SELECT position, url, status, payload FROM routes"
+        params: Tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        rows = self._db.execute(query + " ORDER BY position, url", params)
+        for position, url, row_status, payload in rows:
+            if row_status == DONE:
+                payload = json.loads(payload)
+            yield position, url, row_status, payload
+
+    def statuses(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """(url, status) of every route, without reading results"""
+        yield from self._db.execute("SELECT url, status FROM routes")
+
+    def progress(self) -> Dict[str, int]:
+        """Routes done, failed and pending"""
+        counts = {DONE: 0, FAILED: 0, "pending": 0}
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM routes GROUP BY status"
+            )
+            for status, count in rows:
+                counts[status or "pending"] = count
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def merge_checkpoints(
+    paths: List[str],
+) -> Tuple[Dict[str, Any], Iterator[Tuple[str, str, Any]]]:
+    """
+    Combine the stores of a sharded job
+
+    Args:
+        paths: Checkpoint files, one per shard or resumed run
+
+    Returns:
+        (info, outcomes). info has the job's ``phase``, the ``shards``
+        found out of ``of``, and ``pending`` routes never scanned.
+        outcomes yields (url, status, result or error) in the order of
+        the route list, each route once; a route done in any store counts
+        as done. Stores are closed once outcomes is exhausted.
+
+    Raises:
+        ValueError: If no path is given or the stores belong to
+            different jobs
+    """
+    if not paths:
+        raise ValueError("No checkpoint to merge")
+    stores = [CheckpointStore(path) for path in paths]
+    try:
+        metas = [store.meta for store in stores]
+        jobs = {meta.get("job") for meta in metas}
+        if len(jobs) > 1 or None in jobs:
+            raise ValueError("Checkpoints belong to different scan jobs")
+        shards = {meta["shard"] for meta in metas}
+        counts = {int(spec.split("/")[1]) for spec in shards}
+        if len(counts) > 1:
+            raise ValueError("Checkpoints were split into different shard counts")
+
+        # A route may be in several stores, at different positions when
+        # the list was edited between runs, so the store whose outcome is
+        # reported is chosen by URL before any result is read
+        chosen: Dict[str, Tuple[int, int]] = {}
+        for index, store in enumerate(stores):
+            for url, status in store.statuses():
+                rank = _RANK[status]
+                if url not in chosen or rank > chosen[url][0]:
+                    chosen[url] = (rank, index)
+    except Exception:
+        for store in stores:
+            store.close()
+        raise
+
+    info = {
+        "phase": int(metas[0].get("phase", 1)),
+        "shards": len(shards),
+        "of": counts.pop(),
+        "pending": sum(1 for rank, _ in chosen.values() if rank == 0),
+    }
+
+    def tagged(index: int, store: CheckpointStore):
+        for position, url, status, payload in store.records():
+            if chosen[url] == (_RANK[status], index) and status is not None:
+                yield position, url, status, payload
+
+    def outcomes() -> Iterator[Tuple[str, str, Any]]:
+        try:
+            merged = heapq.merge(
+                *(tagged(index, store) for index, store in enumerate(stores)),
+                key=lambda record: record[:2],
+            )
+            for _, url, status, payload in merged:
+                yield url, status, payload
+        finally:
+            for store in stores:
+                store.close()
+
+    return info, outcomes()
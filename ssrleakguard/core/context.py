@@ -1,8 +1,111 @@
-from dataclasses import dataclass
-from typing import Dict
+import itertools
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
 
 
 @dataclass
 class AuthContext:
     name: str
-    cookies: Dict[str, str]
\ No newline at end of file
+    cookies: Dict[str, str] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_context(spec: str) -> AuthContext:
+    """
+    Context from a --context value
+
+    Args:
+        spec: "name" or "name:key=value", with several cookies separated
+            by ";" as in a Cookie header ("name:a=1; b=2")
+
+    Returns:
+        Context with those cookies
+
+    Raises:
+        ValueError: If a cookie has no "="
+    """
+    name, _, cookie_part = spec.partition(":")
+    cookies = {}
+    for cookie in cookie_part.split(";"):
+        cookie = cookie.strip()
+        if not cookie:
+            continue
+        if "=" not in cookie:
+            raise ValueError(f"Cookie without a value in context {name}: {cookie}")
+        key, value = cookie.split("=", 1)
+        cookies[key.strip()] = value
+    return AuthContext(name=name, cookies=cookies)
+
+
+def context_from_dict(data: Any) -> AuthContext:
+    """
+    Context from a {"name", "cookies", "headers"} object
+
+    Raises:
+        ValueError: If the object is malformed
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("name"), str):
+        raise ValueError('Each context needs a "name"')
+    values = {}
+    for key in ("cookies", "headers"):
+        items = data.get(key) or {}
+        if not isinstance(items, dict):
+            raise ValueError(f'"{key}" of context {data["name"]} must be an object')
+        values[key] = {str(k): str(v) for k, v in items.items()}
+    return AuthContext(name=data["name"], **values)
+
+
+def _combine(parts: List[AuthContext]) -> AuthContext:
+    cookies: Dict[str, str] = {}
+    headers: Dict[str, str] = {}
+    for part in parts:
+        cookies.update(part.cookies)
+        headers.update(part.headers)
+    return AuthContext(
+        name="+".join(part.name for part in parts), cookies=cookies, headers=headers
+    )
+
+
+def contexts_from_spec(spec: Any) -> List[AuthContext]:
+    """
+    Contexts from a decoded contexts file
+
+    The file holds either a list of context objects, or an object with
+    "contexts" (such a list) and/or "matrix": dimensions mapping to lists
+    of context objects, expanded into every combination. The cookies and
+    headers of a combination are merged in dimension order and its name
+    joins the part names with "+", e.g. "admin+tenant-a+beta".
+
+    Raises:
+        ValueError: If the spec is malformed or names repeat
+    """
+    if isinstance(spec, list):
+        spec = {"contexts": spec}
+    if not isinstance(spec, dict):
+        raise ValueError("Contexts must be a list or an object")
+
+    contexts = [context_from_dict(item) for item in spec.get("contexts") or []]
+    matrix = spec.get("matrix") or {}
+    if not isinstance(matrix, dict):
+        raise ValueError('"matrix" must map dimensions to lists of contexts')
+    dimensions = []
+    for dimension, values in matrix.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f'Matrix dimension "{dimension}" needs a list of contexts')
+        dimensions.append([context_from_dict(item) for item in values])
+    if dimensions:
+        contexts.extend(_combine(list(parts)) for parts in itertools.product(*dimensions))
+
+    seen = set()
+    for ctx in contexts:
+        if ctx.name in seen:
+            raise ValueError(f"Context name used twice: {ctx.name}")
+        seen.add(ctx.name)
+    return contexts
+
+
+def load_contexts(path: str) -> List[AuthContext]:
+    """Contexts from a JSON file, see contexts_from_spec"""
+    with open(path, "r", encoding="utf-8") as f:
+        return contexts_from_spec(json.load(f))
@@ -0,0 +1,526 @@
+import hashlib
+import html as html_lib
+import json
+import re
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.batch import BatchSummary
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.document import HTMLDocument
+from ssrleakguard.core.http_client import HTTPClient, response_body
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Characters left as they are when re-quoting a path
+_PATH_SAFE = "/%:@!$&'()*+,;=-._~"
+
+_PERCENT_RE = re.compile(r"%[0-9a-fA-F]{2}")
+
+# Links to these are not pages and are never fetched
+_SKIP_EXTENSIONS = frozenset(
+    "avif bmp css csv doc docx eot gif gz ico jpeg jpg js json map mp3 mp4 "
+    "otf pdf png rar svg tar tgz ttf txt wasm webm webp woff woff2 xls xlsx "
+    "xml zip".split()
+)
+
+_SITEMAP_LOC_RE = re.compile(r"<loc>\s*(.*?)\s*</loc>", re.S | re.I)
+_ROBOTS_SITEMAP_RE = re.compile(r"^\s*sitemap:\s*(\S+)", re.M | re.I)
+# Nested sitemaps fetched per site through sitemap indexes
+MAX_SITEMAPS = 50
+# Largest sitemap accepted once decompressed, the limit of the protocol
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
+
+_JS_STRING_RE = re.compile(r"\"((?:[^\"\\]|\\.)*)\"")
+# Route names contain brackets, so the array is matched string by string
+_MANIFEST_SORTED_RE = re.compile(
+    r"sortedPages\s*:\s*\[((?:\s*\"(?:[^\"\\]|\\.)*\"\s*,?)*)\s*\]"
+)
+_MANIFEST_KEY_RE = re.compile(r"\"(/[^\"]*)\"\s*:\s*\[")
+# Pages in a build manifest that are not routes
+_SPECIAL_PAGES = frozenset(["/_app", "/_error", "/_document", "/404", "/500"])
+
+
+def _remove_dot_segments(path: str) -> str:
+    segments: List[str] = []
+    for segment in path.split("/"):
+        if segment == "..":
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if path.endswith(("/.", "/..")):
+        segments.append("")
+    return "/".join(segments)
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """
+    Canonical form of a page URL, used to tell URLs apart
+
+    Relative URLs are resolved against base. The scheme and host are
+    lowercased, default ports, credentials and the fragment dropped,
+    dot segments resolved, percent escapes uppercased and query
+    parameters sorted. A trailing slash is removed, as Next.js redirects
+    it away by default.
+
+    Args:
+        url: Absolute or relative URL
+        base: URL of the page the link was found on
+
+    Returns:
+        Normalized URL, or None if it is not an http(s) URL
+    """
+    url = url.strip()
+    if base is not None:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in _DEFAULT_PORTS or not host:
+        return None
+    if ":" in host:
+        host = f"[{host}]"
+    netloc = host
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        netloc = f"{host}:{port}"
+
+    path = quote(_remove_dot_segments(parts.path), safe=_PATH_SAFE)
+    path = _PERCENT_RE.sub(lambda m: m.group(0).upper(), path)
+    path = path.rstrip("/") or "/"
+    query = "&".join(sorted(p for p in parts.query.split("&") if p))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def _site(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _gunzip(data: bytes, limit: int) -> bytes:
+    """
+    Decompress gzip data of at most limit bytes
+
+    Raises:
+        ValueError: If the data is truncated or expands beyond limit
+        zlib.error: If the data is corrupt
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(data, limit + 1)
+    if len(data) > limit:
+        raise ValueError(f"expands beyond {limit} bytes")
+    if not decompressor.eof:
+        raise ValueError("truncated gzip data")
+    return data
+
+
+class SeenSet:
+    """
+    Set of URLs kept as 64-bit hashes
+
+    Memory per URL is a small constant however long the URL is, so the
+    frontier can remember hundreds of thousands of URLs. Two URLs sharing
+    a hash would be taken for one, which is negligible at this scale.
+    """
+
+    def __init__(self):
+        self._hashes: Set[int] = set()
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        digest = hashlib.blake2b(
+            url.encode("utf-8", "surrogatepass"), digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "little")
+
+    def add(self, url: str) -> bool:
+        """Add url; returns False if it was already present"""
+        key = self._hash(url)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self._hash(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+def _route_regex(route: str) -> Tuple[re.Pattern, Tuple[int, int, int]]:
+    """Regex matching the paths of a Next.js route, and its match priority"""
+    parts = []
+    dynamic = catch_all = 0
+    for segment in route.strip("/").split("/"):
+        if not segment:
+            continue
+        if segment.startswith("[[..."):
+            parts.append("(?:/.+)?")
+            catch_all += 2
+        elif segment.startswith("[..."):
+            parts.append("/.+")
+            catch_all += 1
+        elif segment.startswith("["):
+            parts.append("/[^/]+")
+            dynamic += 1
+        else:
+            parts.append("/" + re.escape(segment))
+    static = len(parts) - dynamic - (1 if catch_all else 0)
+    # Like Next.js: fewer catch-alls, then fewer dynamic segments, then
+    # more static segments win
+    return re.compile("".join(parts)), (catch_all, dynamic, -static)
+
+
+class RouteCollapser:
+    """
+    Maps URLs to the Next.js route that serves them
+
+    Dynamic routes such as /blog/[slug] are learned from build manifests
+    and from the ``page`` of __NEXT_DATA__. All URLs of one dynamic route
+    share a key, so only one representative of each is crawled; other
+    URLs are keyed by path and query parameter names.
+    """
+
+    def __init__(self):
+        self._static: Set[str] = set()
+        # (priority, route, regex), kept sorted by priority
+        self._dynamic: List[Tuple[Tuple[int, int, int], str, re.Pattern]] = []
+        self._known: Set[str] = set()
+
+    def add_route(self, route: str):
+        """Register a route pattern such as /blog/[slug]"""
+        if route in self._known:
+            return
+        self._known.add(route)
+        if "[" not in route:
+            self._static.add(route.rstrip("/"))
+            return
+        regex, priority = _route_regex(route)
+        self._dynamic.append((priority, route, regex))
+        self._dynamic.sort(key=lambda entry: entry[0])
+
+    def key(self, url: str) -> str:
+        """Collapse key of a normalized URL"""
+        parts = urlsplit(url)
+        path = parts.path.rstrip("/")
+        if path not in self._static:
+            for _, route, regex in self._dynamic:
+                if regex.fullmatch(path):
+                    return f"{parts.netloc}{route}"
+        names = sorted({p.split("=", 1)[0] for p in parts.query.split("&") if p})
+        return f"{parts.netloc}{path or '/'}?{'&'.join(names)}"
+
+
+class Crawler:
+    """
+    Discover and scan the pages of a site
+
+    Starting from seed URLs, pages are fetched breadth-first with bounded
+    concurrency; same-origin links, sitemap entries and the static routes
+    of the Next.js build manifest join the frontier. Each page is parsed
+    once, for its links and for the Phase 1 scan. With contexts, Phase 2
+    runs on every crawled page instead, and the links come from the
+    baseline context's response.
+
+    Pages are always fetched in full and scanned in the calling process,
+    since their links are needed: the analyzer's result cache and process
+    pool are not used for them, and Phase 1 does not read the data
+    endpoint.
+
+    Args:
+        client: HTTP client used for discovery and Phase 1
+        analyzer: Analyzer scanning the pages
+        max_pages: Stop after fetching this many pages
+        max_depth: Follow links this many hops from the seeds
+        concurrency: Pages fetched in parallel
+        sitemaps: Read robots.txt and sitemap.xml of each seed's site
+        collapse_routes: Crawl one URL per dynamic Next.js route
+    """
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        analyzer: SSRAnalyzer,
+        max_pages: int = 500,
+        max_depth: int = 3,
+        concurrency: int = 8,
+        sitemaps: bool = True,
+        collapse_routes: bool = True,
+    ):
+        self.client = client
+        self.analyzer = analyzer
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = max(1, concurrency)
+        self.sitemaps = sitemaps
+        self.collapse_routes = collapse_routes
+        self.collapser = RouteCollapser()
+        self.seen = SeenSet()
+        self._sites: Set[str] = set()
+        self._manifests: Set[str] = set()
+        self._collapsed: Set[str] = set()
+        # Sites whose first page is still being fetched
+        self._probing: Set[str] = set()
+        self._probed: Set[str] = set()
+        self._frontier: Deque[Tuple[str, int]] = deque()
+        self.stats = {"discovered": 0, "collapsed": 0, "skipped": 0}
+
+    def _log(self, msg: str):
+        self.analyzer.log(msg)
+
+    def _enqueue(self, url: Optional[str], depth: int):
+        if url is None or _site(url) not in self._sites:
+            return
+        _, dot, extension = urlsplit(url).path.rpartition("/")[2].rpartition(".")
+        if dot and extension.lower() in _SKIP_EXTENSIONS:
+            return
+        if not self.seen.add(url):
+            return
+        self.stats["discovered"] += 1
+        self._frontier.append((url, depth))
+
+    def _claim(self, url: str) -> bool:
+        """Whether url should be fetched, marking its route as crawled"""
+        if not self.collapse_routes:
+            return True
+        key = self.collapser.key(url)
+        if key in self._collapsed:
+            self.stats["collapsed"] += 1
+            return False
+        self._collapsed.add(key)
+        return True
+
+    def _get(self, url: str):
+        return self.analyzer.fetch(self.client, url)
+
+    def _sitemap_urls(self, site: str) -> Iterable[str]:
+        """Page URLs listed by the sitemaps of a site"""
+        queue = [f"{site}/sitemap.xml"]
+        try:
+            robots = self._get(f"{site}/robots.txt").text
+            queue.extend(_ROBOTS_SITEMAP_RE.findall(robots))
+        except Exception as exc:
+            self._log(f"No robots.txt for {site}: {exc}")
+
+        fetched: Set[str] = set()
+        while queue and len(fetched) < MAX_SITEMAPS:
+            sitemap_url = queue.pop(0)
+            if sitemap_url in fetched:
+                continue
+            target = normalize_url(sitemap_url)
+            if target is None or _site(target) != site:
+                # The client's cookies would go along to the other host
+                self._log(f"Skipping sitemap on another site: {sitemap_url}")
+                continue
+            fetched.add(sitemap_url)
+            try:
+                body = self._get(sitemap_url).content
+                if body[:2] == b"\x1f\x8b":
+                    body = _gunzip(body, MAX_SITEMAP_BYTES)
+            except Exception as exc:
+                self._log(f"No sitemap at {sitemap_url}: {exc}")
+                continue
+            text = body.decode("utf-8", "replace")
+            locs = [html_lib.unescape(loc) for loc in _SITEMAP_LOC_RE.findall(text)]
+            if "<sitemapindex" in text:
+                queue.extend(locs)
+            else:
+                yield from locs
+
+    def _manifest_routes(self, site: str, build_id: str) -> List[str]:
+        """Page routes listed in the Next.js build manifest"""
+        url = f"{site}/_next/static/{quote(build_id, safe='')}/_buildManifest.js"
+        try:
+            text = self._get(url).text
+        except Exception as exc:
+            self._log(f"No build manifest at {url}: {exc}")
+            return []
+
+        match = _MANIFEST_SORTED_RE.search(text)
+        if match is not None:
+            routes = [
+                json.loads(f'"{s}"') for s in _JS_STRING_RE.findall(match.group(1))
+            ]
+        else:
+            routes = _MANIFEST_KEY_RE.findall(text)
+        return [
+            route
+            for route in routes
+            if route.startswith("/")
+            and route not in _SPECIAL_PAGES
+            and route != "/api"
+            and not route.startswith("/api/")
+        ]
+
+    def _learn_site(self, url: str, result: Dict):
+        """Use the route and build ID a page reveals"""
+        page = result.get("page")
+        if page:
+            self.collapser.add_route(page)
+
+        site = _site(url)
+        build_id = result.get("build_id")
+        if not build_id or site in self._manifests:
+            return
+        self._manifests.add(site)
+        for route in self._manifest_routes(site, build_id):
+            self.collapser.add_route(route)
+            if "[" not in route:
+                self._enqueue(normalize_url(route, site), 1)
+
+    def _visit(
+        self, url: str, contexts: Optional[List[AuthContext]]
+    ) -> Tuple[Optional[Dict], List[str], Dict]:
+        """Fetch, parse and scan one page"""
+        client = self.client
+        if contexts:
+            # The baseline context's response gives both the links and the
+            # baseline state, so the page is fetched once per context
+            baseline = contexts[0]
+            client = client.clone_with_cookies(baseline.cookies, baseline.headers)
+        response = self.analyzer.fetch(client, url)
+        final_url = normalize_url(response.url) or url
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None, [], {}
+
+        html = response_body(
+            response, allow_bytes=self.analyzer.secret_scanner.accepts_bytes
+        )
+        with self.analyzer.instrumentation.timer("parse"):
+            document = HTMLDocument(html).parse()
+        base = urljoin(final_url, document.base_href or "")
+        links = [normalize_url(href, base) for href in document.links]
+
+        if contexts:
+            result = self.analyzer.analyze_with_contexts(
+                url, contexts, baseline_html=html
+            )
+            next_data = self.analyzer.nextjs_parser.extract_next_data(document)
+            site_info = {
+                "page": next_data.get("page") if isinstance(next_data, dict) else None,
+                "build_id": self.analyzer.nextjs_parser.extract_build_id(next_data),
+            }
+        else:
+            result = self.analyzer.analyze_html(url, html, document=document)
+            site_info = result
+        return result, links, site_info
+
+    def crawl(
+        self,
+        seeds: Iterable[str],
+        contexts: Optional[List[AuthContext]] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        on_error: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict:
+        """
+        Crawl from the seed URLs
+
+        Only URLs on the sites of the seeds are followed.
+
+        Args:
+            seeds: Start URLs
+            contexts: Run Phase 2 with these contexts instead of Phase 1
+            on_result: Called with each result as soon as it is available
+            on_error: Called with (url, message) for each failed page
+
+        Returns:
+            Results and errors (unless passed to the callbacks), the
+            crawled URLs and a summary with crawl statistics
+        """
+        results: List[Dict] = []
+        errors: List[Dict] = []
+        crawled: List[str] = []
+        summary = BatchSummary()
+
+        for seed in seeds:
+            url = normalize_url(seed)
+            if url is None:
+                continue
+            site = _site(url)
+            new_site = site not in self._sites
+            self._sites.add(site)
+            self._enqueue(url, 0)
+            if new_site and self.sitemaps and self.max_depth > 0:
+                for loc in self._sitemap_urls(site):
+                    self._enqueue(normalize_url(loc), 1)
+
+        fetched = 0
+        running: Dict[Future, Tuple[str, int]] = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                while (
+                    self._frontier
+                    and len(running) < self.concurrency
+                    and fetched < self.max_pages
+                ):
+                    url, depth = self._frontier[0]
+                    site = _site(url)
+                    # Until the first page of a site is back, its routes
+                    # are unknown and nothing could be collapsed
+                    if site in self._probing:
+                        break
+                    self._frontier.popleft()
+                    # Routes learned since the URL was queued may make
+                    # it redundant
+                    if not self._claim(url):
+                        continue
+                    if site not in self._probed:
+                        self._probing.add(site)
+                    fetched += 1
+                    running[pool.submit(self._visit, url, contexts)] = (
+                        url,
+                        depth,
+                    )
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, depth = running.pop(future)
+                    site = _site(url)
+                    self._probing.discard(site)
+                    self._probed.add(site)
+                    try:
+                        result, links, site_info = future.result()
+                    except Exception as exc:
+                        summary.add_error()
+                        if on_error is not None:
+                            on_error(url, str(exc))
+                        else:
+                            errors.append({"url": url, "error": str(exc)})
+                        continue
+
+                    if result is None:
+                        self.stats["skipped"] += 1
+                        continue
+                    crawled.append(url)
+                    self._learn_site(url, site_info)
+                    if depth < self.max_depth:
+                        for link in links:
+                            self._enqueue(link, depth + 1)
+
+                    summary.add_result(result)
+                    if on_result is not None:
+                        on_result(result)
+                    else:
+                        results.append(result)
+
+        self.analyzer.instrumentation.count("crawl_pages", fetched)
+        totals = summary.as_dict()
+        totals["crawl"] = dict(self.stats, fetched=fetched, queued=len(self._frontier))
+        return {
+            "phase": 2 if contexts else 1,
+            "urls": crawled,
+            "results": results,
+            "errors": errors,
+            "summary": totals,
+        }
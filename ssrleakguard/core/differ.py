@@ -1,27 +1,314 @@
-from typing import Dict, List
-from deepdiff import DeepDiff
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
 
 
-def diff_ssr_states(states: Dict[str, dict]) -> List[dict]:
+class _EmptyContainer:
+    """Leaf standing in for an empty dict or list"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, _EmptyContainer) and (
+            type(self.value) is type(other.value)
+        )
+
+
+class _UnorderedList:
+    """List flattened as a multiset of element digests"""
+
+    __slots__ = ("value", "items")
+
+    def __init__(self, value: list):
+        self.value = value
+        # digest -> indexes of the elements with that digest
+        self.items: Dict[bytes, List[int]] = {}
+        for idx, element in enumerate(value):
+            self.items.setdefault(_digest(element), []).append(idx)
+
+
+def _digest(value: Any, ordered: bool = False) -> bytes:
+    """
+    Order-insensitive structural hash of a JSON value
+
+    Dict keys and list elements are both hashed as sorted sets of child
+    digests, so two values hash equally when they only differ in ordering.
+    With ordered, list elements are hashed in sequence instead.
+    """
+    if isinstance(value, dict):
+        parts = sorted(
+            key.encode("utf-8", "surrogatepass") + b"\0" + _digest(child, ordered)
+            for key, child in value.items()
+        )
+        tag = b"d"
+    elif isinstance(value, list):
+        parts = [_digest(child, ordered) for child in value]
+        if ordered:
+            tag = b"L"
+        else:
+            parts.sort()
+            tag = b"l"
+    else:
+        parts = [json.dumps(value).encode()]
+        tag = type(value).__name__.encode()
+
+    h = hashlib.blake2b(tag, digest_size=16)
+    for part in parts:
+        h.update(len(part).to_bytes(4, "little"))
+        h.update(part)
+    return h.digest()
+
+
+def flatten_state(state: Any, ignore_order: bool = True) -> Dict[str, Any]:
+    """
+    Flatten a JSON state into a path -> leaf value map
+
+    Args:
+        state: Normalized SSR state
+        ignore_order: Treat lists as unordered collections of elements
+
+    Returns:
+        Dictionary of paths such as ``root['props']['user']`` to scalar
+        leaves. Empty containers are kept as leaves; with ignore_order
+        each list becomes a single entry holding its element multiset.
+    """
+    flat: Dict[str, Any] = {}
+    stack: List[Tuple[str, Any]] = [("root", state)]
+
+    while stack:
+        path, value = stack.pop()
+        if isinstance(value, dict):
+            if not value:
+                flat[path] = _EmptyContainer(value)
+            # Pushed in reverse so paths come out in document order
+            for key, child in reversed(value.items()):
+                stack.append((f"{path}[{key!r}]", child))
+        elif isinstance(value, list):
+            if ignore_order:
+                flat[path] = _UnorderedList(value)
+            else:
+                if not value:
+                    flat[path] = _EmptyContainer(value)
+                for idx in range(len(value) - 1, -1, -1):
+                    stack.append((f"{path}[{idx}]", value[idx]))
+        else:
+            flat[path] = value
+
+    return flat
+
+
+def _leaf_value(leaf: Any) -> Any:
+    if isinstance(leaf, (_EmptyContainer, _UnorderedList)):
+        return leaf.value
+    return leaf
+
+
+def leaf_digest(leaf: Any) -> bytes:
+    """Digest of a flatten_state leaf, equal for equal leaves"""
+    return _digest(_leaf_value(leaf))
+
+
+def leaf_value(leaf: Any) -> Any:
+    """Plain JSON value of a flatten_state leaf"""
+    return _leaf_value(leaf)
+
+
+def leaf_from_value(value: Any, ignore_order: bool = True) -> Any:
+    """Rebuild a flatten_state leaf from its plain JSON value"""
+    if isinstance(value, list):
+        if ignore_order:
+            return _UnorderedList(value)
+        return _EmptyContainer(value)
+    if isinstance(value, dict):
+        return _EmptyContainer(value)
+    return value
+
+
+def _same_leaf(a: Any, b: Any) -> bool:
+    # 1, 1.0 and True compare equal in Python but are different JSON values
+    return type(a) is type(b) and a == b
+
+
+def _diff_flat(
+    baseline: Dict[str, Any], other: Dict[str, Any]
+) -> Dict[str, Dict]:
+    added: Dict[str, Any] = {}
+    removed: Dict[str, Any] = {}
+    changed: Dict[str, Dict[str, Any]] = {}
+
+    for path, old in baseline.items():
+        if path not in other:
+            removed[path] = _leaf_value(old)
+            continue
+
+        new = other[path]
+        if isinstance(old, _UnorderedList) and isinstance(new, _UnorderedList):
+            _diff_unordered(path, old, new, added, removed)
+        elif not _same_leaf(old, new):
+            changed[path] = {
+                "old_value": _leaf_value(old),
+                "new_value": _leaf_value(new),
+            }
+
+    for path, new in other.items():
+        if path not in baseline:
+            added[path] = _leaf_value(new)
+
+    diff = {}
+    if added:
+        diff["added"] = added
+    if removed:
+        diff["removed"] = removed
+    if changed:
+        diff["changed"] = changed
+    return diff
+
+
+def _diff_unordered(
+    path: str,
+    old: _UnorderedList,
+    new: _UnorderedList,
+    added: Dict[str, Any],
+    removed: Dict[str, Any],
+):
+    # Equal elements pair up by digest; whatever is left over on either
+    # side was removed from the baseline or added in the other context
+    for digest, indexes in old.items.items():
+        matched = len(new.items.get(digest, ()))
+        for idx in indexes[matched:]:
+            removed[f"{path}[{idx}]"] = old.value[idx]
+
+    for digest, indexes in new.items.items():
+        matched = len(old.items.get(digest, ()))
+        for idx in indexes[matched:]:
+            added[f"{path}[{idx}]"] = new.value[idx]
+
+
+def diff_flat_states(
+    baseline: Dict[str, Any], other: Dict[str, Any]
+) -> Dict[str, Dict]:
+    """
+    Diff two flatten_state maps, or any subsets of them holding the same
+    paths, into the ``diff`` format of diff_ssr_states
+    """
+    return _diff_flat(baseline, other)
+
+
+def state_fingerprint(state: Any, ignore_order: bool = True) -> str:
+    """
+    Structural fingerprint of a normalized state
+
+    Two states have the same fingerprint exactly when diff_ssr_states
+    finds no difference between them (barring hash collisions).
+    """
+    return _digest(state, ordered=not ignore_order).hex()
+
+
+class StateClasses:
+    """
+    Contexts grouped into classes of identical states, built one state
+    at a time
+
+    Each state is first keyed by a hash of its canonical JSON, which the
+    C encoder produces far faster than state_fingerprint walks the tree;
+    the structural fingerprint, which also equates states differing only
+    in list order, is then computed once per distinct JSON text.
+
+    Classes are ordered by their first context, and contexts within a
+    class keep their order, so the first class holds the baseline.
+    """
+
+    def __init__(self, ignore_order: bool = True):
+        self.ignore_order = ignore_order
+        # fingerprint -> context names
+        self.members: Dict[str, List[str]] = {}
+        self._fingerprints: Dict[bytes, str] = {}
+
+    def add(self, name: str, state: Any) -> bool:
+        """Add a context; True if its state starts a new class"""
+        text = json.dumps(state, sort_keys=True, separators=(",", ":"))
+        key = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        state_id = self._fingerprints.get(key)
+        if state_id is None:
+            state_id = state_fingerprint(state, self.ignore_order)
+            self._fingerprints[key] = state_id
+
+        members = self.members.get(state_id)
+        if members is not None:
+            members.append(name)
+            return False
+        self.members[state_id] = [name]
+        return True
+
+    @property
+    def classes(self) -> List[List[str]]:
+        return list(self.members.values())
+
+
+def group_states(
+    states: Dict[str, Any], ignore_order: bool = True
+) -> List[List[str]]:
+    """
+    Context names grouped into classes of identical states
+
+    Classes are ordered by their first context, and contexts within a
+    class keep their order, so the first class holds the baseline.
+    """
+    grouping = StateClasses(ignore_order)
+    for name, state in states.items():
+        grouping.add(name, state)
+    return grouping.classes
+
+
+def diff_ssr_states(
+    states: Dict[str, dict],
+    ignore_order: bool = True,
+    classes: Optional[List[List[str]]] = None,
+) -> List[dict]:
     """
     Diff SSR states across auth contexts.
     The first context is treated as baseline.
+
+    Contexts are first grouped by state fingerprint, so only one
+    representative per distinct state is flattened and compared against
+    the flattened baseline: the cost follows the number of distinct
+    states, not the number of contexts.
+
+    Args:
+        states: Normalized SSR state per context name; with classes, only
+            the states of the class representatives are needed
+        ignore_order: Compare lists as unordered collections. Elements are
+            matched by structural hash; unmatched elements are reported as
+            added or removed at their index in the respective list.
+        classes: Context classes from group_states, if already known.
+            The first name of each class is its representative.
+
+    Returns:
+        One finding per class that differs from the baseline's class.
+        ``other`` is the representative and ``other_contexts`` every
+        context of the class. ``diff`` holds ``added`` / ``removed`` path
+        -> value maps and a ``changed`` map of path -> {"old_value",
+        "new_value"}; empty sections are omitted.
     """
     findings = []
 
-    context_names = list(states.keys())
-    if len(context_names) < 2:
+    if classes is None:
+        classes = group_states(states, ignore_order)
+    if len(classes) < 2:
         return findings
 
-    baseline_name = context_names[0]
-    baseline_state = states[baseline_name]
+    baseline_name = classes[0][0]
+    baseline_flat = flatten_state(states[baseline_name], ignore_order)
 
-    for other_name in context_names[1:]:
-        diff = DeepDiff(
-            baseline_state,
-            states[other_name],
-            ignore_order=True,
-            verbose_level=2,
+    for members in classes[1:]:
+        other_name = members[0]
+        diff = _diff_flat(
+            baseline_flat, flatten_state(states[other_name], ignore_order)
         )
 
         if diff:
@@ -30,8 +317,9 @@ def diff_ssr_states(states: Dict[str, dict]) -> List[dict]:
                     "type": "authorization_inconsistency",
                     "baseline": baseline_name,
                     "other": other_name,
-                    "diff": diff.to_dict(),
+                    "other_contexts": members,
+                    "diff": diff,
                 }
             )
 
-    return findings
\ No newline at end of file
+    return findings
@@ -0,0 +1,493 @@
+import codecs
+import html as html_lib
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from ssrleakguard.core.http_client import decode_body
+
+# Tags, comments and doctypes. Quoted attribute values may contain ">".
+_TAG_RE = re.compile(
+    r"<!--.*?(?:-->|\Z)"
+    r"|<[!?][^>]*>"
+    r"|<(/?)([a-zA-Z][a-zA-Z0-9:-]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    re.S,
+)
+
+_ATTR_RE = re.compile(
+    r"([^\s\"'=<>/]+)(?:\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s\"'=<>`]+)))?"
+)
+
+# Elements whose content is raw text and never contains tags, mapped to the
+# pattern that ends them
+_RAW_TEXT_END = {
+    "script": re.compile(r"</script", re.I),
+    "style": re.compile(r"</style", re.I),
+}
+
+
+def _for_bytes(regex: re.Pattern) -> re.Pattern:
+    return re.compile(regex.pattern.encode(), regex.flags & ~re.UNICODE)
+
+
+# The same patterns for documents held as bytes
+_TAG_RE_BYTES = _for_bytes(_TAG_RE)
+_RAW_TEXT_END_BYTES = {
+    name: _for_bytes(regex) for name, regex in _RAW_TEXT_END.items()
+}
+
+_RAW_END_MARGIN = len("</script") - 1
+
+# <meta charset> or http-equiv Content-Type, searched for in the first bytes
+# of a saved page as browsers do
+_META_CHARSET_RE = re.compile(
+    rb"<meta[^>]+charset\s*=\s*[\"']?\s*([A-Za-z0-9_.:-]+)", re.I
+)
+_CHARSET_PRESCAN = 1024
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Attributes identifying the Next.js hydration data script
+NEXT_DATA_ATTRS = {"id": "__NEXT_DATA__", "type": "application/json"}
+
+
+def parse_attributes(raw: str) -> Dict[str, str]:
+    """
+    Parse the attribute section of a start tag
+
+    Args:
+        raw: Everything between the tag name and the closing ">"
+
+    Returns:
+        Dictionary of lowercased attribute names to unescaped values.
+        The first occurrence of a duplicated attribute wins.
+    """
+    attrs: Dict[str, str] = {}
+    for match in _ATTR_RE.finditer(raw):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4)
+        attrs[name] = html_lib.unescape(value) if value else ""
+    return attrs
+
+
+class ScriptTag:
+    """A <script> element located by the tokenizer"""
+
+    __slots__ = ("attrs", "start", "end")
+
+    def __init__(self, attrs: Dict[str, str], start: int, end: int):
+        self.attrs = attrs
+        # Offsets of the raw script content within the HTML
+        self.start = start
+        self.end = end
+
+
+class HTMLDocument:
+    """
+    HTML response parsed once and shared across detectors
+
+    The detector and framework parsers need only a handful of facts about a
+    page: the ``__NEXT_DATA__`` script, the external script sources, a few
+    meta tags, the links and roughly how much text the page shows. These are
+    collected by a single tokenizer pass that skips over raw script content
+    without building a tree. A full BeautifulSoup tree is still available
+    through ``soup`` for parsers that need one, and is built at most once.
+
+    The HTML may also be bytes in an ASCII-compatible charset. It is then
+    tokenized without being decoded: only attributes and the text counted
+    for the body are decoded, offsets are byte offsets and
+    ``next_data_text`` is bytes, which json.loads reads as is.
+
+    Args:
+        html: HTML content, as text or bytes
+        encoding: Charset of bytes content
+    """
+
+    # Visible text needed before the page counts as meaningful initial
+    # HTML. Text outside <head>, scripts, styles and templates is counted,
+    # each piece between tags stripped on its own, wherever it sits
+    # relative to <body>. lxml's body text can differ by the whitespace
+    # between pieces and by stray text it moves, so a page right at the
+    # threshold may land on the other side of it.
+    BODY_TEXT_THRESHOLD = 200
+
+    def __init__(
+        self, html: Optional[Union[str, bytes]], encoding: str = "utf-8"
+    ):
+        self.html = html
+        self.encoding = encoding
+        self._binary = isinstance(html, bytes)
+        self._soup = None
+        self._scanned = False
+        self.scripts: List[ScriptTag] = []
+        self.meta: List[Dict[str, str]] = []
+        # href of every <a>, as written, and of the first <base>
+        self.links: List[str] = []
+        self.base_href: Optional[str] = None
+        self.has_body = False
+        self.body_text_length = 0
+
+        # Tokenizer state, kept between feeds so input can arrive in chunks
+        self._pending = b"" if self._binary else ""
+        self._offset = 0
+        self._raw: Optional[Tuple[re.Pattern, Optional[ScriptTag]]] = None
+        self._in_head = False
+        self._in_body = False
+        self._template_depth = 0
+        self._text_done = False
+        self._nonblank = False
+
+    @property
+    def soup(self):
+        """Full BeautifulSoup tree, built on first access"""
+        if self._soup is None:
+            from bs4 import BeautifulSoup
+
+            self._soup = BeautifulSoup(self.html, "lxml")
+        return self._soup
+
+    def _scan(self):
+        if self._scanned:
+            return
+        self._scanned = True
+        self._feed(self.html, final=True)
+
+    def parse(self) -> "HTMLDocument":
+        """Tokenize the document now rather than on the first query"""
+        self._scan()
+        return self
+
+    def _decode(self, value: Union[str, bytes]) -> str:
+        if self._binary:
+            return value.decode(self.encoding, "replace")
+        return value
+
+    def _feed(self, text: Union[str, bytes], final: bool):
+        """
+        Tokenize the next piece of the document
+
+        Offsets recorded on ScriptTag are relative to the start of the whole
+        document, not to the piece. Unless final is set, an unfinished tag
+        or script end at the end of the piece is kept for the next call.
+        """
+        pending = self._pending + text
+        if not self._nonblank and not pending.isspace():
+            self._nonblank = bool(pending)
+        pos = 0
+
+        binary = self._binary
+        if binary:
+            tag_re, raw_text_end = _TAG_RE_BYTES, _RAW_TEXT_END_BYTES
+            lt, gt, comment_open, comment_close = b"<", b">", b"<!--", b"-->"
+        else:
+            tag_re, raw_text_end = _TAG_RE, _RAW_TEXT_END
+            lt, gt, comment_open, comment_close = "<", ">", "<!--", "-->"
+
+        while True:
+            if self._raw is not None:
+                raw_end, script = self._raw
+                end_match = raw_end.search(pending, pos)
+                if end_match is not None:
+                    close = end_match.start()
+                elif final:
+                    close = len(pending)
+                else:
+                    # Keep enough to recognise an end tag split across feeds
+                    close = max(pos, len(pending) - _RAW_END_MARGIN)
+                    self._raw_content(script, pending, pos, close)
+                    pos = close
+                    break
+
+                self._raw_content(script, pending, pos, close)
+                if script is not None:
+                    script.end = self._offset + close
+                self._raw = None
+                pos = close
+                continue
+
+            cut = len(pending)
+            if not final:
+                # A tag at the last "<" may still be incomplete, so it is
+                # only tokenized once its closing ">" has arrived. Text after
+                # it waits for the next tag, keeping entities in one piece.
+                last = pending.rfind(lt, pos)
+                if last == -1:
+                    cut = pos
+                else:
+                    tail = tag_re.match(pending, last)
+                    if tail is None or not tail.group(0).endswith(gt):
+                        cut = last
+                    else:
+                        cut = tail.end()
+
+            match = tag_re.search(pending, pos, cut)
+            if (
+                match is not None
+                and not final
+                and match.group(0).startswith(comment_open)
+                and not match.group(0).endswith(comment_close)
+            ):
+                # Comment still open; wait for the rest of it
+                cut = match.start()
+                match = None
+
+            text_end = match.start() if match else cut
+            if (
+                not self._text_done
+                and not self._in_head
+                and self._template_depth == 0
+            ):
+                self._count_text(pending[pos:text_end])
+
+            if match is None:
+                pos = cut
+                break
+            pos = match.end()
+
+            name = match.group(2)
+            if name is None:
+                continue
+            name = name.decode("ascii") if binary else name
+            name = name.lower()
+
+            if match.group(1):
+                if name == "head":
+                    self._in_head = False
+                elif name == "template" and self._template_depth:
+                    self._template_depth -= 1
+                continue
+
+            if name == "head":
+                self._in_head = True
+            elif name == "body":
+                self._in_head = False
+                if not self._in_body:
+                    self._in_body = True
+                    self.has_body = True
+            elif name == "template":
+                self._template_depth += 1
+            elif name == "meta":
+                self.meta.append(
+                    parse_attributes(self._decode(match.group(3)))
+                )
+            elif name == "a":
+                href = parse_attributes(self._decode(match.group(3))).get("href")
+                if href:
+                    self.links.append(href)
+            elif name == "base" and self.base_href is None:
+                self.base_href = parse_attributes(
+                    self._decode(match.group(3))
+                ).get("href")
+
+            raw_end = raw_text_end.get(name)
+            if raw_end is not None:
+                script = None
+                if name == "script":
+                    script = ScriptTag(
+                        parse_attributes(self._decode(match.group(3))),
+                        self._offset + pos,
+                        -1,
+                    )
+                    self.scripts.append(script)
+                    self._open_script(script)
+                self._raw = (raw_end, script)
+
+        self._pending = pending[pos:]
+        self._offset += pos
+
+        if final and not self._in_body:
+            self.has_body = self._nonblank
+
+    def _open_script(self, script: ScriptTag):
+        """Hook for subclasses that keep script content themselves"""
+
+    def _raw_content(
+        self, script: Optional[ScriptTag], text: str, start: int, end: int
+    ):
+        """Hook receiving raw script or style content as it is consumed"""
+
+    def _count_text(self, text: Union[str, bytes]):
+        if text:
+            text = self._decode(text)
+            self.body_text_length += len(html_lib.unescape(text).strip())
+            self._text_done = self.body_text_length > self.BODY_TEXT_THRESHOLD
+
+    def find_script(self, **attrs) -> Optional[ScriptTag]:
+        """
+        Find the first script whose attributes equal the given values
+
+        Args:
+            **attrs: Attribute names and required values
+
+        Returns:
+            Matching ScriptTag or None
+        """
+        self._scan()
+        for script in self.scripts:
+            if all(script.attrs.get(k) == v for k, v in attrs.items()):
+                return script
+        return None
+
+    def script_sources(self) -> List[str]:
+        """Return the src of every external script in document order"""
+        self._scan()
+        return [s.attrs["src"] for s in self.scripts if "src" in s.attrs]
+
+    def has_meta(self, name: str) -> bool:
+        """Check whether a <meta name="..."> tag is present"""
+        self._scan()
+        return any(meta.get("name") == name for meta in self.meta)
+
+    def has_meaningful_body(self) -> bool:
+        """Check whether the body carries more text than the threshold"""
+        self._scan()
+        return self.has_body and (
+            self.body_text_length > self.BODY_TEXT_THRESHOLD
+        )
+
+    @property
+    def next_data_script(self) -> Optional[ScriptTag]:
+        """The ``__NEXT_DATA__`` JSON script, if present"""
+        return self.find_script(**NEXT_DATA_ATTRS)
+
+    @property
+    def next_data_span(self) -> Optional[Tuple[int, int]]:
+        """Offsets of the raw ``__NEXT_DATA__`` JSON within the HTML"""
+        script = self.next_data_script
+        if script is None:
+            return None
+        return script.start, script.end
+
+    @property
+    def next_data_text(self) -> Optional[Union[str, bytes]]:
+        """Raw ``__NEXT_DATA__`` JSON text, if present"""
+        span = self.next_data_span
+        if span is None:
+            return None
+        return self.html[span[0]:span[1]]
+
+
+class StreamedDocument(HTMLDocument):
+    """
+    Document tokenized from response chunks without keeping the HTML
+
+    Feed decoded chunks as they arrive and call ``close`` at the end. Only
+    the ``__NEXT_DATA__`` script content is retained; everything else is
+    reduced to the same facts an HTMLDocument collects, so memory stays
+    bounded by the hydration payload rather than the page.
+
+    Args:
+        on_next_data: Called with each piece of the ``__NEXT_DATA__`` JSON
+            as it is tokenized. The pieces are then not retained and
+            ``next_data_text`` is always None.
+    """
+
+    def __init__(self, on_next_data: Optional[Callable[[str], None]] = None):
+        super().__init__(None)
+        self._scanned = True
+        self._next_data: Optional[ScriptTag] = None
+        self._next_data_parts: List[str] = []
+        self._on_next_data = on_next_data
+        self.closed = False
+
+    def feed(self, chunk: str):
+        """Tokenize the next chunk of the response body"""
+        self._feed(chunk, final=False)
+
+    def close(self):
+        """Flush anything held back at the end of the body"""
+        if not self.closed:
+            self._feed("", final=True)
+            self.closed = True
+
+    def _open_script(self, script: ScriptTag):
+        if self._next_data is None and all(
+            script.attrs.get(k) == v for k, v in NEXT_DATA_ATTRS.items()
+        ):
+            self._next_data = script
+
+    def _raw_content(
+        self, script: Optional[ScriptTag], text: str, start: int, end: int
+    ):
+        if script is not None and script is self._next_data and end > start:
+            if self._on_next_data is not None:
+                self._on_next_data(text[start:end])
+            else:
+                self._next_data_parts.append(text[start:end])
+
+    @property
+    def soup(self):
+        raise RuntimeError("Streamed documents do not keep the HTML")
+
+    @property
+    def next_data_text(self) -> Optional[str]:
+        """Captured ``__NEXT_DATA__`` JSON, once its script has ended"""
+        if (
+            self._next_data is None
+            or self._next_data.end < 0
+            or self._on_next_data is not None
+        ):
+            return None
+        return "".join(self._next_data_parts)
+
+
+def sniff_charset(content: bytes, default: str = "utf-8") -> str:
+    """
+    Charset of HTML without headers: its BOM, else a <meta> in the first
+    1024 bytes, else default
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom):
+            return encoding
+    match = _META_CHARSET_RE.search(content, 0, _CHARSET_PRESCAN)
+    if match is not None:
+        encoding = match.group(1).decode("ascii").lower()
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            return default
+        return encoding
+    return default
+
+
+def read_html_file(
+    path: Union[str, "os.PathLike[str]"], allow_bytes: bool = True
+) -> Union[str, bytes]:
+    """
+    HTML saved to disk, as text or as ASCII bytes (see decode_body)
+
+    Args:
+        path: HTML file
+        allow_bytes: Whether the caller can take bytes at all
+
+    Returns:
+        Content for HTMLDocument and the secret scanner
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    return decode_body(content, sniff_charset(content), allow_bytes)
+
+
+def as_document(source: Union[str, bytes, HTMLDocument]) -> HTMLDocument:
+    """
+    Wrap raw HTML in an HTMLDocument, passing documents through unchanged
+
+    Args:
+        source: HTML content (text or ASCII-compatible bytes) or an
+            already parsed document
+
+    Returns:
+        HTMLDocument for the source
+    """
+    if isinstance(source, HTMLDocument):
+        return source
+    return HTMLDocument(source)
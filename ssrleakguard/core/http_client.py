@@ -1,7 +1,139 @@
-import requests
-from typing import Dict, Optional
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import codecs
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Union
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+
+# Decoded the same as ASCII by every encoding this sample survives
+_ASCII_SAMPLE = "".join(chr(c) for c in range(32, 127)) + "\t\n\r"
+
+
+@lru_cache(maxsize=32)
+def _ascii_compatible(encoding: str) -> bool:
+    try:
+        return _ASCII_SAMPLE.encode(encoding) == _ASCII_SAMPLE.encode("ascii")
+    except (LookupError, UnicodeError):
+        return False
+
+
+def response_encoding(response: "requests.Response") -> str:
+    """
+    Charset of a response body
+
+    Same choice as response.text, minus the whole-body detection it falls
+    back to when the headers give none: UTF-8 is assumed then.
+    """
+    encoding = response.encoding or "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return "utf-8"
+    return encoding
+
+
+def decode_body(
+    content: bytes, encoding: str, allow_bytes: bool = True
+) -> Union[str, bytes]:
+    """
+    Body for parsing and scanning, decoded only if needed
+
+    A body that is pure ASCII in an ASCII-compatible charset reads the
+    same as bytes and as text, down to every offset, so it is returned as
+    the raw bytes and never copied into a str. Other bodies are decoded.
+
+    Args:
+        content: Raw body
+        encoding: Its charset
+        allow_bytes: Whether the caller can take bytes at all
+
+    Returns:
+        The raw bytes or the decoded text
+    """
+    if allow_bytes and content.isascii() and _ascii_compatible(encoding):
+        return content
+    return content.decode(encoding, errors="replace")
+
+
+def response_body(
+    response: "requests.Response", allow_bytes: bool = True
+) -> Union[str, bytes]:
+    """Body of a response as decode_body returns it, see response_encoding"""
+    return decode_body(
+        response.content, response_encoding(response), allow_bytes
+    )
+
+
+class BodyStream:
+    """Decoded response body read in chunks, with an optional size cap"""
+
+    def __init__(
+        self,
+        response: "requests.Response",
+        chunk_size: int,
+        max_bytes: Optional[int] = None,
+    ):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.truncated = False
+
+    def __iter__(self) -> Iterator[str]:
+        encoding = response_encoding(self.response)
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+        for raw in self.response.iter_content(self.chunk_size):
+            if self.max_bytes is not None:
+                remaining = self.max_bytes - self.bytes_read
+                if len(raw) > remaining:
+                    raw = raw[:remaining]
+                    self.truncated = True
+
+            self.bytes_read += len(raw)
+            text = decoder.decode(raw, final=self.truncated)
+            if text:
+                yield text
+            if self.truncated:
+                return
+
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+
+class HostLimiter:
+    """
+    Bounds the requests in flight to each host
+
+    Args:
+        per_host: Requests at a time per host, None for no limit
+    """
+
+    def __init__(self, per_host: Optional[int] = None):
+        self.per_host = per_host
+        self._limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, url: str) -> Iterator[None]:
+        """Wait for a free slot for url's host and keep it until exit"""
+        if self.per_host is None:
+            yield
+            return
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            limit = self._limits.get(host)
+            if limit is None:
+                limit = threading.BoundedSemaphore(max(1, self.per_host))
+                self._limits[host] = limit
+        with limit:
+            yield
 
 
 class HTTPClient:
@@ -12,16 +144,33 @@ class HTTPClient:
         cookies: Optional[Dict[str, str]] = None,
         headers: Optional[Dict[str, str]] = None,
         timeout: int = 30,
+        pool_size: int = 10,
+        adapter: Optional["HTTPAdapter"] = None,
+        limiter: Optional[HostLimiter] = None,
     ):
+        # requests and urllib3 take longer to import than the rest of the
+        # package together, so they are loaded with the first client
+        import requests
+
         self.session = requests.Session()
 
-        # Configure retry strategy
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        if adapter is None:
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # Configure retry strategy
+            retry_strategy = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[429, 500, 502, 503, 504],
+            )
+            # pool_size bounds the connections kept alive per host
+            adapter = HTTPAdapter(
+                max_retries=retry_strategy,
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+            )
+        self.adapter = adapter
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
 
@@ -47,29 +196,98 @@ class HTTPClient:
             self.session.cookies.update(cookies)
 
         self.timeout = timeout
+        self.pool_size = pool_size
+        # Shared with clones, so a host's limit covers every context
+        self.limiter = limiter if limiter is not None else HostLimiter()
+
+    def limit_per_host(self, per_host: Optional[int]):
+        """
+        Allow at most per_host requests at a time to any one host
 
-    def get(self, url: str) -> requests.Response:
+        Applies to this client and every clone. Set it before the first
+        request; None removes the limit.
+        """
+        self.limiter.per_host = per_host
+
+    def get(
+        self, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> "requests.Response":
         """
         Perform GET request
 
         Args:
             url: Target URL
+            headers: Extra headers for this request only, e.g. the
+                If-None-Match / If-Modified-Since of a conditional request
 
         Returns:
-            Response object
+            Response object (status 304 when a conditional request matched)
 
         Raises:
             requests.RequestException: If request fails
         """
-        response = self.session.get(url, timeout=self.timeout)
+        with self.limiter.hold(url):
+            response = self.session.get(
+                url, headers=headers, timeout=self.timeout
+            )
         response.raise_for_status()
         return response
     
-    def clone_with_cookies(self, cookies: Dict[str, str]):
+    @contextmanager
+    def stream(
+        self,
+        url: str,
+        chunk_size: int = 65536,
+        max_bytes: Optional[int] = None,
+    ) -> Iterator[BodyStream]:
+        """
+        Perform a streaming GET request
+
+        Args:
+            url: Target URL
+            chunk_size: Bytes read from the socket per chunk
+            max_bytes: Stop reading after this many body bytes
+
+        Yields:
+            BodyStream producing decoded text chunks
+
+        Raises:
+            requests.RequestException: If request fails
+        """
+        # The slot is held until the body has been read
+        with self.limiter.hold(url):
+            response = self.session.get(url, timeout=self.timeout, stream=True)
+            try:
+                response.raise_for_status()
+                yield BodyStream(response, chunk_size, max_bytes)
+            finally:
+                response.close()
+
+    def clone_with_cookies(
+        self, cookies: Dict[str, str], headers: Optional[Dict[str, str]] = None
+    ):
+        """
+        Create a client with its own cookie jar over the same connection pool
+
+        The clone shares this client's adapter, so requests reuse pooled
+        keep-alive connections while cookies set by responses stay
+        isolated per clone, and its per-host limit. Only close the
+        original client.
+
+        Args:
+            cookies: Cookies for the new client
+            headers: Headers added to, or replacing, this client's headers
+
+        Returns:
+            HTTPClient sharing this client's connection pool
+        """
         client = HTTPClient(
             cookies=cookies,
-            headers=dict(self.session.headers),
+            headers=dict(self.session.headers, **(headers or {})),
             timeout=self.timeout,
+            pool_size=self.pool_size,
+            adapter=self.adapter,
+            limiter=self.limiter,
         )
         return client
 
@@ -0,0 +1,548 @@
+import base64
+import binascii
+import codecs
+import json
+import mmap
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from ssrleakguard.core.analyzer import SSRAnalyzer, create_process_pool
+from ssrleakguard.core.batch import BatchSummary
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.document import sniff_charset
+from ssrleakguard.core.http_client import decode_body
+from ssrleakguard.core.snapshots import SnapshotStore
+from ssrleakguard.utils.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+)
+
+# Bytes of a HAR file decoded at a time; a value that does not fit is
+# retried with twice as much
+_HAR_CHUNK = 1 << 20
+
+_WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+# What may follow the part of a number decoded so far, e.g. "." or "e-"
+_NUMBER_TAIL_RE = re.compile(r"[0-9.eE+-]*")
+_CHARSET_RE = re.compile(r"charset\s*=\s*[\"']?([A-Za-z0-9_.:-]+)", re.I)
+
+_HTML_SUFFIXES = (".html", ".htm")
+
+_DECODER = json.JSONDecoder()
+
+
+class _JSONReader:
+    """
+    Walks a JSON document held in a memory map without loading it whole
+
+    The document is decoded into a text window a chunk at a time. Objects
+    and arrays are entered with members() and elements(); each member or
+    element must then be read with value() or entered in turn before the
+    next one. Only the window, and the values taken out of it, are held.
+    """
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap], chunk: int = _HAR_CHUNK):
+        self._buffer = buffer
+        self._offset = 0
+        self._chunk = chunk
+        # HAR files written by some browsers start with a BOM
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")("replace")
+        self._text = ""
+        self._pos = 0
+
+    @property
+    def _exhausted(self) -> bool:
+        return self._offset >= len(self._buffer)
+
+    def _fill(self, size: int) -> bool:
+        """Append at least size more bytes to the window, if any are left"""
+        if self._exhausted:
+            return False
+        data = self._buffer[self._offset : self._offset + size]
+        self._offset += len(data)
+        self._text = self._text[self._pos :] + self._decoder.decode(
+            data, final=self._exhausted
+        )
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WHITESPACE_RE.match(self._text, self._pos).end()
+            if self._pos < len(self._text):
+                return self._text[self._pos]
+            if not self._fill(self._chunk):
+                return ""
+
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(
+                f"Expected {char!r} at byte {self._offset}, found {found!r}"
+            )
+        self._pos += 1
+
+    def value(self) -> Any:
+        """Read the next value whole"""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._text, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill(max(self._chunk, len(self._text) - self._pos)):
+                    raise
+                continue
+            # A number cut at the end of the window, even after its "." or
+            # "e", may go on in the file
+            tail = _NUMBER_TAIL_RE.match(self._text, end).end()
+            if tail < len(self._text) or not self._fill(self._chunk):
+                self._pos = end
+                return value
+
+    def _items(self, opening: str, closing: str) -> Iterator[None]:
+        self._expect(opening)
+        if self._peek() == closing:
+            self._pos += 1
+            return
+        while True:
+            yield
+            found = self._peek()
+            self._pos += 1
+            if found == closing:
+                return
+            if found != ",":
+                raise ValueError(
+                    f"Expected ',' or {closing!r} at byte {self._offset}, "
+                    f"found {found!r}"
+                )
+
+    def members(self) -> Iterator[str]:
+        """Enter an object, yielding its keys"""
+        for _ in self._items("{", "}"):
+            key = self.value()
+            self._expect(":")
+            yield key
+
+    def elements(self) -> Iterator[None]:
+        """Enter an array, yielding once per element"""
+        return self._items("[", "]")
+
+
+def iter_har_entries(path: Union[str, Path]) -> Iterator[Dict]:
+    """
+    Entries of a HAR file, one at a time
+
+    The file is memory-mapped and walked in order; each entry is parsed
+    when it is reached, so memory depends on the largest entry rather
+    than on the size of the capture.
+
+    Args:
+        path: HAR file
+
+    Yields:
+        Entries of log.entries, as dicts
+
+    Raises:
+        ValueError: If the file is not valid JSON
+    """
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            raise ValueError(f"Empty HAR file: {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if hasattr(buffer, "madvise"):
+                # Read ahead aggressively and drop pages once passed
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+            reader = _JSONReader(buffer, _HAR_CHUNK)
+            for key in reader.members():
+                if key != "log":
+                    reader.value()
+                    continue
+                for key in reader.members():
+                    if key != "entries":
+                        reader.value()
+                        continue
+                    for _ in reader.elements():
+                        yield reader.value()
+
+
+def _header_charset(content_type: str) -> Optional[str]:
+    match = _CHARSET_RE.search(content_type)
+    if match is None:
+        return None
+    try:
+        return codecs.lookup(match.group(1)).name
+    except LookupError:
+        return None
+
+
+def _entry_kind(url: str, mime_type: str) -> Optional[str]:
+    """"html", "data" for a Next.js data endpoint, or None"""
+    mime_type = mime_type.split(";", 1)[0].strip().lower()
+    if mime_type in ("text/html", "application/xhtml+xml"):
+        return "html"
+    if "/_next/data/" in url and mime_type == "application/json":
+        return "data"
+    return None
+
+
+def _entry_body(
+    content: Dict, kind: str, allow_bytes: bool
+) -> Union[str, bytes]:
+    """
+    Body of a HAR entry decoded like a fetched response body
+
+    Raises:
+        ValueError: If a base64 body does not decode
+    """
+    text = content["text"]
+    if content.get("encoding") != "base64":
+        if allow_bytes and kind == "html" and text.isascii():
+            return text.encode("ascii")
+        return text
+    try:
+        raw = base64.b64decode(text, validate=False)
+    except binascii.Error as exc:
+        raise ValueError(f"Invalid base64 body: {exc}")
+    charset = _header_charset(content.get("mimeType", ""))
+    if kind == "data":
+        return raw.decode(charset or "utf-8", errors="replace")
+    return decode_body(raw, charset or sniff_charset(raw), allow_bytes)
+
+
+def _entry_credentials(request: Dict) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Cookies and lower-cased headers an entry's request was sent with"""
+    headers = {}
+    for header in request.get("headers") or []:
+        headers[header.get("name", "").lower()] = header.get("value", "")
+    cookies = {}
+    for cookie in request.get("cookies") or []:
+        cookies[cookie.get("name", "")] = cookie.get("value", "")
+    if not cookies and "cookie" in headers:
+        for part in headers["cookie"].split(";"):
+            name, _, value = part.strip().partition("=")
+            if name:
+                cookies[name] = value
+    return cookies, headers
+
+
+def match_context(
+    request: Dict, contexts: List[AuthContext]
+) -> Optional[AuthContext]:
+    """
+    Context a recorded request was made in
+
+    A context matches when the request carried all of its cookies and
+    headers. The most specific match wins, so a context without cookies
+    (a guest) takes the requests no other context claims.
+
+    Args:
+        request: "request" object of a HAR entry
+        contexts: Candidate contexts
+
+    Returns:
+        The matching context, or None
+    """
+    cookies, headers = _entry_credentials(request)
+    best = None
+    best_size = -1
+    for ctx in contexts:
+        if any(cookies.get(k) != v for k, v in ctx.cookies.items()):
+            continue
+        if any(headers.get(k.lower()) != v for k, v in ctx.headers.items()):
+            continue
+        size = len(ctx.cookies) + len(ctx.headers)
+        if size > best_size:
+            best, best_size = ctx, size
+    return best
+
+
+class _Route:
+    """States of one route collected across contexts in Phase 2"""
+
+    __slots__ = ("url", "states")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.states: Dict[str, Future] = {}
+
+
+class OfflineScanner:
+    """
+    Scan saved responses instead of fetched ones: HAR files and
+    directories of saved HTML
+
+    Parsing, detection, scanning and Phase 2 diffs are those of
+    SSRAnalyzer; only the input differs. No request is sent.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        processes: int = 0,
+        verbose: bool = False,
+        ignore_order: bool = True,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+        incremental_json: bool = False,
+        max_json_nodes: Optional[int] = None,
+        max_json_depth: Optional[int] = None,
+        snapshots: Optional[SnapshotStore] = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.verbose = verbose
+        json_options = {
+            "incremental_json": incremental_json,
+            "max_json_nodes": max_json_nodes,
+            "max_json_depth": max_json_depth,
+        }
+        self.process_pool = None
+        if processes:
+            self.process_pool = create_process_pool(processes, **json_options)
+        self.analyzer = SSRAnalyzer(
+            None,
+            verbose=verbose,
+            process_pool=self.process_pool,
+            ignore_order=ignore_order,
+            instrumentation=instrumentation,
+            snapshots=snapshots,
+            **json_options,
+        )
+        self.stats: Dict[str, int] = {}
+
+    def _count(self, key: str, amount: int = 1):
+        self.stats[key] = self.stats.get(key, 0) + amount
+
+    def _har_pages(
+        self,
+        har_files: Iterable[str],
+        contexts: Optional[List[AuthContext]],
+        fail: Callable[[str, Exception], None],
+    ) -> Iterator[Tuple[str, str, Union[str, bytes], Optional[AuthContext]]]:
+        """(url, kind, body, context) of the usable HAR entries"""
+        for har in har_files:
+            try:
+                yield from self._har_file_pages(har, contexts)
+            except (OSError, ValueError) as exc:
+                # Entries read before the error have been scanned
+                fail(str(har), exc)
+
+    def _har_file_pages(
+        self, har: str, contexts: Optional[List[AuthContext]]
+    ) -> Iterator[Tuple[str, str, Union[str, bytes], Optional[AuthContext]]]:
+        allow_bytes = self.analyzer.secret_scanner.accepts_bytes
+        for entry in iter_har_entries(har):
+            self._count("entries")
+            request = entry.get("request") or {}
+            response = entry.get("response") or {}
+            content = response.get("content") or {}
+            url = request.get("url", "")
+            kind = _entry_kind(url, content.get("mimeType", ""))
+            if kind is None:
+                self._count("not_html")
+                continue
+            if not 200 <= response.get("status", 0) < 300:
+                self._count("not_ok")
+                continue
+            if not content.get("text"):
+                self._count("no_body")
+                continue
+            ctx = None
+            if contexts:
+                ctx = match_context(request, contexts)
+                if ctx is None:
+                    self._count("unmatched")
+                    continue
+            try:
+                body = _entry_body(content, kind, allow_bytes)
+            except ValueError as exc:
+                if self.verbose:
+                    print(f"[DEBUG] {har}: {url}: {exc}")
+                self._count("no_body")
+                continue
+            self._count("bytes_read", len(body))
+            yield url, kind, body, ctx
+
+    def _html_files(self, html_dir: Path) -> List[Path]:
+        return sorted(
+            path
+            for path in html_dir.rglob("*")
+            if path.suffix.lower() in _HTML_SUFFIXES and path.is_file()
+        )
+
+    def scan(
+        self,
+        har_files: Iterable[str] = (),
+        html_dirs: Iterable[str] = (),
+        contexts: Optional[List[AuthContext]] = None,
+        on_result: Optional[Callable[[Dict], None]] = None,
+        on_error: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict:
+        """
+        Scan HAR entries and saved HTML files with bounded concurrency
+
+        HAR entries are HTML responses and Next.js data endpoint payloads
+        with a 2xx status and a recorded body. In Phase 1 the same body
+        served at the same URL is scanned once. In Phase 2 each entry is
+        assigned to a context with match_context, and a route is compared
+        once every context has been seen there (or at the end of the
+        input, over the contexts that were).
+
+        Every *.html file under an HTML directory is scanned in Phase 1.
+        In Phase 2 a directory holds one subdirectory per context name,
+        and files at the same relative path are compared.
+
+        Args:
+            har_files: HAR files
+            html_dirs: Directories of saved HTML
+            contexts: Run Phase 2 with these contexts instead of Phase 1
+            on_result: Called with each result in input order as soon as
+                it is available. Results passed to it are not kept.
+            on_error: Called with (url, message) for each failed page.
+                Errors passed to it are not kept.
+
+        Returns:
+            Aggregated results like BatchScanner.scan, with input
+            statistics under summary["offline"]
+        """
+        results: List[Dict] = []
+        errors: List[Dict] = []
+        summary = BatchSummary()
+        self.stats = {}
+
+        # At most a window of bodies is read ahead of the analysis, and
+        # at most a window of results waits behind the oldest one
+        window = self.concurrency * 2
+        in_flight = threading.BoundedSemaphore(window)
+        pending: Deque[Tuple[str, Callable[[], Dict]]] = deque()
+
+        def submit(function: Callable, *args) -> Future:
+            in_flight.acquire()
+            future = pool.submit(function, *args)
+            future.add_done_callback(lambda _: in_flight.release())
+            return future
+
+        def emit(url: str, compute: Callable[[], Dict]):
+            pending.append((url, compute))
+            while len(pending) > window:
+                drain()
+
+        def fail(url: str, exc: Exception):
+            def compute() -> Dict:
+                raise exc
+
+            emit(url, compute)
+
+        def drain():
+            url, compute = pending.popleft()
+            try:
+                result = compute()
+            except Exception as exc:
+                summary.add_error()
+                if on_error is not None:
+                    on_error(url, str(exc))
+                else:
+                    errors.append({"url": url, "error": str(exc)})
+                return
+            summary.add_result(result)
+            if on_result is not None:
+                on_result(result)
+            else:
+                results.append(result)
+
+        names = [ctx.name for ctx in contexts or ()]
+        routes: Dict[Tuple[str, str], _Route] = {}
+        compared = set()
+
+        def compare(route: _Route) -> Callable[[], Dict]:
+            def compute() -> Dict:
+                present = [name for name in names if name in route.states]
+                states = [route.states[name].result() for name in present]
+                return self.analyzer.compare_states(route.url, present, states)
+
+            return compute
+
+        def add_state(key: Tuple[str, str], url: str, name: str, *args):
+            route = routes.get(key)
+            if route is None:
+                if key in compared:
+                    self._count("duplicates")
+                    return
+                route = routes[key] = _Route(url)
+            if name in route.states:
+                self._count("duplicates")
+                return
+            route.states[name] = submit(self.analyzer.saved_state, *args)
+            if len(route.states) == len(names):
+                del routes[key]
+                compared.add(key)
+                emit(url, compare(route))
+
+        seen = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for url, kind, body, ctx in self._har_pages(
+                har_files, contexts, fail
+            ):
+                if ctx is not None:
+                    add_state(("har", url), url, ctx.name, body, kind)
+                    continue
+                key = hash((url, body))
+                if key in seen:
+                    self._count("duplicates")
+                    continue
+                seen.add(key)
+                emit(url, submit(self.analyzer.analyze_saved, url, body, kind).result)
+
+            for html_dir in map(Path, html_dirs):
+                if not contexts:
+                    for path in self._html_files(html_dir):
+                        self._count("files")
+                        url = path.resolve().as_uri()
+                        emit(url, submit(self.analyzer.analyze_saved, url, path).result)
+                    continue
+                for ctx in contexts:
+                    ctx_dir = html_dir / ctx.name
+                    if not ctx_dir.is_dir():
+                        continue
+                    for path in self._html_files(ctx_dir):
+                        self._count("files")
+                        route = "/" + path.relative_to(ctx_dir).as_posix()
+                        add_state((str(html_dir), route), route, ctx.name, path)
+
+            # Routes some contexts never reached are compared over the
+            # contexts that did, if there are at least two
+            for route in routes.values():
+                if len(route.states) < 2:
+                    self._count("incomplete")
+                    continue
+                emit(route.url, compare(route))
+            routes.clear()
+            while pending:
+                drain()
+
+        summary_dict = summary.as_dict()
+        summary_dict["offline"] = dict(self.stats)
+        return {
+            "phase": 2 if contexts else 1,
+            "results": results,
+            "errors": errors,
+            "summary": summary_dict,
+        }
+
+    def close(self):
+        """Shut down the worker processes, if any"""
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
@@ -0,0 +1,584 @@
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from ssrleakguard.core.batch import BatchScanner
+from ssrleakguard.core.context import AuthContext, contexts_from_spec
+from ssrleakguard.core.crawler import Crawler
+from ssrleakguard.detectors.finding import json_default
+from ssrleakguard.utils.sinks import JSONLSink, ReportSink
+
+# Largest job description accepted over HTTP
+MAX_BODY = 1 << 20
+
+
+def parse_job_spec(spec: Dict) -> Dict:
+    """
+    Validate a job description
+
+    A job is a JSON object with "url" or "urls", and optionally
+    "contexts" (a list of {"name": ..., "cookies": {...}, "headers":
+    {...}}) and/or a "matrix" of them, as in a contexts file, to run
+    Phase 2, and "crawl", "max_pages" and "max_depth" to crawl from the
+    URLs.
+
+    Args:
+        spec: Decoded job description
+
+    Returns:
+        Keyword arguments for ScanJob
+
+    Raises:
+        ValueError: If the description is invalid
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Job must be a JSON object")
+
+    urls = spec.get("urls")
+    if urls is None and spec.get("url") is not None:
+        urls = [spec["url"]]
+    if not urls or not isinstance(urls, list) or not all(
+        isinstance(url, str) and url for url in urls
+    ):
+        raise ValueError('Job needs "url" or a non-empty "urls" list')
+
+    contexts = []
+    if spec.get("contexts") is not None or spec.get("matrix") is not None:
+        contexts = contexts_from_spec(
+            {"contexts": spec.get("contexts"), "matrix": spec.get("matrix")}
+        )
+
+    options = {"urls": list(dict.fromkeys(urls)), "contexts": contexts or None}
+    options["crawl"] = bool(spec.get("crawl", False))
+    for key, default in (("max_pages", 500), ("max_depth", 3)):
+        value = spec.get(key, default)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f'"{key}" must be a non-negative integer')
+        options[key] = value
+    return options
+
+
+class ScanJob:
+    """
+    One scan submitted to the service
+
+    Results are passed to the sink, if any, and kept as records in the
+    JSONLSink format unless keep_records is off, so clients can follow
+    the job while it runs and fetch its output afterwards.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        contexts: Optional[List[AuthContext]] = None,
+        crawl: bool = False,
+        max_pages: int = 500,
+        max_depth: int = 3,
+        sink: Optional[ReportSink] = None,
+        keep_records: bool = True,
+        on_done: Optional[Callable[["ScanJob"], None]] = None,
+    ):
+        self.id = uuid.uuid4().hex[:16]
+        self.urls = urls
+        self.contexts = contexts
+        self.crawl = crawl
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.sink = sink
+        self.keep_records = keep_records
+        self.on_done = on_done
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.summary: Optional[Dict] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._records: List[Dict] = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def _emit(self, records: Iterator[Dict]):
+        if not self.keep_records:
+            return
+        with self._cond:
+            self._records.extend(records)
+            self._cond.notify_all()
+
+    def _start(self):
+        self.status = "running"
+        self.started = time.time()
+        if self.sink is not None:
+            self.sink.start(phase=2 if self.contexts else 1, batch=True)
+
+    def add_result(self, result: Dict):
+        if self.sink is not None:
+            self.sink.write_result(result)
+        self._emit(JSONLSink.records(result))
+
+    def add_error(self, url: str, error: str):
+        if self.sink is not None:
+            self.sink.write_error(url, error)
+        self._emit([{"record": "error", "url": url, "error": error}])
+
+    def _finish(self, summary: Optional[Dict], error: Optional[str] = None):
+        try:
+            if self.sink is not None:
+                try:
+                    if error is None:
+                        self.sink.finish(summary)
+                finally:
+                    self.sink.close()
+        except Exception as exc:
+            # The scan ran but its output is incomplete
+            if error is None:
+                error = f"Writing results failed: {exc}"
+        finally:
+            # Followers wait for this, whatever happened to the sink
+            with self._cond:
+                self.summary = summary
+                self.error = error
+                self.finished = time.time()
+                if error is None:
+                    self._records.append(dict(summary, record="summary"))
+                    self.status = "done"
+                else:
+                    self._records.append({"record": "failed", "error": error})
+                    self.status = "failed"
+                self._cond.notify_all()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def follow(self, timeout: Optional[float] = None) -> Iterator[List[Dict]]:
+        """
+        Records of the job, from the first one, until it is done
+
+        Args:
+            timeout: Stop waiting for new records after this many seconds
+
+        Yields:
+            Lists of records as they become available
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(
+                    lambda: len(self._records) > sent or self.done, timeout
+                ):
+                    return
+                records = self._records[sent:]
+                finished = self.done
+            if records:
+                sent += len(records)
+                yield records
+            if finished and sent == len(self._records):
+                return
+
+    def as_dict(self) -> Dict:
+        """Status of the job, without its records"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "urls": self.urls,
+            "contexts": [ctx.name for ctx in self.contexts or []],
+            "crawl": self.crawl,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+class ScanService:
+    """
+    Long-running scanner accepting jobs over HTTP, a Unix socket or a
+    queue directory
+
+    One BatchScanner, and with it the analyzer, its compiled patterns,
+    the HTTP connection pools, the result cache and any worker processes,
+    is shared by every job, so a scan costs little more than its network
+    round-trips. Jobs run concurrently, up to max_jobs at a time.
+
+    Args:
+        batch: Scanner running the jobs
+        max_jobs: Jobs run at the same time; more are queued
+        keep_jobs: Finished jobs kept for status and result queries
+        verbose: Log requests
+    """
+
+    def __init__(
+        self,
+        batch: BatchScanner,
+        max_jobs: int = 4,
+        keep_jobs: int = 100,
+        verbose: bool = False,
+    ):
+        self.batch = batch
+        self.max_jobs = max(1, max_jobs)
+        self.keep_jobs = keep_jobs
+        self.verbose = verbose
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_jobs, thread_name_prefix="scan-job"
+        )
+        self._jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(f"[DEBUG] {msg}")
+
+    def submit(self, spec: Dict, **job_options) -> ScanJob:
+        """
+        Queue a job
+
+        Args:
+            spec: Job description, see parse_job_spec
+            **job_options: sink, keep_records or on_done for the ScanJob
+
+        Returns:
+            The queued job
+
+        Raises:
+            ValueError: If the description is invalid
+        """
+        job = ScanJob(**parse_job_spec(spec), **job_options)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job)
+        self._log(f"Queued job {job.id}: {len(job.urls)} URL(s)")
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[: max(0, len(finished) - self.keep_jobs)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ScanJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    @property
+    def active(self) -> int:
+        """Jobs queued or running"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def _run(self, job: ScanJob):
+        try:
+            job._start()
+            if job.crawl:
+                crawler = Crawler(
+                    self.batch.client,
+                    self.batch.analyzer,
+                    max_pages=job.max_pages,
+                    max_depth=job.max_depth,
+                    concurrency=self.batch.concurrency,
+                )
+                results = crawler.crawl(
+                    job.urls,
+                    contexts=job.contexts,
+                    on_result=job.add_result,
+                    on_error=job.add_error,
+                )
+            else:
+                results = self.batch.scan(
+                    job.urls,
+                    contexts=job.contexts,
+                    on_result=job.add_result,
+                    on_error=job.add_error,
+                )
+        except Exception as exc:
+            self._log(f"Job {job.id} failed: {exc}")
+            job._finish(None, error=str(exc))
+        else:
+            self._log(f"Job {job.id} done")
+            job._finish(results["summary"])
+
+    def serve(
+        self,
+        address: Optional[Tuple[str, int]] = None,
+        socket_path: Optional[str] = None,
+        queue_dir: Optional[str] = None,
+        poll_interval: float = 1.0,
+    ):
+        """
+        Accept jobs until interrupted, terminated or stop() is called
+
+        Running jobs are finished before it returns.
+
+        Args:
+            address: (host, port) to serve the HTTP API on
+            socket_path: Unix socket to serve the HTTP API on
+            queue_dir: Directory to take job files from
+            poll_interval: Seconds between scans of the queue directory
+        """
+        servers: List[socketserver.BaseServer] = []
+        threads: List[threading.Thread] = []
+        try:
+            if address is not None:
+                server = ThreadingHTTPServer(address, _Handler)
+                server.service = self
+                servers.append(server)
+                print(f"Listening on http://{address[0]}:{server.server_address[1]}")
+            if socket_path is not None:
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
+                server = _UnixHTTPServer(socket_path, _Handler)
+                server.service = self
+                servers.append(server)
+                print(f"Listening on {socket_path}")
+            for server in servers:
+                threads.append(
+                    threading.Thread(target=server.serve_forever, daemon=True)
+                )
+            if queue_dir is not None:
+                queue = DirectoryQueue(self, queue_dir, poll_interval)
+                threads.append(
+                    threading.Thread(target=queue.run, args=(self._stop,), daemon=True)
+                )
+                print(f"Watching {queue.incoming}")
+
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+            for thread in threads:
+                thread.start()
+            while not self._stop.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stop.set()
+            for server in servers:
+                server.shutdown()
+                server.server_close()
+            if socket_path is not None and os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self.close()
+
+    def stop(self):
+        """Make serve return"""
+        self._stop.set()
+
+    def close(self):
+        """Wait for running jobs, then release the scanner"""
+        self._executor.shutdown(wait=True)
+        self.batch.close()
+
+
+class DirectoryQueue:
+    """
+    Jobs as files in a directory
+
+    Job descriptions are dropped into incoming/ as *.json files (write
+    them elsewhere and rename them in, so they are never read half
+    written). A file is claimed by moving it to running/, so several
+    services can share one queue. Records stream to running/<name>.jsonl
+    and both files move to done/ or failed/ when the job ends; a job that
+    could not start leaves a <name>.error file in failed/.
+    """
+
+    def __init__(self, service: ScanService, path: str, poll_interval: float = 1.0):
+        self.service = service
+        self.poll_interval = poll_interval
+        self.incoming = os.path.join(path, "incoming")
+        self.running = os.path.join(path, "running")
+        self.done = os.path.join(path, "done")
+        self.failed = os.path.join(path, "failed")
+        for directory in (self.incoming, self.running, self.done, self.failed):
+            os.makedirs(directory, exist_ok=True)
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                self.poll()
+            except OSError as exc:
+                self.service._log(f"Queue poll failed: {exc}")
+            stop.wait(self.poll_interval)
+
+    def poll(self) -> int:
+        """Claim and submit waiting jobs while there is capacity"""
+        claimed = 0
+        for name in sorted(os.listdir(self.incoming)):
+            if not name.endswith(".json"):
+                continue
+            if self.service.active >= self.service.max_jobs:
+                break
+            path = os.path.join(self.running, name)
+            try:
+                os.replace(os.path.join(self.incoming, name), path)
+            except FileNotFoundError:
+                # Claimed by another service
+                continue
+            claimed += 1
+            self._submit(name, path)
+        return claimed
+
+    def _submit(self, name: str, path: str):
+        stem = name[: -len(".json")]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+            sink = JSONLSink(os.path.join(self.running, f"{stem}.jsonl"))
+        except (OSError, ValueError) as exc:
+            self._reject(stem, path, str(exc))
+            return
+        try:
+            self.service.submit(
+                spec,
+                sink=sink,
+                keep_records=False,
+                on_done=lambda job: self._complete(stem, job),
+            )
+        except ValueError as exc:
+            sink.close()
+            os.unlink(sink.path)
+            self._reject(stem, path, str(exc))
+
+    def _reject(self, stem: str, path: str, error: str):
+        os.replace(path, os.path.join(self.failed, f"{stem}.json"))
+        with open(os.path.join(self.failed, f"{stem}.error"), "w", encoding="utf-8") as f:
+            f.write(error + "\n")
+
+    def _complete(self, stem: str, job: ScanJob):
+        target = self.done if job.status == "done" else self.failed
+        for suffix in (".jsonl", ".json"):
+            os.replace(
+                os.path.join(self.running, stem + suffix),
+                os.path.join(target, stem + suffix),
+            )
+        if job.error is not None:
+            with open(os.path.join(target, f"{stem}.error"), "w", encoding="utf-8") as f:
+                f.write(job.error + "\n")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the service
+
+        POST /scans                 queue a job, 202 with its status
+        POST /scans?stream=1        queue a job and stream its records
+        GET  /scans                 status of every known job
+        GET  /scans/<id>            status of one job
+        GET  /scans/<id>/results    records of a job (NDJSON), streamed
+                                    until it is done
+        GET  /health                liveness and job counts
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "SSRLeakGuard"
+
+    @property
+    def service(self) -> ScanService:
+        return self.server.service
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format, *args):
+        self.service._log(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: Dict):
+        data = json.dumps(body, default=json_default).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, job: ScanJob):
+        """Records as NDJSON with chunked encoding, as they are produced"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Scan-Id", job.id)
+        self.end_headers()
+        try:
+            for records in job.follow():
+                data = "".join(
+                    json.dumps(record, default=json_default) + "\n" for record in records
+                ).encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The job keeps running; its records can be fetched again
+            self.close_connection = True
+
+    def do_GET(self):
+        parts = [p for p in urlsplit(self.path).path.split("/") if p]
+        if parts == ["health"]:
+            jobs = self.service.jobs()
+            return self._send_json(
+                200,
+                {
+                    "status": "ok",
+                    "active": sum(1 for job in jobs if not job.done),
+                    "jobs": len(jobs),
+                },
+            )
+        if parts == ["scans"]:
+            return self._send_json(
+                200, {"jobs": [job.as_dict() for job in self.service.jobs()]}
+            )
+        if len(parts) in (2, 3) and parts[0] == "scans":
+            job = self.service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": "Unknown job"})
+            if len(parts) == 2:
+                return self._send_json(200, job.as_dict())
+            if parts[2] == "results":
+                if not job.keep_records:
+                    return self._send_json(
+                        404, {"error": "Job results are not kept by the service"}
+                    )
+                return self._stream(job)
+        self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != "/scans":
+            return self._send_json(404, {"error": "Not found"})
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            return self._send_json(400, {"error": "Invalid Content-Length"})
+        if length > MAX_BODY:
+            self.close_connection = True
+            return self._send_json(413, {"error": "Job description too large"})
+        try:
+            spec = json.loads(self.rfile.read(length) or b"null")
+            job = self.service.submit(spec)
+        except ValueError as exc:
+            return self._send_json(400, {"error": str(exc)})
+
+        stream = parse_qs(url.query).get("stream", ["0"])[0]
+        if stream not in ("", "0", "false"):
+            return self._stream(job)
+        self._send_json(202, job.as_dict())
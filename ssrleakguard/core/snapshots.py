@@ -0,0 +1,322 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ssrleakguard.core.differ import (
+    diff_flat_states,
+    flatten_state,
+    leaf_digest,
+    leaf_from_value,
+    leaf_value,
+)
+
+# Bumped whenever the meaning of stored hashes changes
+FORMAT_VERSION = 1
+
+# Bound parameters per statement, below SQLite's lowest default limit
+_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS routes (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    context TEXT NOT NULL,
+    ordered INTEGER NOT NULL,
+    root BLOB NOT NULL,
+    taken REAL NOT NULL,
+    UNIQUE (url, context)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    route INTEGER NOT NULL,
+    path INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    PRIMARY KEY (route, path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS paths (
+    key INTEGER PRIMARY KEY,
+    path TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash BLOB PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS history (
+    route INTEGER NOT NULL,
+    taken REAL NOT NULL,
+    root BLOB NOT NULL,
+    leaves INTEGER NOT NULL,
+    changed INTEGER NOT NULL
+);
+"""
+
+
+def _path_key(path: str) -> int:
+    """Signed 64-bit key of a flattened path, as SQLite stores integers"""
+    digest = hashlib.blake2b(
+        path.encode("utf-8", "surrogatepass"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _chunks(items: List, size: int = _CHUNK) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class SnapshotStore:
+    """
+    SQLite store of the latest SSR state per route and context
+
+    A state is kept as one value hash per flattened path, keyed by a hash
+    of the path, plus a root hash over all of them. Recording a new state
+    first compares root hashes, so an unchanged route costs one row read
+    and one history row. Otherwise the path hashes are compared and full
+    values are read back only for the paths that changed; values are
+    stored once per distinct value, shared by every route and context.
+
+    Args:
+        path: SQLite database file
+    """
+
+    def __init__(self, path: str):
+        # sqlite3 is only imported once a store is opened
+        import sqlite3
+
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+        with self._db:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'format'"
+            ).fetchone()
+            if row is None:
+                self._db.execute(
+                    "INSERT INTO meta VALUES ('format', ?)", (str(FORMAT_VERSION),)
+                )
+            elif row[0] != str(FORMAT_VERSION):
+                # Hashes from another format would all look changed. History
+                # goes too: its route IDs would be reused by new routes
+                self._db.execute("DELETE FROM routes")
+                self._db.execute("DELETE FROM entries")
+                self._db.execute("DELETE FROM history")
+                self._db.execute(
+                    "UPDATE meta SET value = ? WHERE key = 'format'",
+                    (str(FORMAT_VERSION),),
+                )
+
+    @staticmethod
+    def _root(hashes: Dict[int, bytes]) -> bytes:
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(hashes):
+            h.update(key.to_bytes(8, "little", signed=True))
+            h.update(hashes[key])
+        return h.digest()
+
+    def _load_values(self, hashes: Iterable[bytes]) -> Dict[bytes, Any]:
+        values: Dict[bytes, Any] = {}
+        for chunk in _chunks(list(set(hashes))):
+            rows = self._db.execute(
+                f"SELECT hash, value FROM blobs WHERE hash IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for digest, value in rows:
+                values[digest] = json.loads(value)
+        return values
+
+    def _load_paths(self, keys: Iterable[int]) -> Dict[int, str]:
+        paths: Dict[int, str] = {}
+        for chunk in _chunks(list(keys)):
+            rows = self._db.execute(
+                f"SELECT key, path FROM paths WHERE key IN "
+                f"({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            paths.update(rows)
+        return paths
+
+    @classmethod
+    def prepare(cls, state: Any, ignore_order: bool = True) -> Tuple:
+        """
+        Flatten and hash a state once, for recording it under several
+        contexts with record(prepared=...)
+        """
+        flat = flatten_state(state, ignore_order)
+        keys = {_path_key(path): path for path in flat}
+        hashes = {key: leaf_digest(flat[path]) for key, path in keys.items()}
+        return flat, keys, hashes, cls._root(hashes), ignore_order
+
+    def record(
+        self,
+        url: str,
+        context: str,
+        state: Any = None,
+        ignore_order: bool = True,
+        taken: Optional[float] = None,
+        prepared: Optional[Tuple] = None,
+    ) -> Dict:
+        """
+        Store a state and compare it with the previous one
+
+        Args:
+            url: Route URL
+            context: Name of the context the state was fetched with
+            state: Normalized SSR state
+            ignore_order: Compare lists as unordered collections; a state
+                recorded in the other mode is treated as a new baseline
+            taken: Time of the snapshot, defaults to now
+            prepared: Result of prepare(), in place of state and
+                ignore_order
+
+        Returns:
+            ``status`` ("new", "unchanged" or "changed"), ``previous``
+            (time of the previous snapshot, if any) and for changed
+            states a ``diff`` in the format of diff_ssr_states
+        """
+        taken = time.time() if taken is None else taken
+        if prepared is None:
+            prepared = self.prepare(state, ignore_order)
+        flat, keys, hashes, root, ignore_order = prepared
+        ordered = 0 if ignore_order else 1
+
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id, ordered, root, taken FROM routes "
+                "WHERE url = ? AND context = ?",
+                (url, context),
+            ).fetchone()
+
+            if row is not None and row[1] == ordered and row[2] == root:
+                self._db.execute(
+                    "UPDATE routes SET taken = ? WHERE id = ?", (taken, row[0])
+                )
+                self._history(row[0], taken, root, len(hashes), 0)
+                return {"status": "unchanged", "previous": row[3]}
+
+            if row is None:
+                route = self._db.execute(
+                    "INSERT INTO routes (url, context, ordered, root, taken) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url, context, ordered, root, taken),
+                ).lastrowid
+                previous: Dict[int, bytes] = {}
+            else:
+                route = row[0]
+                self._db.execute(
+                    "UPDATE routes SET ordered = ?, root = ?, taken = ? "
+                    "WHERE id = ?",
+                    (ordered, root, taken, route),
+                )
+                previous = dict(
+                    self._db.execute(
+                        "SELECT path, hash FROM entries WHERE route = ?", (route,)
+                    )
+                )
+                if row[1] != ordered:
+                    self._db.execute(
+                        "DELETE FROM entries WHERE route = ?", (route,)
+                    )
+                    previous = {}
+
+            changed = [
+                key for key, digest in hashes.items() if previous.get(key) != digest
+            ]
+            removed = [key for key in previous if key not in hashes]
+            self._store(route, flat, keys, hashes, changed, removed)
+            self._history(route, taken, root, len(hashes), len(changed) + len(removed))
+
+            if row is None or row[1] != ordered:
+                return {"status": "new", "previous": None}
+
+            diff = self._diff(flat, keys, previous, changed, removed, ignore_order)
+            return {"status": "changed", "previous": row[3], "diff": diff}
+
+    def _store(
+        self,
+        route: int,
+        flat: Dict[str, Any],
+        keys: Dict[int, str],
+        hashes: Dict[int, bytes],
+        changed: List[int],
+        removed: List[int],
+    ):
+        self._db.executemany(
+            "INSERT OR IGNORE INTO paths VALUES (?, ?)",
+            ((key, keys[key]) for key in changed),
+        )
+        self._db.executemany(
+            "INSERT OR IGNORE INTO blobs VALUES (?, ?)",
+            (
+                (hashes[key], json.dumps(leaf_value(flat[keys[key]])))
+                for key in changed
+            ),
+        )
+        self._db.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+            ((route, key, hashes[key]) for key in changed),
+        )
+        self._db.executemany(
+            "DELETE FROM entries WHERE route = ? AND path = ?",
+            ((route, key) for key in removed),
+        )
+
+    def _history(self, route: int, taken: float, root: bytes, leaves: int, changed: int):
+        self._db.execute(
+            "INSERT INTO history VALUES (?, ?, ?, ?, ?)",
+            (route, taken, root, leaves, changed),
+        )
+
+    def _diff(
+        self,
+        flat: Dict[str, Any],
+        keys: Dict[int, str],
+        previous: Dict[int, bytes],
+        changed: List[int],
+        removed: List[int],
+        ignore_order: bool,
+    ) -> Dict[str, Dict]:
+        """Diff of the changed paths only, with old values read back"""
+        old_keys = [key for key in changed if key in previous] + removed
+        values = self._load_values(previous[key] for key in old_keys)
+        paths = dict(keys)
+        paths.update(self._load_paths(removed))
+
+        baseline = {
+            paths[key]: leaf_from_value(values[previous[key]], ignore_order)
+            for key in old_keys
+        }
+        other = {keys[key]: flat[keys[key]] for key in changed}
+        return diff_flat_states(baseline, other)
+
+    def history(self, url: str, context: str) -> List[Tuple[float, int, int]]:
+        """(time, leaves, changed paths) of every snapshot of a route"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT history.taken, leaves, changed FROM history "
+                "JOIN routes ON routes.id = history.route "
+                "WHERE url = ? AND context = ? ORDER BY history.taken",
+                (url, context),
+            ).fetchall()
+
+    def prune(self):
+        """Drop stored values and paths no longer used by any route"""
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM entries)"
+            )
+            self._db.execute(
+                "DELETE FROM paths WHERE key NOT IN (SELECT path FROM entries)"
+            )
+
+    def close(self):
+        self.prune()
+        self._db.close()
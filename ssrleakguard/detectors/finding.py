@@ -0,0 +1,155 @@
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Union
+
+# Characters of surrounding text kept on each side of a secret for snippets
+SNIPPET_CONTEXT = 50
+
+# Keys in the order findings have always been serialized in
+_BASE_KEYS = ("type", "severity", "secret", "description", "context", "snippet", "position")
+_OPTIONAL_KEYS = ("data_path", "fingerprint", "locations")
+_WRITABLE = frozenset(("context", "position") + _OPTIONAL_KEYS)
+
+
+class Finding(Mapping):
+    """
+    A secret match, read like the finding dicts the scanners used to build
+
+    Only the pattern, the scanned text (str, or bytes read as UTF-8) and
+    the match offsets are stored.
+    The secret, description and snippet are built when a key is read, so
+    matches that are merged away by deduplicate_findings never pay for
+    them. ``context``, ``position``, ``data_path``, ``fingerprint`` and
+    ``locations`` can be assigned like dict items; other keys are
+    read-only.
+
+    A finding keeps the scanned text alive until detach() trims it to the
+    snippet window. Pickled or written as JSON (see json_default) it
+    becomes a plain dict.
+
+    Args:
+        pattern: CompiledPattern that matched
+        source: Text or bytes the match was found in
+        start: Start of the match in source
+        end: End of the match in source
+        context: Where the text came from, e.g. "HTML body"
+        position: Reported position, defaults to start
+    """
+
+    __slots__ = (
+        "pattern",
+        "_source",
+        "_start",
+        "_length",
+        "context",
+        "position",
+        "data_path",
+        "fingerprint",
+        "locations",
+    )
+
+    def __init__(
+        self,
+        pattern,
+        source: Union[str, bytes],
+        start: int,
+        end: int,
+        context: str = "",
+        position: Optional[int] = None,
+    ):
+        self.pattern = pattern
+        self._source = source
+        self._start = start
+        # Lengths are mostly small cached ints, unlike end offsets
+        self._length = end - start
+        self.context = context
+        self.position = start if position is None else position
+        self.data_path: Optional[str] = None
+        self.fingerprint: Optional[str] = None
+        self.locations: Optional[List[Dict]] = None
+
+    @property
+    def type(self) -> str:
+        return self.pattern.name
+
+    @property
+    def severity(self) -> str:
+        return self.pattern.info["severity"]
+
+    @property
+    def description(self) -> str:
+        return self.pattern.info["description"]
+
+    @property
+    def secret(self) -> str:
+        return _text(self._source[self._start : self._start + self._length])
+
+    @property
+    def snippet(self) -> str:
+        start = max(0, self._start - SNIPPET_CONTEXT)
+        end = self._start + self._length + SNIPPET_CONTEXT
+        return _text(self._source[start:end]).replace("\n", " ").strip()
+
+    def detach(self) -> "Finding":
+        """
+        Keep only the snippet window of the scanned text
+
+        Called on findings that outlive the scan of a large buffer, so the
+        buffer itself can be freed. Returns the finding.
+        """
+        start = max(0, self._start - SNIPPET_CONTEXT)
+        end = self._start + self._length + SNIPPET_CONTEXT
+        if start or end < len(self._source):
+            self._source = self._source[start:end]
+            self._start -= start
+        return self
+
+    def __getitem__(self, key: str) -> Any:
+        if key in _BASE_KEYS or (
+            key in _OPTIONAL_KEYS and getattr(self, key) is not None
+        ):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in _WRITABLE:
+            raise KeyError(f"Finding key is read-only: {key}")
+        setattr(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        if key in _BASE_KEYS:
+            return True
+        return key in _OPTIONAL_KEYS and getattr(self, key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        yield from _BASE_KEYS
+        for key in _OPTIONAL_KEYS:
+            if getattr(self, key) is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return len(_BASE_KEYS) + sum(
+            getattr(self, key) is not None for key in _OPTIONAL_KEYS
+        )
+
+    def __repr__(self) -> str:
+        return f"Finding({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dict with every key, as written to JSON output"""
+        return {key: self[key] for key in self}
+
+    def __reduce__(self):
+        # Compiled patterns do not pickle; other processes get the values
+        return (dict, (self.to_dict(),))
+
+
+def _text(value: Union[str, bytes]) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def json_default(value: Any) -> Any:
+    """``default`` for json.dumps: findings as dicts, anything else as str"""
+    if isinstance(value, Finding):
+        return value.to_dict()
+    return str(value)
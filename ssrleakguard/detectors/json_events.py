@@ -0,0 +1,284 @@
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, Iterator, List, Optional, Tuple
+
+# One token after optional whitespace. Strings without escapes are matched
+# whole, as object keys together with their colon; other strings only by
+# their opening quote and decoded by the json module. The empty alternative
+# at the end matches trailing whitespace.
+_TOKEN_RE = re.compile(
+    r"[ \t\n\r]*(?:"
+    r"([{}\[\],:])"
+    r"|\"([^\"\\\x00-\x1f]*)\"[ \t\n\r]*:"
+    r"|\"([^\"\\\x00-\x1f]*)\""
+    r"|(\")"
+    r"|(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?)"
+    r"|(true|false|null|NaN|Infinity|-Infinity)"
+    r"|(\Z))"
+)
+_PUNCT, _KEY_COLON, _SIMPLE_STRING, _STRING, _NUMBER, _LITERAL, _END = range(
+    1, 8
+)
+
+# Whitespace before a token
+_SPACE_RE = re.compile(r"[ \t\n\r]*")
+# Characters that could still extend a number at the end of a piece
+_NUMBER_TAIL_RE = re.compile(r"[0-9.eE+-]*")
+# A string with its closing quote, to tell an invalid string from one
+# that has not fully arrived
+_STRING_BODY_RE = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+
+_LITERALS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "NaN": float("nan"),
+    "Infinity": float("inf"),
+    "-Infinity": float("-inf"),
+}
+
+# Longest token that can be cut short without being a string or number
+_MAX_PARTIAL = len("-Infinity")
+
+# Parser states: what the next token must be
+_VALUE, _FIRST_VALUE, _KEY, _FIRST_KEY, _COLON, _AFTER, _DONE = range(7)
+
+
+class JSONLimitExceeded(ValueError):
+    """The document has more nodes or deeper nesting than allowed"""
+
+
+class JSONEventParser:
+    """
+    Incremental JSON parser producing leaves as they are parsed
+
+    Text is fed in pieces of any size, e.g. response chunks. Each leaf is
+    produced as a (path, value) pair with the same paths as
+    NextJSParser.iter_data_paths, and no dict or list is ever built, so
+    memory is bounded by the nesting depth and the longest single token
+    rather than the size of the document. Empty containers and a scalar
+    document root produce no leaves.
+
+    Values are decoded exactly as by json.loads; invalid JSON raises
+    ValueError (json.JSONDecodeError) from feed or close.
+
+    Args:
+        max_nodes: Raise JSONLimitExceeded after this many values
+            (containers and leaves); None for no limit
+        max_depth: Raise JSONLimitExceeded when containers nest deeper
+            than this; None for no limit
+        keys: Also produce every object key, as (path of its member, key)
+            before the member, like iter_data_paths with keys
+    """
+
+    def __init__(
+        self,
+        max_nodes: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        keys: bool = False,
+    ):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.keys = keys
+        self.nodes = 0
+        self._pending = ""
+        # One frame per open container: [is_dict, path prefix, list index,
+        # path of the current member]
+        self._stack: List[list] = []
+        self._state = _VALUE
+
+    @property
+    def depth(self) -> int:
+        """Number of currently open containers"""
+        return len(self._stack)
+
+    def feed(self, text: str) -> Iterator[Tuple[str, Any]]:
+        """
+        Parse the next piece of the document
+
+        The returned iterator must be consumed before the next call. A
+        token cut off at the end of the piece is kept for the next one.
+
+        Args:
+            text: Next piece of JSON text
+
+        Yields:
+            (path, value) for every leaf completed by this piece
+        """
+        return self._parse(self._pending + text, final=False)
+
+    def close(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Parse whatever is left and check that the document is complete
+
+        Yields:
+            (path, value) for the remaining leaves
+        """
+        return self._parse(self._pending, final=True)
+
+    def _error(self, msg: str, text: str, pos: int):
+        raise json.JSONDecodeError(msg, text, pos)
+
+    def _parse(self, text: str, final: bool) -> Iterator[Tuple[str, Any]]:
+        stack = self._stack
+        state = self._state
+        nodes = self.nodes
+        max_nodes = self.max_nodes
+        max_depth = self.max_depth
+        keys = self.keys
+        token = _TOKEN_RE.match
+        pos = 0
+        length = len(text)
+
+        while True:
+            match = token(text, pos)
+            if match is None:
+                start = _SPACE_RE.match(text, pos).end()
+                if not final and length - start <= _MAX_PARTIAL:
+                    # Possibly the start of a literal; wait for the rest
+                    pos = start
+                    break
+                self._error("Expecting value", text, start)
+
+            kind = match.lastindex
+            if kind == _END:
+                pos = length
+                break
+            if state == _DONE:
+                self._error("Extra data", text, match.start(kind))
+
+            if kind == _KEY_COLON:
+                if state != _KEY and state != _FIRST_KEY:
+                    self._error("Unexpected string", text, match.start(kind))
+                frame = stack[-1]
+                key = match.group(_KEY_COLON)
+                frame[3] = frame[1] + key
+                state = _VALUE
+                pos = match.end()
+                if keys:
+                    yield frame[3], key
+                continue
+
+            if kind == _PUNCT:
+                char = match.group(_PUNCT)
+                if char == "," and state == _AFTER:
+                    frame = stack[-1]
+                    if frame[0]:
+                        state = _KEY
+                    else:
+                        frame[2] += 1
+                        state = _VALUE
+                elif char == "{" or char == "[":
+                    if state != _VALUE and state != _FIRST_VALUE:
+                        self._error("Unexpected " + char, text, match.start(kind))
+                    nodes += 1
+                    if max_nodes is not None and nodes > max_nodes:
+                        self.nodes = nodes
+                        raise JSONLimitExceeded(
+                            f"JSON has more than {max_nodes} nodes"
+                        )
+                    if max_depth is not None and len(stack) >= max_depth:
+                        raise JSONLimitExceeded(
+                            f"JSON is nested deeper than {max_depth} levels"
+                        )
+                    path = self._member_path(stack)
+                    if char == "{":
+                        stack.append([True, f"{path}." if path else "", 0, None])
+                        state = _FIRST_KEY
+                    else:
+                        stack.append([False, path, 0, None])
+                        state = _FIRST_VALUE
+                elif char == "}" or char == "]":
+                    is_dict = char == "}"
+                    if not stack or stack[-1][0] is not is_dict or not (
+                        state == _AFTER
+                        or state == (_FIRST_KEY if is_dict else _FIRST_VALUE)
+                    ):
+                        self._error("Unexpected " + char, text, match.start(kind))
+                    stack.pop()
+                    state = _AFTER if stack else _DONE
+                elif char == ":" and state == _COLON:
+                    state = _VALUE
+                else:
+                    self._error("Unexpected " + char, text, match.start(kind))
+                pos = match.end()
+                continue
+
+            # A string, number or literal
+            if kind == _SIMPLE_STRING:
+                value = match.group(_SIMPLE_STRING)
+                end = match.end()
+            elif kind == _STRING:
+                start = match.end()
+                try:
+                    value, end = scanstring(text, start)
+                except json.JSONDecodeError:
+                    if final or _STRING_BODY_RE.match(text, start):
+                        raise
+                    # Not closed yet
+                    pos = match.start(kind)
+                    break
+            elif kind == _NUMBER:
+                end = match.end()
+                if not final and (
+                    _NUMBER_TAIL_RE.match(text, end).end() == length
+                ):
+                    # More digits may follow in the next piece
+                    pos = match.start(kind)
+                    break
+                number = match.group(_NUMBER)
+                if "." in number or "e" in number or "E" in number:
+                    value = float(number)
+                else:
+                    value = int(number)
+            else:
+                end = match.end()
+                value = _LITERALS[match.group(_LITERAL)]
+
+            if state == _VALUE or state == _FIRST_VALUE:
+                nodes += 1
+                if max_nodes is not None and nodes > max_nodes:
+                    self.nodes = nodes
+                    raise JSONLimitExceeded(f"JSON has more than {max_nodes} nodes")
+                if stack:
+                    frame = stack[-1]
+                    if frame[0]:
+                        yield frame[3], value
+                    else:
+                        yield f"{frame[1]}[{frame[2]}]", value
+                    state = _AFTER
+                else:
+                    state = _DONE
+            elif state == _KEY or state == _FIRST_KEY:
+                if kind != _SIMPLE_STRING and kind != _STRING:
+                    self._error(
+                        "Expecting property name enclosed in double quotes",
+                        text,
+                        match.start(kind),
+                    )
+                frame = stack[-1]
+                frame[3] = f"{frame[1]}{value}"
+                state = _COLON
+                if keys:
+                    yield frame[3], value
+            elif state == _COLON:
+                self._error("Expecting ':' delimiter", text, match.start(kind))
+            else:
+                self._error("Expecting ',' delimiter", text, match.start(kind))
+            pos = end
+
+        self.nodes = nodes
+        self._state = state
+        self._pending = text[pos:]
+        if final and state != _DONE:
+            self._error("Unexpected end of JSON", text, length)
+
+    @staticmethod
+    def _member_path(stack: List[list]) -> str:
+        if not stack:
+            return ""
+        frame = stack[-1]
+        if frame[0]:
+            return frame[3]
+        return f"{frame[1]}[{frame[2]}]"
@@ -1,36 +1,33 @@
 import json
-from bs4 import BeautifulSoup
-from typing import Dict, Optional
+from urllib.parse import quote, urlsplit, urlunsplit
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple, Union
+from ssrleakguard.core.document import HTMLDocument, as_document
 
 
 class NextJSParser:
     """Parser for Next.js specific SSR data"""
 
     @staticmethod
-    def extract_next_data(html: str) -> Optional[Dict]:
+    def extract_next_data(html: Union[str, HTMLDocument]) -> Optional[Dict]:
         """
         Extract and parse __NEXT_DATA__ from Next.js page
 
         Args:
-            html: HTML content
+            html: HTML content or a shared HTMLDocument
 
         Returns:
             Parsed JSON data or None if not found
         """
-        soup = BeautifulSoup(html, "lxml")
-
         # Find the __NEXT_DATA__ script tag
-        next_data_script = soup.find(
-            "script", {"id": "__NEXT_DATA__", "type": "application/json"}
-        )
+        next_data_text = as_document(html).next_data_text
 
-        if not next_data_script:
+        if not next_data_text:
             return None
 
         try:
-            data = json.loads(next_data_script.string)
+            data = json.loads(next_data_text)
             return data
-        except (json.JSONDecodeError, AttributeError):
+        except json.JSONDecodeError:
             return None
 
     @staticmethod
@@ -50,43 +47,160 @@ class NextJSParser:
             return None
 
     @staticmethod
-    def extract_all_data_paths(data: Dict, prefix: str = "") -> list:
+    def extract_build_id(next_data: Optional[Dict]) -> Optional[str]:
         """
-        Recursively extract all data paths from nested dictionary
+        Build ID of a Pages Router deployment
 
         Args:
-            data: Dictionary to traverse
-            prefix: Current path prefix
+            next_data: Parsed __NEXT_DATA__ object
 
         Returns:
-            List of (path, value) tuples
+            The buildId, or None if the payload has none
         """
-        results = []
+        if not isinstance(next_data, dict):
+            return None
+        build_id = next_data.get("buildId")
+        if isinstance(build_id, str) and build_id:
+            return build_id
+        return None
 
-        if isinstance(data, dict):
-            for key, value in data.items():
-                current_path = f"{prefix}.{key}" if prefix else key
-
-                if isinstance(value, (dict, list)):
-                    results.extend(
-                        NextJSParser.extract_all_data_paths(
-                            value, current_path
-                        )
-                    )
-                else:
-                    results.append((current_path, value))
+    @staticmethod
+    def data_url(url: str, build_id: str) -> str:
+        """
+        URL serving a route's page props as JSON
+
+        Pages Router sites serve the props of every getServerSideProps or
+        getStaticProps page at /_next/data/<buildId>/<route>.json, the
+        endpoint the client router fetches on navigation.
+
+        Args:
+            url: Page URL
+            build_id: Build ID of the deployment serving the page
 
+        Returns:
+            Data endpoint URL, with the page's query string
+        """
+        parts = urlsplit(url)
+        route = parts.path.rstrip("/") or "/index"
+        path = f"/_next/data/{quote(build_id, safe='')}{route}.json"
+        return urlunsplit((parts.scheme, parts.netloc, path, parts.query, ""))
+
+    @staticmethod
+    def extract_outside_page_props(next_data: Any) -> Dict:
+        """
+        Everything in __NEXT_DATA__ except the page props
+
+        Args:
+            next_data: Parsed __NEXT_DATA__ JSON
+
+        Returns:
+            Copy of next_data without props.pageProps (e.g. query,
+            runtimeConfig and other props); empty if nothing is left or
+            next_data is not an object
+        """
+        if not isinstance(next_data, dict):
+            return {}
+        rest = {k: v for k, v in next_data.items() if k != "props"}
+        props = next_data.get("props")
+        if isinstance(props, dict):
+            other = {k: v for k, v in props.items() if k != "pageProps"}
+            if other:
+                rest["props"] = other
+        elif props is not None:
+            rest["props"] = props
+        return rest
+
+    @staticmethod
+    def iter_data_paths(
+        data: Any, prefix: str = "", keys: bool = False
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Lazily yield every leaf of nested dictionaries and lists
+
+        Traversal is iterative and depth-first, in document order, so the
+        depth of the data is not limited by the recursion limit. Each
+        container's path is built once and shared as the prefix of all its
+        children, and nothing is materialized beyond the current branch.
+
+        Args:
+            data: Dictionary or list to traverse
+            prefix: Path of data itself
+            keys: Also yield every dictionary key, as (path of its member,
+                key) before the member, so data keyed by a secret (an
+                email, a token) can be scanned too
+
+        Yields:
+            (path, value) tuples such as ("user.roles[0]", "admin")
+        """
+        if isinstance(data, dict):
+            # Frames hold the container's iterator and the text its child
+            # paths start with: "a.b." for dicts, "a.b" for lists
+            stack = [(iter(data.items()), f"{prefix}." if prefix else "", True)]
         elif isinstance(data, list):
-            for idx, value in enumerate(data):
-                current_path = f"{prefix}[{idx}]"
-
-                if isinstance(value, (dict, list)):
-                    results.extend(
-                        NextJSParser.extract_all_data_paths(
-                            value, current_path
-                        )
+            stack = [(enumerate(data), prefix, False)]
+        else:
+            return
+
+        while stack:
+            items, base, is_dict = stack[-1]
+            for key, value in items:
+                path = f"{base}{key}" if is_dict else f"{base}[{key}]"
+                if keys and is_dict:
+                    yield path, str(key)
+                if isinstance(value, dict):
+                    stack.append(
+                        (iter(value.items()), f"{path}." if path else "", True)
                     )
-                else:
-                    results.append((current_path, value))
+                    break
+                if isinstance(value, list):
+                    stack.append((enumerate(value), path, False))
+                    break
+                yield path, value
+            else:
+                stack.pop()
+
+    @staticmethod
+    def next_data_paths(
+        leaves: Iterable[Tuple[str, Any]]
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Map leaves of the whole __NEXT_DATA__ to the paths reported for it
+
+        Gives the same paths as flattening extract_page_props and
+        extract_outside_page_props separately, for leaves that come from
+        parsing the payload as a whole, e.g. from a JSONEventParser.
+
+        Args:
+            leaves: (path, value) tuples with paths from the payload root
 
-        return results
\ No newline at end of file
+        Yields:
+            (path, value) with page props paths relative to pageProps and
+            all other paths under "__NEXT_DATA__."
+        """
+        for path, value in leaves:
+            if path.startswith("props.pageProps"):
+                rest = path[len("props.pageProps"):]
+                if rest[:1] == ".":
+                    yield rest[1:], value
+                    continue
+                if rest[:1] == "[":
+                    yield rest, value
+                    continue
+            # Scalar pageProps have no path of their own and stay at
+            # __NEXT_DATA__.props.pageProps
+            yield f"__NEXT_DATA__.{path}", value
+
+    @staticmethod
+    def extract_all_data_paths(data: Dict, prefix: str = "") -> list:
+        """
+        Extract all data paths from nested dictionary
+
+        Args:
+            data: Dictionary to traverse
+            prefix: Current path prefix
+
+        Returns:
+            List of (path, value) tuples; see iter_data_paths for a lazy
+            version that does not hold every path at once
+        """
+        return list(NextJSParser.iter_data_paths(data, prefix))
@@ -1,83 +1,345 @@
+import hashlib
 import re
-from typing import List, Dict, Tuple
+from typing import Any, AnyStr, Dict, Iterable, List, Optional, Sequence, Tuple
+from ssrleakguard.detectors.finding import Finding
+from ssrleakguard.detectors.pattern_engine import PatternEngine
+from ssrleakguard.utils.instrumentation import (
+    NULL_INSTRUMENTATION,
+    Instrumentation,
+)
 from ssrleakguard.utils.patterns import SECRET_PATTERNS
 
+# Characters the variable-length part of every built-in pattern stops at
+# (the classes of tokens, keys, URLs and emails exclude them)
+_SEPARATORS = " \t\n\r\f\v\"'<>"
+
+
+def fingerprint(secret: str) -> str:
+    """Stable identifier of a secret value that does not reveal it"""
+    return hashlib.sha256(secret.encode("utf-8", "replace")).hexdigest()[:16]
+
+
+def deduplicate_findings(findings: List[Dict]) -> List[Dict]:
+    """
+    Merge findings of the same secret
+
+    Findings are grouped by (type, fingerprint of the secret). The first
+    finding of each group is kept, in order, and gains a ``fingerprint``
+    and a ``locations`` list with the context, position and data path of
+    every occurrence. Kept findings are detached from the scanned text,
+    so results do not hold on to whole pages.
+
+    Args:
+        findings: Findings from one or more scans
+
+    Returns:
+        One finding per distinct secret
+    """
+    unique: Dict[Tuple[str, str], Dict] = {}
+
+    for finding in findings:
+        if isinstance(finding, Finding):
+            # Attribute access skips the Mapping interface
+            location = {"context": finding.context, "position": finding.position}
+            if finding.data_path is not None:
+                location["data_path"] = finding.data_path
+            key = (finding.pattern.name, fingerprint(finding.secret))
+        else:
+            location = {
+                "context": finding["context"],
+                "position": finding["position"],
+            }
+            if "data_path" in finding:
+                location["data_path"] = finding["data_path"]
+            key = (finding["type"], fingerprint(finding["secret"]))
+
+        first = unique.get(key)
+        if first is None:
+            if isinstance(finding, Finding):
+                finding.detach()
+            finding["fingerprint"] = key[1]
+            finding["locations"] = [location]
+            unique[key] = finding
+        else:
+            first["locations"].append(location)
+
+    return list(unique.values())
+
 
 class SecretScanner:
     """Scanner for detecting secrets and sensitive data in content"""
 
-    def __init__(self):
-        self.patterns = SECRET_PATTERNS
+    def __init__(
+        self,
+        patterns: Optional[Dict[str, Dict]] = None,
+        instrumentation: Instrumentation = NULL_INSTRUMENTATION,
+    ):
+        self.patterns = patterns if patterns is not None else SECRET_PATTERNS
+        self.engine = PatternEngine(
+            self.patterns, instrumentation=instrumentation
+        )
+        # Patterns that match a field name together with its value; in
+        # structured data they are tried against "path: value"
+        self.keyed_engine = PatternEngine(
+            {
+                name: info
+                for name, info in self.patterns.items()
+                if info.get("keyed")
+            },
+            instrumentation=instrumentation,
+        )
+        # A keyed match starts inside the path, so a path containing none
+        # of the keyed anchors needs no keyed scan (None: always scan)
+        self._keyed_prefilter: Optional[re.Pattern] = None
+        if all(p.anchors for p in self.keyed_engine.patterns):
+            anchors = [a for p in self.keyed_engine.patterns for a in p.anchors]
+            self._keyed_prefilter = re.compile(
+                "|".join(re.escape(a) for a in anchors) or "(?!)",
+                re.IGNORECASE,
+            )
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        return self.engine.instrumentation
+
+    @instrumentation.setter
+    def instrumentation(self, instrumentation: Instrumentation):
+        self.engine.instrumentation = instrumentation
+        self.keyed_engine.instrumentation = instrumentation
 
-    def scan_content(self, content: str, context: str = "") -> List[Dict]:
+    @property
+    def accepts_bytes(self) -> bool:
+        """Whether scan_content can take bytes (every pattern is ASCII)"""
+        return self.engine.ascii
+
+    @staticmethod
+    def _finding(pattern, match, content: AnyStr, context: str):
+        return Finding(pattern, content, match.start(), match.end(), context)
+
+    def scan_content(
+        self,
+        content: AnyStr,
+        context: str = "",
+        pos: int = 0,
+        exclude: Sequence[Tuple[int, int]] = (),
+    ) -> List[Dict]:
         """
         Scan content for secrets using regex patterns
 
         Args:
-            content: String content to scan
+            content: String content to scan, or bytes if accepts_bytes;
+                bytes give the same findings as their decoded text when
+                they are ASCII, with positions in bytes
             context: Context information (e.g., "HTML body", "props.user")
+            pos: Offset where matches may start; earlier text is only
+                used as context
+            exclude: (start, end) ranges already covered by another scan.
+                Only the text between them is scanned, and no match
+                extends into an excluded range; the text around each
+                range is still seen as context, as with pos.
 
         Returns:
-            List of findings dictionaries
+            List of Finding objects, read like dicts
         """
-        findings = []
+        # Validators are applied by the engine before a finding is built,
+        # and a finding only records offsets into content
+        if not exclude:
+            return [
+                self._finding(pattern, match, content, context)
+                for pattern, match in self.engine.finditer(content, pos)
+            ]
 
-        for pattern_name, pattern_info in self.patterns.items():
-            regex = pattern_info["pattern"]
-            matches = re.finditer(regex, content, re.IGNORECASE)
-
-            for match in matches:
-                # Extract matched secret
-                secret = match.group(0)
-
-                # Get surrounding context (50 chars before and after)
-                start = max(0, match.start() - 50)
-                end = min(len(content), match.end() + 50)
-                snippet = content[start:end]
-
-                finding = {
-                    "type": pattern_name,
-                    "severity": pattern_info["severity"],
-                    "secret": secret,
-                    "description": pattern_info["description"],
-                    "context": context,
-                    "snippet": snippet.replace("\n", " ").strip(),
-                    "position": match.start(),
-                }
-
-                # Validate if needed
-                if "validator" in pattern_info:
-                    if not pattern_info["validator"](secret):
-                        continue
-
-                findings.append(finding)
+        # Each segment is scanned in place with pos and endpos rather than
+        # sliced out, so word boundaries and lookarounds at its edges see
+        # the same neighbours as in a scan of the whole content
+        findings = []
+        for start, end in self._segments(len(content), pos, exclude):
+            for pattern, match in self.engine.finditer(
+                content, start, endpos=end
+            ):
+                findings.append(self._finding(pattern, match, content, context))
 
+        # Keep the same order as an unrestricted scan: by pattern, then
+        # by position
+        order = {name: idx for idx, name in enumerate(self.patterns)}
+        findings.sort(key=lambda f: (order[f["type"]], f["position"]))
         return findings
 
+    @staticmethod
+    def _segments(
+        length: int, pos: int, exclude: Sequence[Tuple[int, int]]
+    ) -> List[Tuple[int, int]]:
+        segments = []
+        start = pos
+        for ex_start, ex_end in sorted(exclude):
+            if ex_start > start:
+                segments.append((start, min(ex_start, length)))
+            start = max(start, ex_end)
+        if start < length:
+            segments.append((start, length))
+        return segments
+
     def scan_data_structure(
-        self, data_paths: List[Tuple[str, any]]
+        self, data_paths: Iterable[Tuple[str, Any]]
     ) -> List[Dict]:
         """
         Scan structured data paths for secrets
 
         Args:
-            data_paths: List of (path, value) tuples
+            data_paths: (path, value) tuples, e.g. a list or the lazy
+                NextJSParser.iter_data_paths, consumed once
 
         Returns:
             List of findings
         """
         findings = []
+        keyed = bool(self.keyed_engine.patterns)
+        leaves = 0
 
         for path, value in data_paths:
+            leaves += 1
             if not isinstance(value, str):
                 value = str(value)
 
             # Scan the value
-            path_findings = self.scan_content(value, context=f"Path: {path}")
+            context = f"Path: {path}"
+            path_findings = self.scan_content(value, context=context)
+            if keyed:
+                path_findings.extend(self._scan_keyed(path, value, context))
 
             # Add path-specific context
             for finding in path_findings:
                 finding["data_path"] = path
                 findings.append(finding)
 
-        return findings
\ No newline at end of file
+        self.instrumentation.count("leaves_scanned", leaves)
+        return findings
+
+    def _scan_keyed(self, path: str, value: str, context: str) -> List[Dict]:
+        prefilter = self._keyed_prefilter
+        if prefilter is not None and prefilter.search(path) is None:
+            return []
+
+        text = f"{path}: {value}"
+        value_start = len(path) + 2
+        findings = []
+        for pattern, match in self.keyed_engine.finditer(text):
+            # Matches inside the value alone were found by the value scan
+            if match.start() >= value_start:
+                continue
+            finding = self._finding(pattern, match, text, context)
+            finding["position"] = 0
+            findings.append(finding)
+        return findings
+
+
+class StreamScanner:
+    """
+    Incremental secret scanning over a stream of text chunks
+
+    Each chunk is scanned together with the tail of the previous one. Matches
+    that end inside the last ``overlap`` characters could still grow with
+    the next chunk, so they are held back and rescanned; the carried text
+    also keeps ``context`` characters before it for snippets. Positions in
+    the returned findings are offsets into the whole stream.
+
+    A match longer than ``overlap`` may not match at all until its last
+    characters arrive (an email before its domain suffix). The trailing run
+    of characters without whitespace, quotes or angle brackets is therefore
+    held back too, with ``overlap`` characters before it, for up to
+    ``max_match`` characters; matches reaching into it wait until it ends.
+    Matches are the same as in one scan of the whole text unless they are
+    longer than max_match, or longer than overlap with a separator in
+    their variable part (possible with custom patterns only).
+    """
+
+    def __init__(
+        self,
+        scanner: SecretScanner,
+        context: str = "",
+        overlap: int = 4096,
+        snippet_context: int = 50,
+        max_match: int = 1 << 20,
+    ):
+        self.scanner = scanner
+        self.context = context
+        self.overlap = overlap
+        self.snippet_context = snippet_context
+        self.max_match = max(max_match, overlap)
+        self._carry = ""
+        self._offset = 0
+        self._accept_from = 0
+        self._resume: Dict[str, int] = {}
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Scan the next chunk
+
+        Args:
+            chunk: Next piece of decoded text
+
+        Returns:
+            Findings that can no longer change with more input
+        """
+        return self._scan(self._carry + chunk, final=False)
+
+    def close(self) -> List[Dict]:
+        """
+        Scan whatever is still held back at the end of the stream
+
+        Returns:
+            Remaining findings
+        """
+        findings = self._scan(self._carry, final=True)
+        self._carry = ""
+        return findings
+
+    def _open_run(self, buffer: str) -> int:
+        """Start of the trailing run of non-separator characters"""
+        start = max(0, len(buffer) - self.max_match)
+        for separator in _SEPARATORS:
+            idx = buffer.rfind(separator, start)
+            if idx >= start:
+                start = idx + 1
+        return start
+
+    def _scan(self, buffer: str, final: bool) -> List[Dict]:
+        base = self._offset
+        if final:
+            limit = defer_from = len(buffer)
+        else:
+            # Matches ending past limit may still grow; those starting
+            # from defer_from on may not have matched yet
+            run_start = self._open_run(buffer)
+            limit = max(min(len(buffer) - self.overlap, run_start), 0)
+            defer_from = max(min(limit, run_start - self.overlap), 0)
+        findings = []
+
+        # Each pattern resumes where its last reported match ended, so it
+        # goes through the same matches as a scan of the whole text
+        starts = {
+            name: end - base for name, end in self._resume.items() if end > base
+        }
+        matches = self.scanner.engine.finditer(
+            buffer, self._accept_from - base, starts
+        )
+        for pattern, match in matches:
+            start, end = match.span()
+            if end > limit and not final:
+                defer_from = min(defer_from, start)
+                continue
+
+            finding = self.scanner._finding(pattern, match, buffer, self.context)
+            finding.position = base + start
+            self._resume[pattern.name] = base + end
+            # The buffer is dropped with the next chunk
+            findings.append(finding.detach())
+
+        self._accept_from = max(self._accept_from, base + defer_from)
+        keep_from = max(
+            0, min(defer_from, self._accept_from - base) - self.snippet_context
+        )
+        self._carry = buffer[keep_from:]
+        self._offset = base + keep_from
+
+        return findings
@@ -1,17 +1,17 @@
-from bs4 import BeautifulSoup
-from typing import Dict, Optional
+from typing import Dict, Union
+from ssrleakguard.core.document import HTMLDocument, as_document
 
 
 class SSRDetector:
     """Detects if a page uses Server-Side Rendering"""
 
     @staticmethod
-    def detect_ssr(html: str) -> Dict[str, any]:
+    def detect_ssr(html: Union[str, HTMLDocument]) -> Dict[str, any]:
         """
         Detect SSR framework and patterns
 
         Args:
-            html: HTML content to analyze
+            html: HTML content or a shared HTMLDocument to analyze
 
         Returns:
             Dictionary with detection results:
@@ -22,41 +22,32 @@ class SSRDetector:
                 'indicators': list
             }
         """
-        soup = BeautifulSoup(html, "lxml")
+        document = as_document(html)
         indicators = []
 
         # Check for Next.js specific markers
         nextjs_detected = False
 
         # Look for __NEXT_DATA__ script
-        next_data_script = soup.find(
-            "script", {"id": "__NEXT_DATA__", "type": "application/json"}
-        )
-        if next_data_script:
+        if document.next_data_script is not None:
             indicators.append("__NEXT_DATA__ script found")
             nextjs_detected = True
 
         # Look for Next.js build ID meta tag
-        next_build_id = soup.find("meta", {"name": "next-head-count"})
-        if next_build_id:
+        if document.has_meta("next-head-count"):
             indicators.append("Next.js meta tags found")
             nextjs_detected = True
 
         # Check for Next.js script tags
-        next_scripts = soup.find_all("script", src=True)
-        for script in next_scripts:
-            src = script.get("src", "")
+        for src in document.script_sources():
             if "_next/static/" in src or "/_next/" in src:
                 indicators.append(f"Next.js script: {src}")
                 nextjs_detected = True
                 break
 
         # Check for meaningful initial HTML (sign of SSR)
-        body = soup.find("body")
-        if body:
-            text_content = body.get_text(strip=True)
-            if len(text_content) > 200:  # Arbitrary threshold
-                indicators.append("Meaningful initial HTML content")
+        if document.has_meaningful_body():  # Arbitrary threshold
+            indicators.append("Meaningful initial HTML content")
 
         if nextjs_detected:
             confidence = "high" if len(indicators) >= 2 else "medium"
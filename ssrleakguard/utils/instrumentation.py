@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class Instrumentation:
+    """
+    Timers and counters for the scan pipeline
+
+    Timers accumulate a call count, total and maximum duration per name;
+    counters accumulate integers. Names are dotted by area, for example
+    ``pattern.jwt_token`` for the time spent in one secret pattern and
+    ``matches.jwt_token`` for the matches it produced. Safe to share
+    between threads.
+
+    Args:
+        on_timing: Called with (name, seconds) whenever a timer finishes,
+            e.g. to forward measurements to another metrics system
+    """
+
+    enabled = True
+
+    def __init__(self, on_timing: Optional[Callable[[str, float], None]] = None):
+        self.on_timing = on_timing
+        self._lock = threading.Lock()
+        # name -> [count, total seconds, max seconds]
+        self._timers: Dict[str, List[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._routes: Dict[str, float] = {}
+
+    def add_time(self, name: str, seconds: float):
+        """Record one duration for a timer"""
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+        if self.on_timing is not None:
+            self.on_timing(name, seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Time the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name: str, amount: int = 1):
+        """Add to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def record_route(self, url: str, seconds: float):
+        """Record the total time spent on one URL"""
+        with self._lock:
+            self._routes[url] = self._routes.get(url, 0.0) + seconds
+
+    def merge(self, snapshot: Dict):
+        """Fold in a snapshot taken elsewhere, e.g. in a worker process"""
+        with self._lock:
+            for name, stats in snapshot["timers"].items():
+                timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+                timer[0] += stats["count"]
+                timer[1] += stats["total_s"]
+                timer[2] = max(timer[2], stats["max_s"])
+            for name, amount in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+            for route in snapshot["routes"]:
+                self._routes[route["url"]] = (
+                    self._routes.get(route["url"], 0.0) + route["seconds"]
+                )
+
+    def snapshot(self) -> Dict:
+        """
+        Current measurements as plain data
+
+        Returns:
+            {
+                'timers': {name: {'count', 'total_s', 'max_s'}},
+                'counters': {name: int},
+                'routes': [{'url', 'seconds'}] slowest first
+            }
+        """
+        with self._lock:
+            timers = {
+                name: {"count": int(count), "total_s": total, "max_s": peak}
+                for name, (count, total, peak) in sorted(self._timers.items())
+            }
+            counters = dict(sorted(self._counters.items()))
+            routes = [
+                {"url": url, "seconds": seconds}
+                for url, seconds in sorted(
+                    self._routes.items(), key=lambda item: -item[1]
+                )
+            ]
+        return {"timers": timers, "counters": counters, "routes": routes}
+
+    def export_json(self, path: str):
+        """Write the current snapshot to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+class NullInstrumentation(Instrumentation):
+    """Instrumentation that records nothing; the default when timing is off"""
+
+    enabled = False
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def timer(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def record_route(self, url: str, seconds: float):
+        pass
+
+    def merge(self, snapshot: Dict):
+        pass
+
+
+# Shared default for components created without instrumentation
+NULL_INSTRUMENTATION = NullInstrumentation()
@@ -1,3 +1,4 @@
+import hashlib
 import re
 
 # Common secret patterns with validators
@@ -19,59 +20,82 @@ def validate_aws_secret(secret: str) -> bool:
     return len(secret) == 40
 
 
+# "anchors" lists literals (matched case-insensitively) at which every match
+# of the pattern starts. If a match can begin earlier, "anchor_lead" is the
+# character class it may extend over to the left of the literal. The scanner
+# uses anchors to skip patterns that cannot match a buffer and to run the
+# regex only where an anchor occurs. Patterns without anchors are always
+# scanned in full.
+#
+# "keyed" patterns match a field name followed by its value. Structured
+# data is scanned leaf by leaf, so those patterns are additionally tried
+# against "path: value" for every leaf.
 SECRET_PATTERNS = {
     "jwt_token": {
         "pattern": r"eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}",
         "description": "JSON Web Token (JWT)",
         "severity": "high",
+        "anchors": ("eyJ",),
         "validator": validate_jwt,
     },
     "api_key_generic": {
         "pattern": r"(?i)(api[_-]?key|apikey|access[_-]?key)[\"\']?\s*[:=]\s*[\"\']?([a-z0-9_\-]{16,})",
         "description": "Generic API Key",
         "severity": "high",
+        "anchors": ("api", "access"),
+        "keyed": True,
     },
     "bearer_token": {
         "pattern": r"Bearer\s+[A-Za-z0-9\-\._~\+\/]+=*",
         "description": "Bearer Token",
         "severity": "high",
+        "anchors": ("Bearer",),
     },
     "aws_access_key": {
         "pattern": r"AKIA[0-9A-Z]{16}",
         "description": "AWS Access Key ID",
         "severity": "critical",
+        "anchors": ("AKIA",),
         "validator": validate_aws_key,
     },
     "aws_secret_key": {
         "pattern": r"(?i)aws[_-]?secret[_-]?access[_-]?key[\"\']?\s*[:=]\s*[\"\']?([a-z0-9/+=]{40})",
         "description": "AWS Secret Access Key",
         "severity": "critical",
+        "anchors": ("aws",),
+        "keyed": True,
         "validator": validate_aws_secret,
     },
     "github_token": {
         "pattern": r"ghp_[a-zA-Z0-9]{36}",
         "description": "GitHub Personal Access Token",
         "severity": "critical",
+        "anchors": ("ghp_",),
     },
     "slack_token": {
         "pattern": r"xox[baprs]-[0-9]{10,12}-[0-9]{10,12}-[a-zA-Z0-9]{24,32}",
         "description": "Slack Token",
         "severity": "high",
+        "anchors": ("xox",),
     },
     "private_key": {
         "pattern": r"-----BEGIN\s+(RSA\s+)?PRIVATE\s+KEY-----",
         "description": "Private Key",
         "severity": "critical",
+        "anchors": ("-----BEGIN",),
     },
     "database_connection": {
         "pattern": r"(?i)(mongodb|mysql|postgres|postgresql)://[^\s\"\'<>]+",
         "description": "Database Connection String",
         "severity": "high",
+        "anchors": ("mongodb", "mysql", "postgres"),
     },
     "email_address": {
         "pattern": r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b",
         "description": "Email Address",
         "severity": "medium",
+        "anchors": ("@",),
+        "anchor_lead": r"[A-Za-z0-9._%+-]",
     },
     "phone_number": {
         "pattern": r"\b(?:\+?1[-.\s]?)?\(?\d{3}\)?[-.\s]\d{3}[-.\s]\d{4}\b",
@@ -82,5 +106,35 @@ SECRET_PATTERNS = {
         "pattern": r"(?i)(session[_-]?id|sessionid|sess)[\"\']?\s*[:=]\s*[\"\']?([a-f0-9]{32,})",
         "description": "Session ID",
         "severity": "high",
+        "anchors": ("sess",),
+        "keyed": True,
     },
-}
\ No newline at end of file
+}
+
+
+def pattern_set_version(patterns: dict = SECRET_PATTERNS) -> str:
+    """
+    Fingerprint of a pattern set, used to invalidate cached findings
+
+    Args:
+        patterns: Pattern definitions
+
+    Returns:
+        Short hex digest that changes whenever a pattern, its metadata or
+        the package version changes
+    """
+    from ssrleakguard import __version__
+
+    digest = hashlib.sha256(__version__.encode())
+    for name, info in patterns.items():
+        validator = info.get("validator")
+        parts = [
+            name,
+            info["pattern"],
+            info["description"],
+            info["severity"],
+            getattr(validator, "__qualname__", ""),
+            "keyed" if info.get("keyed") else "",
+        ]
+        digest.update("\0".join(parts).encode())
+    return digest.hexdigest()[:16]
@@ -29,10 +29,18 @@ class Reporter:
         "aws": "Move AWS credentials to server-side environment variables and never expose in SSR props",
         "secret": "Remove secrets from SSR output; use server-side environment variables",
         "authorization_inconsistency": "Add proper authorization checks in getServerSideProps() before fetching sensitive data",
+        "state_drift": "Check that the change to SSR data since the last snapshot was intended by a deploy",
         "cache_unsafe_personalization": "Add 'Cache-Control: private' or 'Vary: Cookie' header for user-specific pages",
         "default": "Review SSR data serialization logic and filter sensitive information before rendering"
     }
     
+    def __init__(self, stream=None):
+        # Report destination; None prints to whatever sys.stdout is then
+        self.stream = stream
+
+    def _print(self, *args, **kwargs):
+        print(*args, file=self.stream, **kwargs)
+
     def get_remediation(self, finding_type):
         """Get remediation guidance for a specific finding type"""
         finding_lower = finding_type.lower()
@@ -51,36 +59,52 @@ class Reporter:
 
     def print_console_report(self, results):
         """Phase 1: SSR Data Exposure Report"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print("ANALYSIS RESULTS")
-        print(f"{'='*60}{Style.RESET_ALL}\n")
+        self._print(f"\n{Fore.CYAN}{'='*60}")
+        self._print("ANALYSIS RESULTS")
+        self._print(f"{'='*60}{Style.RESET_ALL}\n")
 
-        print(f"{Fore.WHITE}Target URL:{Style.RESET_ALL} {results['url']}")
-        print(
+        self._print(f"{Fore.WHITE}Target URL:{Style.RESET_ALL} {results['url']}")
+        self._print(
             f"{Fore.WHITE}SSR Detected:{Style.RESET_ALL} "
             f"{'Yes' if results['ssr_detected'] else 'No'}"
         )
 
         if results.get("framework"):
-            print(
+            self._print(
                 f"{Fore.WHITE}Framework:{Style.RESET_ALL} "
                 f"{results['framework']}"
             )
 
+        if results.get("truncated"):
+            self._print(
+                f"{Fore.YELLOW}Body truncated after "
+                f"{results['bytes_read']} bytes{Style.RESET_ALL}"
+            )
+        if results.get("stopped_early"):
+            self._print(
+                f"{Fore.YELLOW}Scan stopped at the first critical finding"
+                f"{Style.RESET_ALL}"
+            )
+        if results.get("next_data_limit"):
+            self._print(
+                f"{Fore.YELLOW}__NEXT_DATA__ only partly scanned: "
+                f"{results['next_data_limit']}{Style.RESET_ALL}"
+            )
+
         metadata = results.get("metadata", {})
         if metadata:
-            print(f"\n{Fore.CYAN}Metadata:{Style.RESET_ALL}")
+            self._print(f"\n{Fore.CYAN}Metadata:{Style.RESET_ALL}")
             for key, value in metadata.items():
-                print(f"  - {key}: {value}")
+                self._print(f"  - {key}: {value}")
 
         findings = results.get("findings", [])
-        print(
+        self._print(
             f"\n{Fore.CYAN}Findings: {len(findings)}"
             f"{Style.RESET_ALL}\n"
         )
 
         if not findings:
-            print(f"{Fore.GREEN}[✓] No security issues detected{Style.RESET_ALL}")
+            self._print(f"{Fore.GREEN}[✓] No security issues detected{Style.RESET_ALL}")
 
         else:
             # Group findings by severity
@@ -96,66 +120,241 @@ class Reporter:
                 color = self.SEVERITY_COLORS.get(severity, Fore.WHITE)
                 group = grouped[severity]
 
-                print(
+                self._print(
                     f"{color}[{severity.upper()}] "
                     f"{len(group)} finding(s){Style.RESET_ALL}"
                 )
 
                 for idx, f in enumerate(group, 1):
-                    print(f"\n  {idx}. {f.get('description', f['type'])}")
-                    print(f"     Type: {f['type']}")
-                    print(f"     Context: {f['context']}")
+                    self._print(f"\n  {idx}. {f.get('description', f['type'])}")
+                    self._print(f"     Type: {f['type']}")
+                    self._print(f"     Context: {f['context']}")
 
                     if "data_path" in f:
-                        print(f"     Data Path: {f['data_path']}")
+                        self._print(f"     Data Path: {f['data_path']}")
 
                     secret = f.get("secret", "")
                     if secret:
                         if len(secret) > 60:
                             secret = secret[:57] + "..."
-                        print(f"     Secret: {secret}")
+                        self._print(f"     Secret: {secret}")
 
                     snippet = f.get("snippet")
                     if snippet:
                         if len(snippet) > 100:
                             snippet = snippet[:97] + "..."
-                        print(f"     Snippet: ...{snippet}...")
+                        self._print(f"     Snippet: ...{snippet}...")
+
+                    locations = f.get("locations", [])
+                    if len(locations) > 1:
+                        self._print(f"     Also found at {len(locations) - 1} other location(s):")
+                        for location in locations[1:4]:
+                            where = location.get("data_path") or (
+                                f"{location['context']} @ {location['position']}"
+                            )
+                            self._print(f"       - {where}")
+                        if len(locations) > 4:
+                            self._print(f"       - ... {len(locations) - 4} more")
                     
                     # Add remediation guidance
                     remediation = self.get_remediation(f['type'])
-                    print(f"     {Fore.GREEN}Remediation:{Style.RESET_ALL} {remediation}")
+                    self._print(f"     {Fore.GREEN}Remediation:{Style.RESET_ALL} {remediation}")
 
-                print()
+                self._print()
 
-        print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
-        print(
+        self._print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
+        self._print(
             f"{Fore.YELLOW}[!] Found {len(findings)} potential "
             f"security issue(s){Style.RESET_ALL}"
         )
-        print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+        self._print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
 
     def print_authorization_report(self, results):
         """Phase 2: Authorization Inconsistency Report"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print("AUTHORIZATION ANALYSIS")
-        print(f"{'='*60}{Style.RESET_ALL}")
-        print(f"Target URL: {results['url']}")
-        print(f"Contexts tested: {', '.join(results['contexts'])}\n")
+        self._print(f"\n{Fore.CYAN}{'='*60}")
+        self._print("AUTHORIZATION ANALYSIS")
+        self._print(f"{'='*60}{Style.RESET_ALL}")
+        self._print(f"Target URL: {results['url']}")
+        classes = results.get("context_classes", [])
+        if len(results["contexts"]) > len(classes) and classes:
+            self._print(
+                f"Contexts tested: {len(results['contexts'])} in "
+                f"{len(classes)} distinct state(s)\n"
+            )
+            self._print_context_classes(classes)
+        else:
+            self._print(f"Contexts tested: {', '.join(results['contexts'])}\n")
 
         findings = results["authorization_findings"]
         if not findings:
-            print(f"{Fore.GREEN}[✓] No authorization inconsistencies detected{Style.RESET_ALL}")
+            self._print(f"{Fore.GREEN}[✓] No authorization inconsistencies detected{Style.RESET_ALL}")
         else:
-            print(f"{Fore.YELLOW}[!] Authorization Inconsistencies Found{Style.RESET_ALL}\n")
+            self._print(f"{Fore.YELLOW}[!] Authorization Inconsistencies Found{Style.RESET_ALL}\n")
 
             for idx, f in enumerate(findings, 1):
-                print(f"{idx}. Baseline: {f['baseline']} → Other: {f['other']}")
-                print("   Diff:")
-                for k, v in f["diff"].items():
-                    print(f"     - {k}: {v}")
+                self._print(f"{idx}. Baseline: {f['baseline']} → Other: {f['other']}")
+                equivalent = len(f.get("other_contexts", [])) - 1
+                if equivalent > 0:
+                    self._print(f"   Same state for {equivalent} other context(s)")
+                self._print_diff(f["diff"])
                 
                 # Add remediation guidance for authorization issues
                 remediation = self.get_remediation("authorization_inconsistency")
-                print(f"   {Fore.GREEN}Remediation:{Style.RESET_ALL} {remediation}\n")
+                self._print(f"   {Fore.GREEN}Remediation:{Style.RESET_ALL} {remediation}\n")
+
+        drift = results.get("drift_findings")
+        if drift:
+            self._print(f"{Fore.YELLOW}[!] SSR Data Changed Since Last Snapshot{Style.RESET_ALL}\n")
+            for idx, f in enumerate(drift, 1):
+                self._print(f"{idx}. Context: {f['context']}")
+                self._print_diff(f["diff"])
+                remediation = self.get_remediation("state_drift")
+                self._print(f"   {Fore.GREEN}Remediation:{Style.RESET_ALL} {remediation}\n")
+
+        self._print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+
+    def _print_context_classes(self, classes, shown=5):
+        """One line per class of contexts that received identical states"""
+        self._print(f"{'class':<7}{'contexts':>9}  members")
+        for idx, state_class in enumerate(classes):
+            members = state_class["contexts"]
+            listed = ", ".join(members[:shown])
+            if len(members) > shown:
+                listed += f", ... {len(members) - shown} more"
+            label = "base" if idx == 0 else str(idx)
+            self._print(f"{label:<7}{len(members):>9}  {listed}")
+        self._print()
+
+    def _print_diff(self, diff):
+        self._print("   Diff:")
+        for path, value in diff.get("added", {}).items():
+            self._print(f"     {Fore.RED}+ {path}: {value!r}{Style.RESET_ALL}")
+        for path, value in diff.get("removed", {}).items():
+            self._print(f"     - {path}: {value!r}")
+        for path, change in diff.get("changed", {}).items():
+            self._print(
+                f"     ~ {path}: {change['old_value']!r} → "
+                f"{change['new_value']!r}"
+            )
+
+    def print_batch_header(self):
+        self._print(f"\n{Fore.CYAN}{'='*60}")
+        self._print("BATCH SCAN RESULTS")
+        self._print(f"{'='*60}{Style.RESET_ALL}\n")
+
+    def print_batch_result(self, result, phase):
+        """One batch line, printed as soon as the URL is done"""
+        if phase == 2:
+            count = len(result["authorization_findings"])
+            status = f"{count} inconsistenc(ies)"
+            drift = len(result.get("drift_findings", []))
+            if drift:
+                count += drift
+                status += f", {drift} drift"
+        elif not result["ssr_detected"]:
+            count = 0
+            status = "no SSR detected"
+        else:
+            count = len(result["findings"])
+            status = f"{count} finding(s)"
+
+        color = Fore.YELLOW if count else Fore.GREEN
+        self._print(f"  {color}{status:<24}{Style.RESET_ALL} {result['url']}")
+
+    def print_batch_error(self, url, error):
+        self._print(f"  {Fore.RED}{'error':<24}{Style.RESET_ALL} {url}: {error}")
+
+    def print_batch_summary(self, summary):
+        self._print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}")
+        self._print(
+            f"Scanned: {summary['scanned']}  Failed: {summary['failed']}  "
+            f"SSR detected: {summary['ssr_detected']}"
+        )
+        crawl = summary.get("crawl")
+        if crawl:
+            self._print(
+                f"Discovered: {crawl['discovered']}  "
+                f"Collapsed into seen routes: {crawl['collapsed']}  "
+                f"Left in frontier: {crawl['queued']}"
+            )
+        checkpoint = summary.get("checkpoint")
+        if checkpoint and "resumed" in checkpoint:
+            self._print(
+                f"Shard: {checkpoint['shard']}  "
+                f"Resumed from checkpoint: {checkpoint['resumed']}"
+            )
+        elif checkpoint:
+            self._print(
+                f"Merged shards: {checkpoint['shards']} of {checkpoint['of']}  "
+                f"Never scanned: {checkpoint['pending']}"
+            )
+        offline = summary.get("offline")
+        if offline:
+            skipped = sum(
+                offline.get(key, 0)
+                for key in ("not_html", "not_ok", "no_body", "unmatched")
+            )
+            self._print(
+                f"HAR entries: {offline.get('entries', 0)}  "
+                f"Files: {offline.get('files', 0)}  "
+                f"Skipped: {skipped}  "
+                f"Duplicates: {offline.get('duplicates', 0)}  "
+                f"Incomplete routes: {offline.get('incomplete', 0)}"
+            )
+        for severity in ["critical", "high", "medium", "low"]:
+            count = summary["by_severity"].get(severity)
+            if count:
+                color = self.SEVERITY_COLORS.get(severity, Fore.WHITE)
+                self._print(
+                    f"{color}[{severity.upper()}] "
+                    f"{count} finding(s){Style.RESET_ALL}"
+                )
+        self._print(
+            f"{Fore.YELLOW}[!] Found {summary['findings']} potential "
+            f"security issue(s){Style.RESET_ALL}"
+        )
+        self._print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
+
+    def print_timings(self, snapshot, slowest=10):
+        """Stage timings, counters and the slowest routes"""
+        self._print(f"\n{Fore.CYAN}{'='*60}")
+        self._print("TIMINGS")
+        self._print(f"{'='*60}{Style.RESET_ALL}\n")
+
+        timers = snapshot["timers"]
+        stages = {n: t for n, t in timers.items() if not n.startswith("pattern.")}
+        patterns = {n: t for n, t in timers.items() if n.startswith("pattern.")}
+
+        self._print(f"{'stage':<28}{'calls':>8}{'total ms':>12}{'max ms':>10}")
+        for name, stats in stages.items():
+            self._print(
+                f"{name:<28}{stats['count']:>8}"
+                f"{stats['total_s'] * 1000:>12.1f}{stats['max_s'] * 1000:>10.1f}"
+            )
+
+        if patterns:
+            self._print(f"\n{'pattern':<28}{'matches':>8}{'total ms':>12}")
+            ranked = sorted(patterns.items(), key=lambda item: -item[1]["total_s"])
+            for name, stats in ranked:
+                pattern = name[len("pattern."):]
+                matches = snapshot["counters"].get(f"matches.{pattern}", 0)
+                self._print(
+                    f"{pattern:<28}{matches:>8}"
+                    f"{stats['total_s'] * 1000:>12.1f}"
+                )
+
+        counters = {
+            n: c for n, c in snapshot["counters"].items()
+            if not n.startswith("matches.")
+        }
+        if counters:
+            self._print()
+            for name, amount in counters.items():
+                self._print(f"{name:<28}{amount:>20,}")
+
+        if snapshot["routes"]:
+            self._print(f"\n{Fore.WHITE}Slowest routes:{Style.RESET_ALL}")
+            for route in snapshot["routes"][:slowest]:
+                self._print(f"  {route['seconds'] * 1000:>10.1f} ms  {route['url']}")
 
-        print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
\ No newline at end of file
+        self._print(f"\n{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
@@ -0,0 +1,386 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, TextIO
+from ssrleakguard import __version__
+from ssrleakguard.detectors.finding import json_default
+from ssrleakguard.utils.reporter import Reporter
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+# Output files are written through a buffer of this size
+BUFFER_SIZE = 64 * 1024
+
+
+class ReportSink:
+    """
+    Destination for scan output
+
+    Results are handed to every sink as soon as each URL is done, so a sink
+    that writes them out immediately keeps memory flat however many URLs
+    or findings a scan produces.
+    """
+
+    def start(self, phase: int, batch: bool):
+        """Called once before the first result"""
+
+    def write_result(self, result: Dict):
+        """Called with the Phase 1 or Phase 2 result of one URL"""
+
+    def write_error(self, url: str, error: str):
+        """Called for a URL that could not be scanned"""
+
+    def finish(self, summary: Optional[Dict] = None):
+        """Called once after the last result; summary is set for batches"""
+
+    def close(self):
+        """Release files; called even if the scan failed"""
+
+
+class SinkGroup(ReportSink):
+    """Fans every call out to several sinks"""
+
+    def __init__(self, sinks: List[ReportSink]):
+        self.sinks = sinks
+
+    def start(self, phase: int, batch: bool):
+        for sink in self.sinks:
+            sink.start(phase, batch)
+
+    def write_result(self, result: Dict):
+        for sink in self.sinks:
+            sink.write_result(result)
+
+    def write_error(self, url: str, error: str):
+        for sink in self.sinks:
+            sink.write_error(url, error)
+
+    def finish(self, summary: Optional[Dict] = None):
+        for sink in self.sinks:
+            sink.finish(summary)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class ConsoleSink(ReportSink):
+    """Colorized human-readable report, rendered by Reporter"""
+
+    def __init__(self, reporter: Optional[Reporter] = None):
+        self.reporter = reporter or Reporter()
+        self.phase = 1
+        self.batch = False
+
+    def start(self, phase: int, batch: bool):
+        self.phase = phase
+        self.batch = batch
+        if batch:
+            self.reporter.print_batch_header()
+
+    def write_result(self, result: Dict):
+        if self.batch:
+            self.reporter.print_batch_result(result, self.phase)
+        elif self.phase == 2:
+            self.reporter.print_authorization_report(result)
+        else:
+            self.reporter.print_console_report(result)
+
+    def write_error(self, url: str, error: str):
+        self.reporter.print_batch_error(url, error)
+
+    def finish(self, summary: Optional[Dict] = None):
+        if summary is not None:
+            self.reporter.print_batch_summary(summary)
+
+
+class _StripAnsi:
+    """Text stream wrapper dropping color codes"""
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+
+    def write(self, data: str) -> int:
+        return self.stream.write(_ANSI_RE.sub("", data))
+
+    def flush(self):
+        self.stream.flush()
+
+
+class TextSink(ConsoleSink):
+    """The console report as plain text in a file, without color codes"""
+
+    def __init__(self, path: str, command: str = ""):
+        self.path = path
+        self.command = command
+        self._file = open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE)
+        self._stream = _StripAnsi(self._file)
+        # The reporter writes to the file itself rather than through a
+        # redirected sys.stdout, which other threads print to as well
+        super().__init__(Reporter(stream=self._stream))
+
+    def _print(self, text: str = ""):
+        print(text, file=self._stream)
+
+    def start(self, phase: int, batch: bool):
+        self._print("=" * 70)
+        self._print("SSRLeakGuard Security Scan Report")
+        self._print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if self.command:
+            self._print(f"Command: {self.command}")
+        self._print("=" * 70)
+        self._print()
+        super().start(phase, batch)
+
+    def finish(self, summary: Optional[Dict] = None):
+        super().finish(summary)
+        self._print()
+        self._print("=" * 70)
+
+    def close(self):
+        self._file.close()
+
+
+class JSONLSink(ReportSink):
+    """
+    One JSON object per line
+
+    Each line has a "record" field: "page" for a scanned URL, "finding"
+    for each Phase 1 finding, "authorization" for each Phase 2
+    inconsistency, "drift" for each state change since the previous
+    snapshot, "error" for a failed URL and a final "summary" in batch
+    mode.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE)
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record, default=json_default))
+        self._file.write("\n")
+
+    @staticmethod
+    def records(result: Dict) -> Iterator[Dict]:
+        """The page record of a result, followed by its finding records"""
+        url = result["url"]
+        page = {
+            key: value
+            for key, value in result.items()
+            if key not in ("findings", "authorization_findings", "drift_findings")
+        }
+        page["record"] = "page"
+        yield page
+
+        for finding in result.get("findings", []):
+            yield dict(finding, record="finding", url=url)
+        for finding in result.get("authorization_findings", []):
+            yield dict(finding, record="authorization", url=url)
+        for finding in result.get("drift_findings", []):
+            yield dict(finding, record="drift", url=url)
+
+    def write_result(self, result: Dict):
+        for record in self.records(result):
+            self._write(record)
+
+    def write_error(self, url: str, error: str):
+        self._write({"record": "error", "url": url, "error": error})
+
+    def finish(self, summary: Optional[Dict] = None):
+        if summary is not None:
+            self._write(dict(summary, record="summary"))
+
+    def close(self):
+        self._file.close()
+
+
+class SARIFSink(ReportSink):
+    """
+    SARIF 2.1.0 log for code scanning and CI tools
+
+    Results are streamed into the "results" array as they arrive; the tool
+    section with the rules that were actually reported is written after it
+    once the scan is finished.
+    """
+
+    SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+    LEVELS = {
+        "critical": "error",
+        "high": "error",
+        "medium": "warning",
+        "low": "note",
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w", encoding="utf-8", buffering=BUFFER_SIZE)
+        self._rules: Dict[str, Dict] = {}
+        self._count = 0
+        self._finished = False
+        self._file.write(
+            '{"version":"2.1.0","$schema":"%s","runs":[{"results":['
+            % self.SCHEMA
+        )
+
+    def _rule(self, rule_id: str, description: str, severity: str):
+        if rule_id not in self._rules:
+            self._rules[rule_id] = {
+                "id": rule_id,
+                "shortDescription": {"text": description},
+                "defaultConfiguration": {
+                    "level": self.LEVELS.get(severity, "warning")
+                },
+                "properties": {"severity": severity},
+            }
+
+    def _write(self, result: Dict):
+        if self._count:
+            self._file.write(",")
+        self._file.write(json.dumps(result, default=json_default))
+        self._count += 1
+
+    @staticmethod
+    def _fingerprint(value: str) -> str:
+        return hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()
+
+    @staticmethod
+    def _location(url: str, location: Dict) -> Dict:
+        physical: Dict = {"artifactLocation": {"uri": url}}
+        if "data_path" in location:
+            return {
+                "physicalLocation": physical,
+                "logicalLocations": [
+                    {"fullyQualifiedName": location["data_path"]}
+                ],
+            }
+        physical["region"] = {"charOffset": location["position"]}
+        return {"physicalLocation": physical}
+
+    def write_result(self, result: Dict):
+        url = result["url"]
+
+        for finding in result.get("findings", []):
+            severity = finding.get("severity", "medium")
+            self._rule(finding["type"], finding["description"], severity)
+
+            locations = [
+                self._location(url, location)
+                for location in finding.get("locations") or [finding]
+            ]
+            self._write(
+                {
+                    "ruleId": finding["type"],
+                    "level": self.LEVELS.get(severity, "warning"),
+                    "message": {
+                        "text": f"{finding['description']} in {finding['context']}"
+                    },
+                    "locations": locations,
+                    "partialFingerprints": {
+                        "secretHash/v1": self._fingerprint(finding["secret"])
+                    },
+                    "properties": {"severity": severity},
+                }
+            )
+
+        for finding in result.get("authorization_findings", []):
+            self._rule(
+                "authorization_inconsistency",
+                "SSR data differs between authorization contexts",
+                "high",
+            )
+            diff = finding["diff"]
+            paths = sorted(
+                path for section in diff.values() for path in section
+            )
+            self._write(
+                {
+                    "ruleId": "authorization_inconsistency",
+                    "level": "error",
+                    "message": {
+                        "text": f"{finding['other']} receives different SSR "
+                        f"data than {finding['baseline']} at {len(paths)} "
+                        f"path(s)"
+                    },
+                    "locations": [
+                        {
+                            "physicalLocation": {
+                                "artifactLocation": {"uri": url}
+                            },
+                            "logicalLocations": [
+                                {"fullyQualifiedName": path}
+                                for path in paths
+                            ],
+                        }
+                    ],
+                    "partialFingerprints": {
+                        "diffPaths/v1": self._fingerprint("\n".join(paths))
+                    },
+                    "properties": {
+                        "baseline": finding["baseline"],
+                        "other": finding["other"],
+                        "otherContexts": finding.get(
+                            "other_contexts", [finding["other"]]
+                        ),
+                    },
+                }
+            )
+
+        for finding in result.get("drift_findings", []):
+            self._rule(
+                "state_drift",
+                "SSR data changed since the previous snapshot",
+                "medium",
+            )
+            diff = finding["diff"]
+            paths = sorted(
+                path for section in diff.values() for path in section
+            )
+            self._write(
+                {
+                    "ruleId": "state_drift",
+                    "level": "warning",
+                    "message": {
+                        "text": f"SSR data for {finding['context']} changed "
+                        f"at {len(paths)} path(s) since the previous snapshot"
+                    },
+                    "locations": [
+                        {
+                            "physicalLocation": {
+                                "artifactLocation": {"uri": url}
+                            },
+                            "logicalLocations": [
+                                {"fullyQualifiedName": path}
+                                for path in paths
+                            ],
+                        }
+                    ],
+                    "partialFingerprints": {
+                        "diffPaths/v1": self._fingerprint(
+                            finding["context"] + "\n" + "\n".join(paths)
+                        )
+                    },
+                    "properties": {"context": finding["context"]},
+                }
+            )
+
+    def finish(self, summary: Optional[Dict] = None):
+        if self._finished:
+            return
+        self._finished = True
+        tool = {
+            "driver": {
+                "name": "SSRLeakGuard",
+                "version": __version__,
+                "rules": list(self._rules.values()),
+            }
+        }
+        self._file.write("],\"tool\":")
+        self._file.write(json.dumps(tool))
+        self._file.write("}]}")
+
+    def close(self):
+        # A failed scan still leaves a well-formed log
+        self.finish()
+        self._file.close()
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def next_page(page_props, page="/"):
+    """HTML of a Next.js Pages Router page with the given page props"""
+    data = {
+        "props": {"pageProps": page_props},
+        "page": page,
+        "query": {},
+        "buildId": "test-build",
+    }
+    return (
+        '<html><head><script src="/_next/static/chunks/main.js" defer>'
+        '</script></head><body><div id="__next"><p>Rendered</p></div>'
+        '<script id="__NEXT_DATA__" type="application/json">'
+        + json.dumps(data)
+        + "</script></body></html>"
+    )
+
+
+class StandInSite:
+    """
+    Local HTTP server standing in for a scanned site
+
+    Serves the pages registered in ``pages`` (path -> HTML, or bytes
+    served as they are) and records the most requests it was answering
+    at once. A page with an ``etags`` entry is served with that ETag and
+    answered 304 when requested with it; ``not_modified`` records those.
+    """
+
+    def __init__(self, delay=0.0):
+        self.pages = {}
+        self.delay = delay
+        self.requests = []
+        self.etags = {}
+        self.not_modified = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site._lock:
+                    site.requests.append(self.path)
+                    site.in_flight += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                try:
+                    time.sleep(site.delay)
+                    body = site.pages.get(self.path)
+                    if body is None:
+                        self.send_error(404)
+                        return
+                    etag = site.etags.get(self.path)
+                    if etag is not None and self.headers.get("If-None-Match") == etag:
+                        site.not_modified.append(self.path)
+                        self.send_response(304)
+                        self.end_headers()
+                        return
+                    data = body if isinstance(body, bytes) else body.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(data)))
+                    if etag is not None:
+                        self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with site._lock:
+                        site.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def site():
+    stand_in = StandInSite()
+    yield stand_in
+    stand_in.close()
@@ -0,0 +1,84 @@
+import json
+
+from ssrleakguard.core.batch import BatchScanner
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.http_client import HTTPClient
+from ssrleakguard.detectors.finding import Finding, json_default
+
+from conftest import next_page
+
+
+def _contexts(count):
+    return [
+        AuthContext(name=f"user{i}", cookies={"session": str(i)})
+        for i in range(count)
+    ]
+
+
+def test_per_host_limit_covers_each_request(site):
+    site.delay = 0.05
+    for i in range(4):
+        site.pages[f"/p{i}"] = next_page({"user": {"email": "a@example.com"}})
+    client = HTTPClient(pool_size=16)
+    batch = BatchScanner(client, concurrency=4, per_host=2)
+    try:
+        results = batch.scan(
+            [site.url(f"/p{i}") for i in range(4)], contexts=_contexts(3)
+        )
+    finally:
+        batch.close()
+        client.close()
+
+    assert results["summary"]["failed"] == 0
+    assert len(site.requests) == 12
+    # Contexts of one route are fetched in parallel, so a limit held per
+    # route would let up to 2 routes x 3 contexts through at once
+    assert site.max_in_flight == 2
+
+
+def test_context_pool_is_reused_across_routes(site):
+    for i in range(3):
+        site.pages[f"/p{i}"] = next_page({"n": i})
+    client = HTTPClient()
+    batch = BatchScanner(client, concurrency=1)
+    try:
+        batch.scan([site.url("/p0")], contexts=_contexts(2))
+        pool = batch.analyzer._context_pool
+        batch.scan([site.url("/p1"), site.url("/p2")], contexts=_contexts(2))
+        assert pool is not None and batch.analyzer._context_pool is pool
+    finally:
+        batch.close()
+        client.close()
+    assert batch.analyzer._context_pool is None
+
+
+def _plain(value):
+    return json.loads(json.dumps(value, default=json_default))
+
+
+def test_process_pool_results_match_in_process_results(site):
+    for i in range(3):
+        site.pages[f"/p{i}"] = next_page(
+            {"n": i, "token": "ghp_" + str(i) * 36, "user": {"email": "a@example.com"}}
+        )
+    urls = [site.url(f"/p{i}") for i in range(3)]
+    scans = {}
+    for processes in (0, 1):
+        client = HTTPClient()
+        batch = BatchScanner(client, concurrency=2, processes=processes)
+        try:
+            scans[processes] = (
+                batch.scan(urls)["results"],
+                batch.scan(urls, contexts=_contexts(2))["results"],
+            )
+        finally:
+            batch.close()
+            client.close()
+
+    phase1 = scans[1][0]
+    findings = [f for result in phase1 for f in result["findings"]]
+    assert {f["type"] for f in findings} >= {"github_token", "email_address"}
+    # Findings cross the pool as plain dicts
+    assert all(type(f) is dict for f in findings)
+    assert all(isinstance(f, Finding) for r in scans[0][0] for f in r["findings"])
+    assert _plain(scans[1]) == _plain(scans[0])
@@ -0,0 +1,96 @@
+import os
+
+from ssrleakguard.core import cache as cache_module
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.cache import ResultCache, content_hash
+from ssrleakguard.core.http_client import HTTPClient
+from ssrleakguard.utils.instrumentation import Instrumentation
+
+from conftest import next_page
+
+TOKEN = "ghp_" + "a" * 36
+
+
+def _scan(cache, *urls, cookies=None):
+    """Phase 1 results of urls and the counters of the scan"""
+    client = HTTPClient(cookies=cookies)
+    instrumentation = Instrumentation()
+    analyzer = SSRAnalyzer(client, cache=cache, instrumentation=instrumentation)
+    try:
+        results = [analyzer.analyze(url) for url in urls]
+    finally:
+        analyzer.close()
+        client.close()
+    return results, instrumentation.snapshot()["counters"]
+
+
+def test_not_modified_pages_reuse_cached_results(site, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    site.pages["/a"] = next_page({"token": TOKEN})
+    site.etags["/a"] = '"a1"'
+
+    first, counters = _scan(cache, site.url("/a"))
+    assert "cache_hits" not in counters
+    second, counters = _scan(cache, site.url("/a"))
+    assert counters["cache_hits"] == 1
+    assert site.not_modified == ["/a"]
+    assert [f["secret"] for f in second[0]["findings"]] == [TOKEN]
+    assert second == first
+
+
+def test_cached_results_are_kept_apart_per_session(site, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    site.pages["/a"] = next_page({})
+    site.etags["/a"] = '"a1"'
+
+    _scan(cache, site.url("/a"))
+    # Another session's page may differ under the same ETag
+    _scan(cache, site.url("/a"), cookies={"session": "1"})
+    assert site.not_modified == []
+    _scan(cache, site.url("/a"), cookies={"session": "1"})
+    assert site.not_modified == ["/a"]
+
+
+def test_identical_bodies_share_cached_results(site, tmp_path):
+    cache = ResultCache(str(tmp_path))
+    site.pages["/a"] = site.pages["/b"] = next_page({"token": TOKEN})
+
+    results, counters = _scan(cache, site.url("/a"), site.url("/b"))
+    assert counters["cache_hits"] == 1
+    assert [r["url"] for r in results] == [site.url("/a"), site.url("/b")]
+    assert results[0]["findings"] == results[1]["findings"]
+
+
+def test_format_version_bump_invalidates_the_cache(tmp_path, monkeypatch):
+    body_hash = content_hash(b"page")
+    ResultCache(str(tmp_path)).store("https://example.com/", "", "results", body_hash, 1)
+    assert ResultCache(str(tmp_path)).lookup("https://example.com/", "", "results")
+
+    monkeypatch.setattr(cache_module, "FORMAT_VERSION", cache_module.FORMAT_VERSION + 1)
+    cache = ResultCache(str(tmp_path))
+    assert cache.lookup("https://example.com/", "", "results") is None
+    assert cache.load(body_hash, "results") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    value = "x" * 10000
+    cache = ResultCache(str(tmp_path))
+    for name in ("a", "b"):
+        cache.store(name, "", "results", content_hash(name.encode()), value)
+    entry_size = cache._size / 2
+    # b was used before a
+    for age, name in ((2000, "a"), (1000, "b")):
+        for path in (
+            cache._object_path(content_hash(name.encode()), "results"),
+            cache._index_dir / f"{cache._index_key(name, '', 'results')}.json",
+        ):
+            os.utime(path, (age, age))
+
+    cache = ResultCache(str(tmp_path), max_bytes=int(entry_size * 2.5))
+    assert cache.lookup("a", "", "results") is not None
+    cache.store("c", "", "results", content_hash(b"c"), value)
+
+    assert cache.lookup("b", "", "results") is None
+    assert cache.lookup("a", "", "results") is not None
+    assert cache.lookup("c", "", "results") is not None
+    assert cache._size <= cache.max_bytes
@@ -0,0 +1,139 @@
+import pytest
+
+from ssrleakguard.core.checkpoints import (
+    DONE,
+    FAILED,
+    CheckpointStore,
+    job_key,
+    job_settings,
+    merge_checkpoints,
+    parse_shard,
+    shard_of,
+    shard_urls,
+)
+from ssrleakguard.core.context import AuthContext
+
+URLS = [f"https://example.com/page/{i}" for i in range(40)]
+JOB = job_settings([], {}, data_endpoint=False)
+
+
+def _result(url):
+    return {"url": url, "ssr_detected": True, "findings": []}
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "1", "a/b", "1/0"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_shards_split_the_list_and_survive_edits():
+    shards = [shard_urls(URLS, index, 3) for index in (1, 2, 3)]
+    routes = sorted(route for shard in shards for route in shard)
+    assert routes == list(enumerate(URLS))
+
+    # A route keeps its shard when other routes are added or removed
+    edited = URLS[5:] + ["https://example.com/new"]
+    for index in (1, 2, 3):
+        kept = {url for _, url in shard_urls(edited, index, 3)}
+        assert kept & set(URLS) == {
+            url for _, url in shards[index - 1] if url in edited
+        }
+        assert all(shard_of(url, 3) == index for url in kept)
+
+
+def test_job_key_ignores_credential_values():
+    admin = AuthContext("admin", cookies={"session": "a"}, headers={"X-Token": "1"})
+    refreshed = AuthContext("admin", cookies={"session": "b"}, headers={"x-token": "2"})
+    assert job_key(job_settings([admin], {})) == job_key(job_settings([refreshed], {}))
+    settings = str(job_settings([admin], {"sid": "phase1-secret"}))
+    assert "session" in settings and "sid" in settings
+    assert "phase1-secret" not in settings and "X-Token': '1" not in settings
+
+    renamed = AuthContext("owner", cookies={"session": "a"})
+    assert job_key(job_settings([admin], {})) != job_key(job_settings([renamed], {}))
+    assert job_key(JOB) != job_key(job_settings([], {}, data_endpoint=True))
+
+
+def test_resume_skips_done_routes_and_retries_failed(tmp_path):
+    path = str(tmp_path / "scan.db")
+    routes = list(enumerate(URLS[:5]))
+    store = CheckpointStore(path)
+    assert store.begin(routes, JOB, 1) == URLS[:5]
+    store.record_result(URLS[0], _result(URLS[0]))
+    store.record_error(URLS[1], "timeout")
+    store.record_result(URLS[3], _result(URLS[3]))
+    store.close()
+
+    store = CheckpointStore(path)
+    assert store.begin(routes, JOB, 1) == [URLS[1], URLS[2], URLS[4]]
+    assert [url for _, url, _, _ in store.records(DONE)] == [URLS[0], URLS[3]]
+    assert store.progress() == {DONE: 2, FAILED: 1, "pending": 2}
+
+    with pytest.raises(ValueError):
+        store.begin(routes, job_settings([], {}, data_endpoint=True), 1)
+    with pytest.raises(ValueError):
+        store.begin(routes, JOB, 1, shard=(1, 2))
+    store.close()
+
+
+def _shard_store(tmp_path, name, routes, done=(), failed=(), shard=(1, 1)):
+    store = CheckpointStore(str(tmp_path / name))
+    store.begin(routes, JOB, 1, shard)
+    for url in done:
+        store.record_result(url, _result(url))
+    for url in failed:
+        store.record_error(url, "boom")
+    store.close()
+    return str(tmp_path / name)
+
+
+def test_merge_reports_shards_in_list_order(tmp_path):
+    paths = []
+    for index in (1, 2):
+        routes = shard_urls(URLS, index, 2)
+        urls = [url for _, url in routes]
+        paths.append(
+            _shard_store(
+                tmp_path, f"s{index}.db", routes, done=urls[1:], failed=urls[:1],
+                shard=(index, 2),
+            )
+        )
+    info, outcomes = merge_checkpoints(paths)
+    merged = list(outcomes)
+    assert [url for url, _, _ in merged] == URLS
+    assert info == {"phase": 1, "shards": 2, "of": 2, "pending": 0}
+    assert sum(status == FAILED for _, status, _ in merged) == 2
+
+
+def test_merge_dedupes_by_url(tmp_path):
+    # The rerun saw an edited list, so the same URLs sit at other positions
+    first = _shard_store(
+        tmp_path, "first.db", list(enumerate(URLS[:4])),
+        done=[URLS[0]], failed=[URLS[1], URLS[2]],
+    )
+    rerun = _shard_store(
+        tmp_path, "rerun.db", list(enumerate(["https://example.com/x"] + URLS[:4])),
+        done=[URLS[1]], failed=[URLS[0]],
+    )
+    info, outcomes = merge_checkpoints([first, rerun])
+    merged = list(outcomes)
+
+    assert sorted(url for url, _, _ in merged) == sorted(URLS[:3])
+    statuses = {url: status for url, status, _ in merged}
+    assert statuses == {URLS[0]: DONE, URLS[1]: DONE, URLS[2]: FAILED}
+    # URLS[3] and the added route were never scanned
+    assert info["pending"] == 2
+
+
+def test_merge_needs_stores_of_one_job(tmp_path):
+    with pytest.raises(ValueError):
+        merge_checkpoints([])
+
+    one = _shard_store(tmp_path, "one.db", list(enumerate(URLS[:2])))
+    other = CheckpointStore(str(tmp_path / "other.db"))
+    other.begin(list(enumerate(URLS[:2])), job_settings([], {}, data_endpoint=True), 1)
+    other.close()
+    with pytest.raises(ValueError):
+        merge_checkpoints([one, str(tmp_path / "other.db")])
@@ -0,0 +1,36 @@
+import pytest
+from click.testing import CliRunner
+
+from ssrleakguard.cli import main
+
+URL = "https://example.com/"
+
+
+@pytest.mark.parametrize(
+    "args, message",
+    [
+        ([URL, "--crawl", "--watch", "--snapshots", "s.db"], "--watch"),
+        ([URL, "--crawl", "--cache-dir", "cache"], "--cache-dir"),
+        ([URL, "--crawl", "--processes", "2"], "--processes"),
+        ([URL, "--stream", "--context", "admin:session=1"], "--stream"),
+        (["--urls-file", "-", "--stream"], "--stream"),
+        ([URL, "--max-bytes", "1000", "--crawl"], "--max-bytes"),
+        ([URL, "--stream", "--data-endpoint"], "--data-endpoint"),
+        ([URL, "--stop-on-critical", "--cache-dir", "cache"], "--cache-dir"),
+        ([URL, "--processes", "2"], "--processes"),
+        ([URL, "--context", "admin:session=1", "--processes", "2"], "--processes"),
+        (["--har", "c.har", "--cache-dir", "cache"], "--cache-dir"),
+        (["--html-dir", ".", "--data-endpoint"], "--data-endpoint"),
+        (["--har", "c.har", "--cookie", "session=1"], "--cookie"),
+        ([URL, "--concurrency", "8"], "--concurrency"),
+        ([URL, "--per-host", "2"], "--per-host"),
+        ([URL, "--crawl", "--per-host", "2"], "--per-host"),
+        (["--har", "c.har", "--per-host", "2"], "--per-host"),
+    ],
+)
+def test_incompatible_options_are_rejected(tmp_path, monkeypatch, args, message):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "c.har").write_text("{}")
+    result = CliRunner().invoke(main, args + ["--no-report"])
+    assert result.exit_code == 2, result.output
+    assert message in result.output
@@ -0,0 +1,76 @@
+import gzip
+
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.crawler import MAX_SITEMAP_BYTES, Crawler
+from ssrleakguard.core.http_client import HTTPClient
+
+from conftest import StandInSite, next_page
+
+
+def _linking(path, *links):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return next_page({"path": path}, page=path).replace(
+        "<p>Rendered</p>", anchors
+    )
+
+
+def test_phase2_crawl_fetches_each_page_once_per_context(site):
+    site.pages["/"] = _linking("/", "/a")
+    site.pages["/a"] = _linking("/a", "/")
+    contexts = [
+        AuthContext(name="guest"),
+        AuthContext(name="admin", cookies={"session": "1"}),
+    ]
+    client = HTTPClient()
+    analyzer = SSRAnalyzer(client)
+    try:
+        results = Crawler(client, analyzer, sitemaps=False).crawl(
+            [site.url("/")], contexts=contexts
+        )
+    finally:
+        analyzer.close()
+        client.close()
+
+    assert sorted(results["urls"]) == [site.url("/"), site.url("/a")]
+    assert [r["contexts"] for r in results["results"]] == [["guest", "admin"]] * 2
+    pages = [path for path in site.requests if not path.startswith("/_next/")]
+    assert sorted(pages) == ["/", "/", "/a", "/a"]
+
+
+def _crawl(site, client=None):
+    client = client or HTTPClient()
+    analyzer = SSRAnalyzer(client)
+    try:
+        return Crawler(client, analyzer, max_depth=1).crawl([site.url("/")])
+    finally:
+        analyzer.close()
+        client.close()
+
+
+def test_broken_sitemaps_do_not_stop_the_crawl(site):
+    site.pages["/"] = _linking("/")
+    site.pages["/robots.txt"] = f"Sitemap: {site.url('/big.xml.gz')}\n"
+    site.pages["/sitemap.xml"] = b"\x1f\x8b\x08\x00corrupt"
+    # Expands far beyond what a sitemap may hold
+    site.pages["/big.xml.gz"] = gzip.compress(b" " * (MAX_SITEMAP_BYTES + 1))
+
+    results = _crawl(site)
+    assert results["urls"] == [site.url("/")]
+    assert results["summary"]["failed"] == 0
+
+
+def test_sitemaps_on_other_sites_are_not_fetched(site):
+    other = StandInSite()
+    try:
+        other.pages["/sitemap.xml"] = "<urlset><loc>/x</loc></urlset>"
+        site.pages["/"] = _linking("/")
+        site.pages["/robots.txt"] = f"Sitemap: {other.url('/sitemap.xml')}\n"
+        site.pages["/sitemap.xml"] = (
+            f"<sitemapindex><loc>{other.url('/sitemap.xml')}</loc></sitemapindex>"
+        )
+        _crawl(site, HTTPClient(cookies={"session": "secret"}))
+        assert other.requests == []
+        assert "/sitemap.xml" in site.requests
+    finally:
+        other.close()
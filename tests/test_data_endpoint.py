@@ -0,0 +1,50 @@
+import json
+
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.http_client import HTTPClient
+
+from conftest import next_page
+
+CONTEXTS = [
+    AuthContext(name="guest"),
+    AuthContext(name="admin", cookies={"session": "1"}),
+]
+
+
+def _deploy(site, build_id, routes):
+    site.pages.clear()
+    for route in routes:
+        page_props = {"route": route}
+        site.pages[route] = next_page(page_props, page=route).replace(
+            "test-build", build_id
+        )
+        site.pages[f"/_next/data/{build_id}{route}.json"] = json.dumps(
+            {"pageProps": page_props}
+        )
+
+
+def test_phase2_looks_up_the_build_id_again_after_a_redeploy(site):
+    routes = ["/a", "/b", "/c"]
+    client = HTTPClient()
+    analyzer = SSRAnalyzer(client, data_endpoint=True)
+    try:
+        _deploy(site, "v1", routes)
+        analyzer.analyze_with_contexts(site.url("/a"), CONTEXTS)
+        assert site.requests == ["/a", "/_next/data/v1/a.json", "/_next/data/v1/a.json"]
+
+        _deploy(site, "v2", routes)
+        del site.requests[:]
+        # v1 is gone: this route falls back to the HTML
+        analyzer.analyze_with_contexts(site.url("/b"), CONTEXTS)
+        assert site.requests.count("/b") == 2
+
+        del site.requests[:]
+        analyzer.analyze_with_contexts(site.url("/c"), CONTEXTS)
+    finally:
+        analyzer.close()
+        client.close()
+
+    # Ignores a miss for /b that may still have been in flight
+    requests = [path for path in site.requests if path != "/_next/data/v1/b.json"]
+    assert requests == ["/c", "/_next/data/v2/c.json", "/_next/data/v2/c.json"]
@@ -0,0 +1,171 @@
+import copy
+import random
+
+import pytest
+
+from ssrleakguard.core.differ import (
+    StateClasses,
+    diff_ssr_states,
+    state_fingerprint,
+)
+
+deepdiff = pytest.importorskip("deepdiff")
+
+
+# Without the threshold DeepDiff reports a dict whose keys mostly changed
+# as one replaced value instead of key by key
+def DeepDiff(old, new, **options):
+    return deepdiff.DeepDiff(old, new, threshold_to_diff_deeper=0, **options)
+
+
+_SCALARS = (0, 1, 1.0, 2.5, True, False, None, "", "a", "b", "1", "admin")
+_LIST_SCALARS = (2.5, None, "", "a", "b", "1", "admin")
+
+
+def _state(rng, depth=0):
+    """Random JSON state without empty containers"""
+    if depth > 3 or rng.random() < 0.35:
+        return rng.choice(_SCALARS)
+    if rng.random() < 0.4:
+        return [_state(rng, depth + 1) for _ in range(rng.randint(1, 4))]
+    return {
+        rng.choice("abcdef") + str(i): _state(rng, depth + 1)
+        for i in range(rng.randint(1, 4))
+    }
+
+
+def _containers(value):
+    if isinstance(value, dict):
+        yield value
+        for child in value.values():
+            yield from _containers(child)
+    elif isinstance(value, list):
+        yield value
+        for child in value:
+            yield from _containers(child)
+
+
+def _mutate(rng, state):
+    """Change scalars, add scalar keys or drop scalar keys, in place"""
+    containers = list(_containers(state))
+    for _ in range(rng.randint(1, 3)):
+        container = rng.choice(containers)
+        if isinstance(container, list):
+            slots = [i for i, v in enumerate(container) if not isinstance(v, (dict, list))]
+            if slots:
+                # DeepDiff compares list elements with ==, so 1, 1.0 and
+                # True are the same element there; the differ tells them apart
+                container[rng.choice(slots)] = rng.choice(_LIST_SCALARS)
+            continue
+        scalar_keys = [k for k, v in container.items() if not isinstance(v, (dict, list))]
+        roll = rng.random()
+        if roll < 0.3:
+            container["new" + str(rng.randint(0, 9))] = rng.choice(_SCALARS)
+        elif roll < 0.5 and len(container) > 1 and scalar_keys:
+            del container[rng.choice(scalar_keys)]
+        elif scalar_keys:
+            container[rng.choice(scalar_keys)] = rng.choice(_SCALARS)
+    return state
+
+
+def _shuffled(rng, value):
+    if isinstance(value, dict):
+        items = list(value.items())
+        rng.shuffle(items)
+        return {k: _shuffled(rng, v) for k, v in items}
+    if isinstance(value, list):
+        items = [_shuffled(rng, v) for v in value]
+        rng.shuffle(items)
+        return items
+    return value
+
+
+def _paths(diff):
+    paths = set()
+    for section in diff.values():
+        paths.update(section)
+    return paths
+
+
+def _pairs(seed, count=400):
+    rng = random.Random(seed)
+    for _ in range(count):
+        baseline = {"props": _state(rng)}
+        other = copy.deepcopy(baseline)
+        if rng.random() < 0.8:
+            _mutate(rng, other)
+        yield rng, baseline, other
+
+
+def test_ordered_diff_reports_the_paths_deepdiff_reports():
+    for _, baseline, other in _pairs(1):
+        findings = diff_ssr_states(
+            {"guest": baseline, "admin": other}, ignore_order=False
+        )
+        expected = DeepDiff(baseline, other, ignore_order=False)
+        if not expected:
+            assert findings == []
+            continue
+        assert len(findings) == 1
+        assert _paths(findings[0]["diff"]) == set(expected.affected_paths)
+
+
+def test_ordered_diff_values_match_deepdiff():
+    for _, baseline, other in _pairs(2):
+        findings = diff_ssr_states(
+            {"guest": baseline, "admin": other}, ignore_order=False
+        )
+        expected = DeepDiff(baseline, other, ignore_order=False, verbose_level=2)
+        diff = findings[0]["diff"] if findings else {}
+        changed = dict(expected.get("values_changed", {}))
+        changed.update(expected.get("type_changes", {}))
+        assert diff.get("changed", {}) == {
+            path: {"old_value": change["old_value"], "new_value": change["new_value"]}
+            for path, change in changed.items()
+        }
+        assert diff.get("added", {}) == dict(expected.get("dictionary_item_added", {}))
+        assert diff.get("removed", {}) == dict(expected.get("dictionary_item_removed", {}))
+
+
+def test_unordered_diff_agrees_with_deepdiff_on_equality():
+    for rng, baseline, other in _pairs(3):
+        other = _shuffled(rng, other)
+        findings = diff_ssr_states({"guest": baseline, "admin": other})
+        expected = DeepDiff(
+            baseline, other, ignore_order=True, report_repetition=True
+        )
+        assert bool(findings) == bool(expected), (baseline, other)
+        same = state_fingerprint(baseline) == state_fingerprint(other)
+        assert same == (not expected)
+
+
+def test_state_classes_match_deepdiff_equality():
+    rng = random.Random(4)
+    for _ in range(100):
+        base = {"props": _state(rng)}
+        states = {}
+        for i in range(rng.randint(2, 6)):
+            state = copy.deepcopy(base)
+            if rng.random() < 0.5:
+                _mutate(random.Random(rng.randint(0, 3)), state)
+            states[f"ctx{i}"] = _shuffled(rng, state)
+
+        grouping = StateClasses()
+        for name, state in states.items():
+            grouping.add(name, state)
+
+        names = list(states)
+        for members in grouping.classes:
+            for name in members[1:]:
+                assert not DeepDiff(
+                    states[members[0]], states[name],
+                    ignore_order=True, report_repetition=True,
+                )
+        representatives = [members[0] for members in grouping.classes]
+        for i, first in enumerate(representatives):
+            for second in representatives[i + 1:]:
+                assert DeepDiff(
+                    states[first], states[second],
+                    ignore_order=True, report_repetition=True,
+                )
+        assert sorted(n for members in grouping.classes for n in members) == sorted(names)
@@ -0,0 +1,151 @@
+import random
+
+import pytest
+
+from ssrleakguard.core.document import HTMLDocument, StreamedDocument
+from ssrleakguard.detectors.ssr_detector import SSRDetector
+
+bs4 = pytest.importorskip("bs4")
+pytest.importorskip("lxml")
+
+
+def _text(rng):
+    return rng.choice(
+        ("", " ", "\n  ", "hello", "a &amp; b", "&nbsp;", "&lt;tag&gt;",
+         "x" * rng.randint(1, 80), " spaced words ", "é😀")
+    )
+
+
+def _head_items(rng):
+    items = []
+    for _ in range(rng.randint(0, 4)):
+        items.append(rng.choice((
+            f"<title>{_text(rng)}</title>",
+            '<meta name="next-head-count" content="2">',
+            '<meta charset="utf-8">',
+            '<link rel="stylesheet" href="/a.css">',
+            "<style>p > a { color: red }</style>",
+            '<script src="/_next/static/chunks/main.js" defer></script>',
+            f"<noscript>{_text(rng)}</noscript>",
+            "<!-- head comment -->",
+            _text(rng),
+        )))
+    return items
+
+
+def _body_items(rng):
+    items = []
+    for _ in range(rng.randint(0, 8)):
+        items.append(rng.choice((
+            _text(rng),
+            f"<p>{_text(rng)}</p>",
+            f"<div class='x'><span>{_text(rng)}</span></div>",
+            f'<a href="/page/{rng.randint(0, 9)}">{_text(rng)}</a>',
+            f"<!-- {_text(rng)} -->",
+            '<script>var s = "<p>not text</p>";</script>',
+            '<script id="__NEXT_DATA__" type="application/json">{"props":{}}</script>',
+            f"<template><p>{_text(rng)}</p></template>",
+            f"<style>{_text(rng)}</style>",
+            "<br>",
+            '<img src="/x.png" alt=">">',
+        )))
+    return items
+
+
+def _document(rng):
+    parts = []
+    if rng.random() < 0.5:
+        parts.append("<!DOCTYPE html>")
+    if rng.random() < 0.2:
+        parts.append(_text(rng))
+    if rng.random() < 0.8:
+        parts.append("<html>")
+    if rng.random() < 0.8:
+        parts.append("<head>")
+        parts.extend(_head_items(rng))
+        if rng.random() < 0.9:
+            parts.append("</head>")
+    if rng.random() < 0.3:
+        # Stray content between the head and the body
+        parts.append(rng.choice((_text(rng), f"<p>{_text(rng)}</p>")))
+    if rng.random() < 0.8:
+        parts.append("<body>")
+    parts.extend(_body_items(rng))
+    if rng.random() < 0.7:
+        parts.append("</body>")
+        if rng.random() < 0.2:
+            parts.append(_text(rng))
+    if rng.random() < 0.7:
+        parts.append("</html>")
+    return "".join(parts)
+
+
+def _reference_length(html):
+    body = bs4.BeautifulSoup(html, "lxml").find("body")
+    return len(body.get_text(strip=True)) if body is not None else 0
+
+
+def test_body_text_counts_visible_text_outside_the_head():
+    html = (
+        "<html><head><title>Title</title><style>p { }</style></head>"
+        " before <body><p> one </p><script>var hidden;</script>"
+        "<template>hidden</template>&lt;two&gt;</body> after </html>"
+    )
+    for source in (html, html.encode("utf-8")):
+        document = HTMLDocument(source).parse()
+        assert document.body_text_length == len("before" "one" "<two>" "after")
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_scripts_meta_and_links_match_lxml(seed):
+    rng = random.Random(100 + seed)
+    for _ in range(300):
+        html = _document(rng)
+        soup = bs4.BeautifulSoup(html, "lxml")
+        for source in (html, html.encode("utf-8")):
+            document = HTMLDocument(source).parse()
+            assert document.script_sources() == [
+                tag["src"] for tag in soup.find_all("script", src=True)
+            ]
+            assert document.has_meta("next-head-count") == bool(
+                soup.find("meta", {"name": "next-head-count"})
+            )
+            assert document.links == [
+                tag["href"] for tag in soup.find_all("a", href=True)
+            ]
+            script = soup.find("script", {"id": "__NEXT_DATA__"})
+            text = document.next_data_text
+            if isinstance(text, bytes):
+                text = text.decode("utf-8")
+            assert text == (script.string if script is not None else None)
+
+
+def test_text_between_head_and_body_is_meaningful():
+    html = (
+        "<html><head><title>Shop</title></head>"
+        + "Server rendered text. " * 20
+        + "<body><p>ok</p></body></html>"
+    )
+    assert _reference_length(html) > HTMLDocument.BODY_TEXT_THRESHOLD
+    assert HTMLDocument(html).has_meaningful_body()
+    assert "Meaningful initial HTML content" in SSRDetector.detect_ssr(html)["indicators"]
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_streamed_document_matches_whole_parse(seed):
+    rng = random.Random(200 + seed)
+    for _ in range(200):
+        html = _document(rng)
+        whole = HTMLDocument(html).parse()
+        streamed = StreamedDocument()
+        start = 0
+        while start < len(html):
+            size = rng.randint(1, 30)
+            streamed.feed(html[start : start + size])
+            start += size
+        streamed.close()
+        assert streamed.body_text_length == whole.body_text_length, html
+        assert streamed.has_meaningful_body() == whole.has_meaningful_body()
+        assert streamed.script_sources() == whole.script_sources()
+        assert streamed.links == whole.links
+        assert streamed.next_data_text == whole.next_data_text
@@ -0,0 +1,88 @@
+import json
+import pickle
+
+import pytest
+
+from ssrleakguard.detectors.finding import SNIPPET_CONTEXT, Finding, json_default
+
+TOKEN = "ghp_" + "a" * 36
+
+
+class _Pattern:
+    name = "github_token"
+    info = {"severity": "critical", "description": "GitHub Personal Access Token"}
+
+
+class _Source(str):
+    """Text recording the slices read from it"""
+
+    def __getitem__(self, key):
+        self.reads.append(key)
+        return _Source(super().__getitem__(key))
+
+
+def _finding(source, context="HTML body"):
+    start = source.index(TOKEN if isinstance(source, str) else TOKEN.encode())
+    return Finding(_Pattern(), source, start, start + len(TOKEN), context)
+
+
+def test_secret_and_snippet_are_read_when_asked_for():
+    source = _Source("x" * 100 + "\n" + TOKEN + "\n" + "y" * 100)
+    source.reads = []
+    finding = _finding(source)
+    assert source.reads == []
+
+    assert finding["secret"] == TOKEN
+    assert finding["snippet"] == " ".join(
+        ("x" * (SNIPPET_CONTEXT - 1), TOKEN, "y" * (SNIPPET_CONTEXT - 1))
+    )
+    assert len(source.reads) == 2
+    assert finding["type"] == "github_token"
+    assert finding["severity"] == "critical"
+
+
+def test_bytes_sources_read_as_utf8():
+    finding = _finding(("é" + TOKEN + "é").encode("utf-8"))
+    assert finding["secret"] == TOKEN
+    assert finding["snippet"] == "é" + TOKEN + "é"
+
+
+def test_detach_keeps_only_the_snippet_window():
+    source = "x" * 1000 + TOKEN + "y" * 1000
+    finding = _finding(source)
+    before = finding.to_dict()
+    assert finding.detach() is finding
+    assert len(finding._source) == len(TOKEN) + 2 * SNIPPET_CONTEXT
+    assert finding.to_dict() == before
+    # The window is already all that is left
+    finding.detach()
+    assert finding.to_dict() == before
+
+
+def test_optional_keys_appear_once_set():
+    finding = _finding(TOKEN)
+    assert "data_path" not in finding
+    with pytest.raises(KeyError):
+        finding["data_path"]
+    finding["data_path"] = "props.token"
+    finding["position"] = 7
+    assert list(finding)[-1] == "data_path"
+    assert finding["data_path"] == "props.token"
+    assert finding["position"] == 7
+    assert len(finding) == len(finding.to_dict())
+    with pytest.raises(KeyError):
+        finding["secret"] = "other"
+
+
+def test_findings_pickle_and_serialize_as_dicts():
+    finding = _finding("key: " + TOKEN)
+    finding["fingerprint"] = "abc"
+    expected = finding.to_dict()
+
+    copy = pickle.loads(pickle.dumps(finding))
+    assert type(copy) is dict
+    assert copy == expected
+    assert json.loads(json.dumps({"f": finding}, default=json_default)) == {
+        "f": expected
+    }
+    assert json_default(object).startswith("<class")
@@ -0,0 +1,16 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_cli_import_is_lazy_and_within_budget():
+    # Runs the budget check as developers do, in fresh interpreters
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.imports"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
@@ -0,0 +1,48 @@
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.http_client import HTTPClient
+from ssrleakguard.utils.instrumentation import Instrumentation
+from ssrleakguard.utils.reporter import Reporter
+
+from conftest import next_page
+
+TOKEN = "ghp_" + "a" * 36
+
+
+def test_scan_records_the_timings_the_reporter_prints(site, capsys):
+    site.pages["/"] = next_page({"token": TOKEN})
+    instrumentation = Instrumentation()
+    client = HTTPClient()
+    analyzer = SSRAnalyzer(client, instrumentation=instrumentation)
+    try:
+        analyzer.analyze(site.url("/"))
+        analyzer.analyze_with_contexts(
+            site.url("/"),
+            [AuthContext(name="guest"), AuthContext(name="admin", cookies={"s": "1"})],
+        )
+    finally:
+        analyzer.close()
+        client.close()
+
+    snapshot = instrumentation.snapshot()
+    stages = (
+        "fetch", "parse", "detect_ssr", "extract_next_data", "scan_props",
+        "scan_html", "normalize", "fingerprint", "diff",
+    )
+    for stage in stages:
+        assert snapshot["timers"][stage]["count"] >= 1, stage
+    assert snapshot["timers"]["fetch"]["count"] == 3
+    counters = snapshot["counters"]
+    assert counters["pages_fetched"] == 3
+    assert counters["bytes_fetched"] == 3 * len(site.pages["/"])
+    assert counters["findings"] == 1
+    assert counters["matches.github_token"] == 1
+    assert counters["context_classes"] == 1
+    assert [route["url"] for route in snapshot["routes"]] == [site.url("/")]
+
+    Reporter().print_timings(snapshot)
+    rows = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert set(stages) <= {row[0] for row in rows if row}
+    assert ["github_token", "1"] in [row[:2] for row in rows]
+    assert ["pages_fetched", "3"] in rows
+    assert site.url("/") in [row[-1] for row in rows if row]
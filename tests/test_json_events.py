@@ -0,0 +1,108 @@
+import json
+import random
+
+import pytest
+
+from ssrleakguard.detectors.json_events import JSONEventParser, JSONLimitExceeded
+from ssrleakguard.detectors.nextjs_parser import NextJSParser
+
+_STRINGS = ("", "a", "ab c", 'q"uote', "back\\slash", "tab\there", "é", "😀", " ", "ctrl\x01")
+_NUMBERS = (0, -1, 12345678901234567890, 1.5, -0.25, 1e-7, 2.5e300)
+
+
+def _value(rng, depth=0):
+    roll = rng.random()
+    if depth > 4 or roll < 0.4:
+        return rng.choice(_STRINGS + _NUMBERS + (True, False, None))
+    if roll < 0.7:
+        return [_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {
+        rng.choice(_STRINGS) + str(i): _value(rng, depth + 1)
+        for i in range(rng.randint(0, 4))
+    }
+
+
+def _text(rng, value):
+    options = rng.choice(
+        (
+            {},
+            {"ensure_ascii": False},
+            {"indent": 2},
+            {"separators": (",", ":")},
+            {"indent": "\t", "ensure_ascii": False},
+        )
+    )
+    return json.dumps(value, **options)
+
+
+def _chunks(rng, text):
+    start = 0
+    while start < len(text):
+        size = rng.choice((1, 2, 3, rng.randint(1, 40)))
+        yield text[start : start + size]
+        start += size
+
+
+def _parse(text, chunks, **options):
+    parser = JSONEventParser(**options)
+    leaves = []
+    for chunk in chunks:
+        leaves.extend(parser.feed(chunk))
+    leaves.extend(parser.close())
+    return leaves
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_chunked_leaves_match_json_loads(seed):
+    rng = random.Random(seed)
+    for _ in range(300):
+        value = _value(rng)
+        text = _text(rng, value)
+        expected = list(NextJSParser.iter_data_paths(json.loads(text)))
+        assert _parse(text, _chunks(rng, text)) == expected, text
+
+
+def test_numbers_are_decoded_like_json_loads():
+    rng = random.Random(9)
+    for text in ("[1, 1.0, -0, 1e2, 1E-2, 10.50, -123e+4, 12345678901234567890]",):
+        leaves = _parse(text, _chunks(rng, text))
+        expected = json.loads(text)
+        assert [value for _, value in leaves] == expected
+        assert [type(value) for _, value in leaves] == [type(v) for v in expected]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "{",
+        "[1,]",
+        '{"a" 1}',
+        '{"a":1,}',
+        "[1 2]",
+        '["unterminated]',
+        "[tru]",
+        "[01]",
+        '{"a":1}}',
+        "[1] [2]",
+        '{1: 2}',
+        '["bad \\x escape"]',
+    ],
+)
+def test_invalid_json_raises_like_json_loads(text):
+    with pytest.raises(ValueError):
+        json.loads(text)
+    for size in (1, 2, len(text) or 1):
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        with pytest.raises(ValueError):
+            _parse(text, chunks)
+
+
+def test_limits():
+    text = json.dumps({"a": [[1, 2], {"b": [3]}]})
+    assert len(_parse(text, [text], max_nodes=8)) == 3
+    with pytest.raises(JSONLimitExceeded):
+        _parse(text, [text], max_nodes=5)
+    assert len(_parse(text, [text], max_depth=4)) == 3
+    with pytest.raises(JSONLimitExceeded):
+        _parse(text, [text], max_depth=3)
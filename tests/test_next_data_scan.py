@@ -0,0 +1,152 @@
+import json
+import random
+import re
+
+import pytest
+
+from ssrleakguard.core.analyzer import SSRAnalyzer
+from ssrleakguard.detectors.json_events import JSONEventParser
+from ssrleakguard.detectors.nextjs_parser import NextJSParser
+from ssrleakguard.detectors.secret_scanner import SecretScanner
+from ssrleakguard.utils.patterns import SECRET_PATTERNS
+
+from test_pattern_engine import _random_text
+
+_ALNUM = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def _pick(rng, count):
+    return "".join(rng.choice(_ALNUM) for _ in range(count))
+
+
+def _secret(rng):
+    """A secret that reads the same in JSON text and as a decoded string"""
+    return rng.choice(
+        (
+            f"{_pick(rng, 6).lower()}@example.com",
+            "ghp_" + _pick(rng, 36),
+            "AKIA" + _pick(rng, 16).upper(),
+            "eyJ" + _pick(rng, 10) + "." + _pick(rng, 12) + "." + _pick(rng, 8),
+            "postgres://app:" + _pick(rng, 8) + "@db.internal/app",
+            "xoxb-" + "1" * 10 + "-" + "2" * 12 + "-" + _pick(rng, 26),
+        )
+    )
+
+
+def _scalar(rng):
+    roll = rng.random()
+    if roll < 0.4:
+        return _secret(rng)
+    if roll < 0.7:
+        return _pick(rng, rng.randint(0, 8))
+    return rng.choice((1, 2.5, True, False, None))
+
+
+def _value(rng, depth=0):
+    roll = rng.random()
+    if depth > 3 or roll < 0.4:
+        return _scalar(rng)
+    if roll < 0.7:
+        return [_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return {
+        (_secret(rng) if rng.random() < 0.3 else _pick(rng, 5)): _value(
+            rng, depth + 1
+        )
+        for _ in range(rng.randint(0, 3))
+    }
+
+
+def _payload(rng):
+    roll = rng.random()
+    if roll < 0.15:
+        # Not an object: must be left to the raw scan
+        return rng.choice((_scalar(rng), [_value(rng) for _ in range(2)]))
+    props = {"pageProps": _value(rng) if roll < 0.3 else _value(rng, -1)}
+    if rng.random() < 0.3:
+        props["extra"] = _value(rng)
+    return {"props": props, "page": "/", "buildId": "b", "query": _value(rng)}
+
+
+def _page(payload, body):
+    return (
+        '<html><head><script src="/_next/static/chunks/main.js"></script>'
+        f'</head><body><div id="__next"><p>{body}</p></div>'
+        '<script id="__NEXT_DATA__" type="application/json">'
+        + json.dumps(payload)
+        + "</script></body></html>"
+    )
+
+
+def _secrets(findings):
+    return {(f["type"], f["secret"]) for f in findings}
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_next_data_scan_finds_what_the_raw_scan_finds(incremental):
+    rng = random.Random(13)
+    scanner = SecretScanner()
+    analyzer = SSRAnalyzer(None, incremental_json=incremental)
+    for _ in range(300):
+        body = " ".join(_secret(rng) for _ in range(rng.randint(0, 2)))
+        html = _page(_payload(rng), body)
+        results = analyzer.analyze_html("http://localhost/", html)
+        expected = _secrets(scanner.scan_content(html, "HTML body"))
+        assert _secrets(results["findings"]) == expected, html
+
+
+def test_secret_keys_are_reported():
+    token = "ghp_" + "a1B2" * 9
+    page_props = {
+        "usersByEmail": {"alice@example.com": {}},
+        "tokens": {token: True},
+    }
+    html = _page({"props": {"pageProps": page_props}, "page": "/"}, "")
+    for incremental in (False, True):
+        analyzer = SSRAnalyzer(None, incremental_json=incremental)
+        findings = analyzer.analyze_html("http://localhost/", html)["findings"]
+        assert {(f["secret"], f["data_path"]) for f in findings} == {
+            ("alice@example.com", "usersByEmail.alice@example.com"),
+            (token, f"tokens.{token}"),
+        }
+
+
+def test_event_parser_keys_match_iter_data_paths():
+    rng = random.Random(5)
+    for _ in range(200):
+        data = _value(rng, -1)
+        text = json.dumps(data)
+        parser = JSONEventParser(keys=True)
+        found = list(parser.feed(text)) + list(parser.close())
+        assert found == list(NextJSParser.iter_data_paths(data, keys=True))
+
+
+def test_extract_outside_page_props_takes_any_payload():
+    for payload in ("text", ["a"], 3, None):
+        assert NextJSParser.extract_outside_page_props(payload) == {}
+
+
+def _reference(content, segments):
+    found = []
+    for name, info in SECRET_PATTERNS.items():
+        regex = re.compile(info["pattern"], re.IGNORECASE)
+        validator = info.get("validator")
+        for start, end in segments:
+            for match in regex.finditer(content, start, end):
+                if validator is None or validator(match.group(0)):
+                    found.append((name, match.start(), match.end()))
+    return found
+
+
+def test_excluded_ranges_scan_in_place():
+    rng = random.Random(21)
+    scanner = SecretScanner()
+    for _ in range(500):
+        text = _random_text(rng)
+        cuts = sorted(rng.randint(0, len(text)) for _ in range(2))
+        exclude = [tuple(cuts)]
+        segments = scanner._segments(len(text), 0, exclude)
+        found = scanner.scan_content(text, "HTML body", exclude=exclude)
+        assert [
+            (f["type"], f["position"], f["position"] + len(f["secret"]))
+            for f in found
+        ] == _reference(text, segments), (text, exclude)
@@ -0,0 +1,237 @@
+import base64
+import codecs
+import json
+
+import pytest
+
+from ssrleakguard.core import offline
+from ssrleakguard.core.context import AuthContext
+from ssrleakguard.core.offline import (
+    OfflineScanner,
+    _JSONReader,
+    iter_har_entries,
+    match_context,
+)
+
+from conftest import next_page
+
+TOKEN = "ghp_" + "a" * 36
+DOCUMENT = {
+    "n": 12345678901234567890,
+    "f": -1.25e-10,
+    "text": "café ✓ \U0001f511",
+    "list": [1, 22, 333, [], {}, None, True, "x" * 40],
+    "nested": {"a": {"b": [4444, 55555]}},
+    "last": 987654321,
+}
+
+
+def _read(reader):
+    """Walk the next value with members() and elements() down to scalars"""
+    first = reader._peek()
+    if first == "{":
+        return {key: _read(reader) for key in reader.members()}
+    if first == "[":
+        return [_read(reader) for _ in reader.elements()]
+    return reader.value()
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 5, 64])
+def test_json_reader_reads_values_across_chunk_boundaries(chunk):
+    data = codecs.BOM_UTF8 + json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    assert _read(_JSONReader(data, chunk)) == DOCUMENT
+    assert _JSONReader(data, chunk).value() == DOCUMENT
+
+
+@pytest.mark.parametrize("chunk", [1, 3])
+def test_json_reader_reads_a_number_cut_at_the_window_end(chunk):
+    # Each prefix of the number decodes on its own
+    assert _JSONReader(b"1234567", chunk).value() == 1234567
+    assert _read(_JSONReader(b"[1234567,89]", chunk)) == [1234567, 89]
+    # So do "-1." and "-1.25e"
+    assert _read(_JSONReader(b"[-1.25e-10,2]", chunk)) == [-1.25e-10, 2]
+
+
+def test_json_reader_rejects_invalid_json():
+    with pytest.raises(ValueError):
+        _read(_JSONReader(b'{"a": 1 "b": 2}', 2))
+
+
+def _entry(url, body, mime_type="text/html", base64_body=False, cookies=None):
+    content = {"mimeType": mime_type, "text": body}
+    if base64_body:
+        content["encoding"] = "base64"
+        content["text"] = base64.b64encode(body.encode("utf-8")).decode("ascii")
+    return {
+        "request": {
+            "url": url,
+            "headers": [],
+            "cookies": [
+                {"name": name, "value": value}
+                for name, value in (cookies or {}).items()
+            ],
+        },
+        "response": {"status": 200, "content": content},
+    }
+
+
+def _write_har(path, entries):
+    har = {
+        "skipped": {"entries": [{"not": "these"}]},
+        "log": {"version": "1.2", "entries": entries, "pages": [1, 2]},
+    }
+    path.write_bytes(codecs.BOM_UTF8 + json.dumps(har).encode("utf-8"))
+    return str(path)
+
+
+@pytest.fixture
+def tiny_chunks(monkeypatch):
+    monkeypatch.setattr(offline, "_HAR_CHUNK", 3)
+
+
+def test_har_entries_are_read_one_at_a_time(tmp_path, tiny_chunks):
+    entries = [_entry(f"https://example.com/{i}", "é" * i) for i in range(5)]
+    har = _write_har(tmp_path / "capture.har", entries)
+    assert list(iter_har_entries(har)) == entries
+
+    empty = tmp_path / "empty.har"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        list(iter_har_entries(str(empty)))
+
+
+def test_match_context_takes_the_most_specific_context():
+    guest = AuthContext(name="guest")
+    user = AuthContext(name="user", cookies={"session": "u"})
+    admin = AuthContext(
+        name="admin", cookies={"session": "a"}, headers={"X-Role": "admin"}
+    )
+    contexts = [guest, user, admin]
+
+    def request(cookie_header=None, **headers):
+        recorded = [{"name": k, "value": v} for k, v in headers.items()]
+        if cookie_header is not None:
+            recorded.append({"name": "Cookie", "value": cookie_header})
+        return {"headers": recorded}
+
+    assert match_context(request(), contexts) is guest
+    assert match_context(request("session=u; theme=dark"), contexts) is user
+    assert match_context(request("session=a", **{"x-role": "admin"}), contexts) is admin
+    # Without the header the admin session matches no context but the guest
+    assert match_context(request("session=a"), contexts) is guest
+    assert match_context(request("session=a"), [user, admin]) is None
+
+
+def test_offline_phase1_scans_har_bodies(tmp_path, tiny_chunks):
+    page = next_page({"token": TOKEN})
+    entries = [
+        _entry("https://example.com/a", page),
+        _entry("https://example.com/b", page, base64_body=True),
+        # The same body at the same URL is scanned once
+        _entry("https://example.com/a", page),
+        _entry("https://example.com/app.js", "var a = 1", "text/javascript"),
+        _entry(
+            "https://example.com/_next/data/b1/c.json",
+            json.dumps({"pageProps": {"token": TOKEN}}),
+            "application/json",
+            base64_body=True,
+        ),
+    ]
+    scanner = OfflineScanner(concurrency=2)
+    try:
+        results = scanner.scan(har_files=[_write_har(tmp_path / "c.har", entries)])
+    finally:
+        scanner.close()
+
+    assert [r["url"] for r in results["results"]] == [
+        "https://example.com/a",
+        "https://example.com/b",
+        "https://example.com/_next/data/b1/c.json",
+    ]
+    for result in results["results"]:
+        assert [f["secret"] for f in result["findings"]] == [TOKEN]
+    stats = results["summary"]["offline"]
+    assert stats["entries"] == 5
+    assert stats["duplicates"] == 1
+    assert stats["not_html"] == 1
+
+
+CONTEXTS = [
+    AuthContext(name="guest"),
+    AuthContext(name="admin", cookies={"session": "1"}),
+]
+
+
+def _diffs(results):
+    return {
+        r["url"]: [f["diff"] for f in r["authorization_findings"]]
+        for r in results["results"]
+    }
+
+
+def test_offline_phase2_compares_har_entries_by_context(tmp_path, tiny_chunks):
+    entries = [
+        _entry("https://example.com/a", next_page({"role": "guest"})),
+        _entry("https://example.com/b", next_page({}), base64_body=True),
+        _entry(
+            "https://example.com/a",
+            next_page({"role": "admin"}),
+            cookies={"session": "1"},
+        ),
+        _entry(
+            "https://example.com/b",
+            next_page({}),
+            base64_body=True,
+            cookies={"session": "1"},
+        ),
+        # Only the guest saw this route
+        _entry("https://example.com/c", next_page({})),
+    ]
+    scanner = OfflineScanner(concurrency=2)
+    try:
+        results = scanner.scan(
+            har_files=[_write_har(tmp_path / "c.har", entries)], contexts=CONTEXTS
+        )
+    finally:
+        scanner.close()
+
+    diffs = _diffs(results)
+    assert list(diffs) == ["https://example.com/a", "https://example.com/b"]
+    assert diffs["https://example.com/a"] == [
+        {
+            "changed": {
+                "root['props']['pageProps']['role']": {
+                    "old_value": "guest",
+                    "new_value": "admin",
+                }
+            }
+        }
+    ]
+    assert diffs["https://example.com/b"] == []
+    assert results["summary"]["offline"]["incomplete"] == 1
+
+
+def test_offline_html_dirs(tmp_path):
+    saved = tmp_path / "saved"
+    for name, role in (("guest", "guest"), ("admin", "admin")):
+        (saved / name / "docs").mkdir(parents=True)
+        (saved / name / "docs" / "a.html").write_text(next_page({"role": role}))
+        (saved / name / "b.htm").write_text(next_page({"token": TOKEN}))
+    (saved / "guest" / "notes.txt").write_text(TOKEN)
+
+    scanner = OfflineScanner(concurrency=2)
+    try:
+        phase1 = scanner.scan(html_dirs=[str(saved / "guest")])
+        phase2 = scanner.scan(html_dirs=[str(saved)], contexts=CONTEXTS)
+    finally:
+        scanner.close()
+
+    assert [r["url"].rsplit("/", 2)[-2:] for r in phase1["results"]] == [
+        ["guest", "b.htm"],
+        ["docs", "a.html"],
+    ]
+    assert [f["secret"] for f in phase1["results"][0]["findings"]] == [TOKEN]
+    diffs = _diffs(phase2)
+    assert sorted(diffs) == ["/b.htm", "/docs/a.html"]
+    assert diffs["/b.htm"] == []
+    assert len(diffs["/docs/a.html"]) == 1
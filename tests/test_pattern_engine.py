@@ -0,0 +1,131 @@
+import random
+import re
+
+import pytest
+
+from ssrleakguard.detectors.pattern_engine import PatternEngine
+from ssrleakguard.detectors.secret_scanner import SecretScanner
+from ssrleakguard.utils.patterns import SECRET_PATTERNS
+
+CASES = 2000
+
+_UPPER_DIGITS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+_ALNUM = "abcdefghijklmnopqrstuvwxyz" + _UPPER_DIGITS
+_HEX = "0123456789abcdef"
+
+
+def _pick(rng, alphabet, count):
+    return "".join(rng.choice(alphabet) for _ in range(count))
+
+
+def _fragments(rng):
+    """Pieces of text that match, almost match or border a pattern"""
+    return [
+        "AKIA" + _pick(rng, _UPPER_DIGITS, rng.choice((15, 16, 17))),
+        "akia" + _pick(rng, _UPPER_DIGITS, 16),
+        "eyJ" + ".".join(_pick(rng, _ALNUM + "_-", rng.randint(8, 14)) for _ in range(3)),
+        "ghp_" + _pick(rng, _ALNUM, rng.choice((35, 36, 40))),
+        "Bearer " + _pick(rng, _ALNUM + "-._~+/", rng.randint(0, 30)) + "=" * rng.randint(0, 2),
+        _pick(rng, _ALNUM + "._%+-", rng.randint(0, 8)) + "@" + _pick(rng, _ALNUM + ".-", rng.randint(0, 8)) + "." + _pick(rng, _ALNUM + "|", rng.randint(1, 4)),
+        rng.choice(("", "+1 ", "1-", "(")) + _pick(rng, "0123456789", 3) + rng.choice((")", "")) + rng.choice("-. ") + _pick(rng, "0123456789", 3) + rng.choice("-. ") + _pick(rng, "0123456789", 4),
+        rng.choice(("api_key", "apikey", "API-KEY", "access_key")) + rng.choice(("=", ": ", '":"', "=\"")) + _pick(rng, _ALNUM + "_-", rng.randint(12, 24)),
+        "aws_secret_access_key" + rng.choice(("=", ": ")) + _pick(rng, _ALNUM + "/+=", rng.choice((39, 40, 41))),
+        rng.choice(("session_id", "sessionid", "sess", "SESSION-ID")) + rng.choice(("=", ": ")) + _pick(rng, _HEX, rng.randint(30, 40)),
+        rng.choice(("mongodb", "mysql", "postgres", "postgresql", "MySQL")) + "://" + _pick(rng, _ALNUM + ":@/.", rng.randint(0, 20)),
+        "-----BEGIN" + rng.choice((" ", "  ", "\n")) + rng.choice(("RSA ", "")) + "PRIVATE KEY-----",
+        "xox" + rng.choice("baprsz") + "-" + _pick(rng, "0123456789", 10) + "-" + _pick(rng, "0123456789", 12) + "-" + _pick(rng, _ALNUM, 26),
+    ]
+
+
+# Characters around the fragments, including the ones re.IGNORECASE
+# folds onto ASCII letters and word characters that shift \b
+_NOISE = list(" \n\t\"'<>=:;,./_-@") + list("aZ09") + ["ſ", "İ", "ı", "K", "é", "ü", "😀", "\xa0"]
+
+
+def _random_text(rng, ascii_only=False):
+    parts = []
+    for _ in range(rng.randint(1, 12)):
+        if rng.random() < 0.6:
+            fragment = rng.choice(_fragments(rng))
+            if rng.random() < 0.3:
+                fragment = "".join(
+                    c.swapcase() if rng.random() < 0.5 else c for c in fragment
+                )
+            parts.append(fragment)
+        else:
+            parts.append(
+                "".join(rng.choice(_NOISE) for _ in range(rng.randint(0, 6)))
+            )
+    text = "".join(parts)
+    if ascii_only:
+        text = text.encode("ascii", "ignore").decode("ascii")
+    return text
+
+
+def _reference(content, pos=0):
+    """One re.finditer per pattern, as the scanner did before the engine"""
+    found = []
+    for name, info in SECRET_PATTERNS.items():
+        regex = re.compile(info["pattern"], re.IGNORECASE)
+        validator = info.get("validator")
+        for match in regex.finditer(content, pos):
+            if validator is not None and not validator(match.group(0)):
+                continue
+            found.append((name, match.start(), match.end()))
+    return found
+
+
+def _engine_matches(engine, content, pos=0):
+    return [
+        (pattern.name, match.start(), match.end())
+        for pattern, match in engine.finditer(content, pos)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_engine_matches_per_pattern_finditer(seed):
+    rng = random.Random(seed)
+    engine = PatternEngine(SECRET_PATTERNS)
+    for _ in range(CASES // 4):
+        text = _random_text(rng)
+        pos = rng.randint(0, len(text)) if rng.random() < 0.2 else 0
+        assert _engine_matches(engine, text, pos) == _reference(text, pos), text
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_engine_on_ascii_bytes_matches_text(seed):
+    rng = random.Random(1000 + seed)
+    engine = PatternEngine(SECRET_PATTERNS)
+    assert engine.ascii
+    for _ in range(CASES // 4):
+        text = _random_text(rng, ascii_only=True)
+        pos = rng.randint(0, len(text)) if rng.random() < 0.2 else 0
+        expected = _reference(text, pos)
+        assert _engine_matches(engine, text.encode("ascii"), pos) == expected, text
+
+
+def test_scan_content_builds_the_old_findings():
+    rng = random.Random(7)
+    scanner = SecretScanner()
+    for _ in range(300):
+        text = _random_text(rng)
+        expected = []
+        for name, start, end in _reference(text):
+            info = SECRET_PATTERNS[name]
+            snippet = text[max(0, start - 50) : min(len(text), end + 50)]
+            expected.append(
+                {
+                    "type": name,
+                    "severity": info["severity"],
+                    "secret": text[start:end],
+                    "description": info["description"],
+                    "context": "HTML body",
+                    "snippet": snippet.replace("\n", " ").strip(),
+                    "position": start,
+                }
+            )
+        found = [dict(f) for f in scanner.scan_content(text, "HTML body")]
+        assert found == expected, text
+        if text.isascii():
+            found = scanner.scan_content(text.encode("ascii"), "HTML body")
+            assert [dict(f) for f in found] == expected, text
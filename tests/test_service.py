@@ -0,0 +1,182 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from ssrleakguard.core.batch import BatchScanner
+from ssrleakguard.core.http_client import HTTPClient
+from ssrleakguard.core.service import DirectoryQueue, ScanJob, ScanService
+
+from conftest import next_page
+
+EMAIL = "alice@example.com"
+
+
+@pytest.fixture
+def service(site):
+    site.pages["/a"] = next_page({"user": {"email": EMAIL}})
+    site.pages["/b"] = next_page({"ok": True})
+    client = HTTPClient()
+    service = ScanService(BatchScanner(client, concurrency=2), max_jobs=2)
+    yield service
+    service.close()
+    client.close()
+
+
+@pytest.fixture
+def api(service):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    thread = threading.Thread(
+        target=service.serve, kwargs={"address": ("127.0.0.1", port)}
+    )
+    thread.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield port
+    service.stop()
+    thread.join(10)
+
+
+def _request(port, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def _ndjson(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def _job(site, *paths):
+    return json.dumps({"urls": [site.url(path) for path in paths]})
+
+
+def test_streamed_scan(site, api):
+    status, data = _request(api, "POST", "/scans?stream=1", _job(site, "/a", "/b"))
+    assert status == 200
+    records = _ndjson(data)
+    pages = [r["url"] for r in records if r["record"] == "page"]
+    assert pages == [site.url("/a"), site.url("/b")]
+    assert [r["secret"] for r in records if r["record"] == "finding"] == [EMAIL]
+    assert records[-1]["record"] == "summary"
+    assert records[-1]["scanned"] == 2
+
+
+def test_queued_scan_is_followed_to_the_end(site, api):
+    status, data = _request(api, "POST", "/scans", _job(site, "/a", "/missing"))
+    assert status == 202
+    job_id = json.loads(data)["id"]
+
+    status, data = _request(api, "GET", f"/scans/{job_id}/results")
+    assert status == 200
+    records = _ndjson(data)
+    assert [r["record"] for r in records if r["record"] in ("page", "error")] == [
+        "page",
+        "error",
+    ]
+    assert records[-1]["record"] == "summary"
+
+    status, data = _request(api, "GET", f"/scans/{job_id}")
+    assert json.loads(data)["status"] == "done"
+
+
+@pytest.mark.parametrize(
+    "body, headers",
+    [
+        ("{}", {}),
+        ("not json", {}),
+        ("{}", {"Content-Length": "abc"}),
+        ("{}", {"Content-Length": "-5"}),
+    ],
+)
+def test_bad_requests_are_rejected(api, body, headers):
+    connection = http.client.HTTPConnection("127.0.0.1", api, timeout=10)
+    try:
+        connection.putrequest("POST", "/scans")
+        connection.putheader(
+            "Content-Length", headers.get("Content-Length", str(len(body)))
+        )
+        connection.endheaders(body.encode("utf-8"))
+        response = connection.getresponse()
+        assert response.status == 400
+        assert "error" in json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def _wait(path, timeout=10):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        assert time.time() < deadline, f"{path} never appeared"
+        time.sleep(0.05)
+
+
+def _drop(queue, name, text):
+    staging = os.path.join(os.path.dirname(queue.incoming), f"{name}.tmp")
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(staging, os.path.join(queue.incoming, f"{name}.json"))
+
+
+def test_queue_directory_runs_and_files_jobs(site, service, tmp_path):
+    queue = DirectoryQueue(service, str(tmp_path / "jobs"))
+    _drop(queue, "good", _job(site, "/a"))
+    _drop(queue, "invalid", json.dumps({"urls": []}))
+    _drop(queue, "broken", "{")
+    # Rejected jobs do not take a slot, so all three are claimed at once
+    assert queue.poll() == 3
+
+    _wait(os.path.join(queue.done, "good.jsonl"))
+    _wait(os.path.join(queue.done, "good.json"))
+    with open(os.path.join(queue.done, "good.jsonl"), encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [r["secret"] for r in records if r["record"] == "finding"] == [EMAIL]
+
+    for name in ("invalid", "broken"):
+        assert os.path.exists(os.path.join(queue.failed, f"{name}.json"))
+        assert os.path.exists(os.path.join(queue.failed, f"{name}.error"))
+    assert os.listdir(queue.incoming) == []
+    assert os.listdir(queue.running) == []
+
+
+class _BrokenSink:
+    closed = False
+
+    def start(self, phase, batch):
+        pass
+
+    def write_result(self, result):
+        pass
+
+    def finish(self, summary=None):
+        raise OSError("disk full")
+
+    def close(self):
+        self.closed = True
+
+
+def test_job_ends_when_its_sink_fails():
+    sink = _BrokenSink()
+    job = ScanJob(["https://example.com/"], sink=sink)
+    job._start()
+    job._finish({"scanned": 1})
+
+    assert sink.closed
+    assert job.status == "failed"
+    assert "disk full" in job.error
+    records = [r for batch in job.follow(timeout=1) for r in batch]
+    assert records[-1]["record"] == "failed"
@@ -0,0 +1,40 @@
+import sys
+
+from ssrleakguard.core.batch import BatchSummary
+from ssrleakguard.utils.reporter import Reporter
+from ssrleakguard.utils.sinks import TextSink
+
+
+def test_text_sink_writes_plain_text_without_taking_stdout(tmp_path, monkeypatch):
+    stdout = sys.stdout
+    seen = []
+    print_result = Reporter.print_batch_result
+
+    def spy(self, result, phase):
+        # Worker threads keep printing to sys.stdout meanwhile
+        seen.append(sys.stdout)
+        print_result(self, result, phase)
+
+    monkeypatch.setattr(Reporter, "print_batch_result", spy)
+
+    path = tmp_path / "report.txt"
+    summary = BatchSummary()
+    result = {"url": "https://example.com/a", "ssr_detected": True, "findings": []}
+    sink = TextSink(str(path), command="ssrleakguard --urls-file urls.txt")
+    try:
+        sink.start(phase=1, batch=True)
+        sink.write_result(result)
+        summary.add_result(result)
+        sink.write_error("https://example.com/b", "timeout")
+        summary.add_error()
+        sink.finish(summary.as_dict())
+    finally:
+        sink.close()
+
+    assert seen == [stdout]
+    text = path.read_text(encoding="utf-8")
+    assert "\x1b" not in text
+    assert "Command: ssrleakguard --urls-file urls.txt" in text
+    assert "https://example.com/a" in text
+    assert "https://example.com/b: timeout" in text
+    assert "Scanned: 1  Failed: 1" in text
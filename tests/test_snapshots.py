@@ -0,0 +1,98 @@
+from ssrleakguard.core import snapshots
+from ssrleakguard.core.snapshots import SnapshotStore
+
+
+def _count(store, table):
+    return store._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_states_are_new_unchanged_then_changed(tmp_path):
+    store = SnapshotStore(str(tmp_path / "s.db"))
+    try:
+        state = {"role": "guest", "items": [1, 2], "banner": "hi"}
+        assert store.record("/a", "guest", state, taken=1) == {
+            "status": "new",
+            "previous": None,
+        }
+        # Lists are unordered by default
+        reordered = dict(state, items=[2, 1])
+        assert store.record("/a", "guest", reordered, taken=2) == {
+            "status": "unchanged",
+            "previous": 1,
+        }
+        # The same route in another context has its own baseline
+        assert store.record("/a", "admin", state, taken=2)["status"] == "new"
+
+        changed = store.record("/a", "guest", {"role": "admin", "items": [1, 2]}, taken=3)
+        assert changed == {
+            "status": "changed",
+            "previous": 2,
+            "diff": {
+                "changed": {
+                    "root['role']": {"old_value": "guest", "new_value": "admin"}
+                },
+                "removed": {"root['banner']": "hi"},
+            },
+        }
+        assert store.history("/a", "guest") == [(1, 3, 3), (2, 3, 0), (3, 2, 2)]
+    finally:
+        store.close()
+
+
+def test_switching_list_order_mode_starts_a_new_baseline(tmp_path):
+    store = SnapshotStore(str(tmp_path / "s.db"))
+    try:
+        store.record("/a", "guest", {"items": [1, 2]}, taken=1)
+        assert store.record(
+            "/a", "guest", {"items": [1, 2]}, ignore_order=False, taken=2
+        ) == {"status": "new", "previous": None}
+
+        result = store.record(
+            "/a", "guest", {"items": [2, 1]}, ignore_order=False, taken=3
+        )
+        assert result["status"] == "changed"
+        assert result["diff"]["changed"] == {
+            "root['items'][0]": {"old_value": 1, "new_value": 2},
+            "root['items'][1]": {"old_value": 2, "new_value": 1},
+        }
+
+        assert store.record("/a", "guest", {"items": [2, 1]}, taken=4)["status"] == "new"
+    finally:
+        store.close()
+
+
+def test_prune_drops_values_no_route_uses(tmp_path):
+    store = SnapshotStore(str(tmp_path / "s.db"))
+    try:
+        store.record("/a", "guest", {"old": "x", "kept": "y"}, taken=1)
+        store.record("/b", "guest", {"kept": "y"}, taken=1)
+        store.record("/a", "guest", {"kept": "y"}, taken=2)
+        assert _count(store, "blobs") == 2
+        store.prune()
+        assert _count(store, "blobs") == 1
+        assert _count(store, "paths") == 1
+        # Values still read back after pruning
+        result = store.record("/a", "guest", {"kept": "z"}, taken=3)
+        assert result["diff"] == {
+            "changed": {"root['kept']": {"old_value": "y", "new_value": "z"}}
+        }
+    finally:
+        store.close()
+
+
+def test_format_version_bump_starts_over(tmp_path, monkeypatch):
+    path = str(tmp_path / "s.db")
+    store = SnapshotStore(path)
+    store.record("/a", "guest", {"role": "guest"}, taken=1)
+    store.close()
+
+    monkeypatch.setattr(snapshots, "FORMAT_VERSION", snapshots.FORMAT_VERSION + 1)
+    store = SnapshotStore(path)
+    try:
+        assert store.history("/a", "guest") == []
+        # A new route may reuse the old route's ID
+        store.record("/b", "guest", {"role": "guest"}, taken=2)
+        assert store.history("/b", "guest") == [(2, 1, 1)]
+        assert store.record("/a", "guest", {"role": "guest"}, taken=3)["status"] == "new"
+    finally:
+        store.close()
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from ssrleakguard.detectors.secret_scanner import SecretScanner, StreamScanner
+
+from test_pattern_engine import _random_text
+
+
+def _long_match(rng):
+    """Secrets longer than the overlap, some only matching at their end"""
+    length = rng.randint(50, 600)
+    return rng.choice(
+        (
+            "Bearer " + "a" * length,
+            "postgres://" + "u" * length,
+            "x" * rng.randint(0, 60) + "@" + "b" * length + ".com",
+            "eyJ" + "h" * length + "." + "p" * 12 + "." + "s" * length,
+            "api_key=" + "k" * length,
+        )
+    )
+
+
+def _chunked_findings(scanner, text, overlap, rng):
+    stream = StreamScanner(scanner, context="HTML body", overlap=overlap)
+    found = []
+    start = 0
+    while start < len(text):
+        size = rng.randint(1, 3 * overlap)
+        found.extend(stream.feed(text[start : start + size]))
+        start += size
+    found.extend(stream.close())
+    return found
+
+
+def _key(findings):
+    return sorted((f["type"], f["position"], f["secret"]) for f in findings)
+
+
+@pytest.mark.parametrize("overlap", [64, 128, 4096])
+def test_chunked_scan_matches_whole_scan(overlap):
+    rng = random.Random(overlap)
+    scanner = SecretScanner()
+    for _ in range(200):
+        parts = [_random_text(rng) for _ in range(rng.randint(1, 4))]
+        for _ in range(rng.randint(0, 3)):
+            parts.insert(rng.randint(0, len(parts)), _long_match(rng))
+        text = rng.choice((" ", "\n", "")).join(parts)
+
+        expected = _key(scanner.scan_content(text, "HTML body"))
+        assert _key(_chunked_findings(scanner, text, overlap, rng)) == expected
+
+
+def test_match_longer_than_overlap_is_reported_whole():
+    scanner = SecretScanner()
+    email = "user@" + "d" * 500 + ".example.com"
+    text = "<p>" + "filler " * 50 + email + " tail</p>" + "more " * 50
+
+    for size in (1, 7, 64, 200):
+        found = _chunked_findings(scanner, text, 64, random.Random(size))
+        assert [f["secret"] for f in found if f["type"] == "email_address"] == [email]